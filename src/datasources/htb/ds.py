@@ -8,16 +8,22 @@ ROOT_PKG = Path(__file__).parents[3] # Points to install-dir/src/
 sys.path.insert(0, str(ROOT_PKG))
 
 from htv.resources import HtvModule, HtvPath, HtvExercise, HtvVault, FileResource, DataSources
-from htv.utils import CONF, add_extensions
-from htv.__main__ import use_mode, list_mode
+from htv.schema import Schema
+from htv.utils import CONF, Cache, FileLock, add_extensions
+from htv.vpn import LatencyProbe, RotatingLog, VpnSupervisor
+from htv.__main__ import use_mode
+
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 
 import subprocess
+import json
 import os
 import re
 # TEMPLATE
 __root_category__ = 'htb'
 # TEMPLATE: __all__ = []
-__all__ = ['Vault', 'Vpn', 'add_subparser',
+__all__ = ['Vault', 'Vpn', 'VpnCatalog', 'add_subparser', 'stats',
            'AcademyModule', 'AcademySkillPath', 'AcademyJobRolePath',
            'LabStartingPoint', 'LabMachine', 'LabChallenge', 'LabSherlock',
            'LabTrack', 'LabProLab', 'LabFortress', 'LabBattleground', ]
@@ -49,9 +55,6 @@ class Vpn(FileResource):
 
     """
 
-    # Custom class attribute
-    __log_path__ = Path('/tmp/.htv.log')  # CONF['_LOG_PATH']  # Path to log file (Value read from `CONF`)
-
     def __init__(self):
         super().__init__(
             title='',
@@ -59,37 +62,107 @@ class Vpn(FileResource):
             category=(f"{__root_category__}/vpn", 'Download VPN conf file (.ovpn extension) from HTB page \n'),
             _type=f"{__root_category__}.Vpn",
         )
-        self._proc = None  # Process running the open-vpn client
         self._path = None
         self.protocol = None  # (tcp, udp)
         self.port = None  # (tcp -> 443, udp -> 1337)
         self.remote = None
 
 
+    @property
+    def path(self) -> Path:
+        """Location of the configuration file"""
+        return super().path if self._path is None else self._path
+
     @property
     def country(self) -> str:
         """Country configured for this VpnClient (EU, UE, SG, AU)"""
-        return self.remote.split('.').pop().upper()
+        return Vpn._country(self.remote)
 
     @property
     def cat(self) -> str:
         """Category configured for this VpnClient (Free, VIP, VIP+)"""
+        return Vpn._tier(self.remote)
+
+    @property
+    def server_id(self) -> int | None:
+        """Server id provided by HTB"""
+        return Vpn._server_id(self.remote)
+
+    @staticmethod
+    def _country(remote: str) -> str:
+        # HTB servers include the region in the host name (edge-eu-free-1.hackthebox.eu). Otherwise, use the TLD
+        _region = [t for t in remote.split('.')[0].split('-') if len(t) == 2 and t.isalpha()]
+        return (_region[0] if len(_region) > 0 else remote.split('.').pop()).upper()
+
+    @staticmethod
+    def _tier(remote: str) -> str:
         # Free, VIP, VIP+
-        if self.remote.find('dedivip') != -1:
+        if remote.find('dedivip') != -1:
             return 'VIP+'
-        elif self.remote.find('vip') != -1:
+        elif remote.find('vip') != -1:
             return 'VIP'
         else:
             return 'FREE'
 
-    @property
-    def server_id(self) -> int:
-        """Server id provided by HTB"""
-        return int(re.search(r'\d+', self.remote)[0])
+    @staticmethod
+    def _server_id(remote: str) -> int | None:
+        _id = re.search(r'\d+', remote)
+        return None if _id is None else int(_id[0])
 
     def __str__(self)-> str:
         return f'{self.path.name} [{self.country} - {self.cat} {self.server_id} ({self.protocol}:{self.port})]'
 
+    @staticmethod
+    def parse(text: str) -> dict:
+        """Parse the connection settings of an OpenVPN configuration
+
+        Directives are read wherever they are: comments and inline blocks (e.g. `<ca>`) are skipped,
+        and OpenVPN defaults apply to missing values (udp, port 1194). Only the first `remote` is used.
+
+        :param text: Contents of the configuration file
+        :raise ValueError: If the configuration has no remote, or an unknown protocol
+        :return: dict with protocol, port, remote, country, tier and server_id
+        """
+        _proto, _port, _remote, _remote_port = 'udp', 1194, None, None
+        _inline = None
+        for line in text.splitlines():
+            line = line.strip()
+            if _inline is not None:  # Within an inline block
+                if line == f"</{_inline}>":
+                    _inline = None
+                continue
+            if re.match(r"^<[\w-]+>$", line) is not None:
+                _inline = line[1:-1]
+                continue
+            _args = line.split()
+            if len(_args) < 2 or _args[0][0] in '#;':
+                continue
+            try:
+                if _args[0] == 'proto':
+                    _proto = _args[1]
+                elif _args[0] in ['port', 'rport']:
+                    _port = int(_args[1])
+                elif _args[0] == 'remote' and _remote is None:
+                    _remote = _args[1]
+                    if len(_args) > 2:
+                        _remote_port = int(_args[2])
+                    if len(_args) > 3:
+                        _proto = _args[3]
+            except ValueError:
+                raise ValueError(f"Invalid port in directive '{line}'")
+        if _remote is None:
+            raise ValueError("Missing 'remote' directive")
+        if re.match(r"^(tcp|udp)(4|6|-client)?$", _proto) is None:
+            raise ValueError(f"Unknown protocol '{_proto}'. Expected: tcp, udp")
+        return dict(
+            protocol=_proto[:3],
+            port=_port if _remote_port is None else _remote_port,
+            remote=_remote,
+            country=Vpn._country(_remote),
+            tier=Vpn._tier(_remote),
+            server_id=Vpn._server_id(_remote),
+        )
+
     def update(self, **kwargs) -> None:
         """
         Update Vpn attributes from a file. If path is not absolute,
@@ -103,17 +176,15 @@ class Vpn(FileResource):
         if 'path' not in kwargs:
             print("[!] Missing path to file with the data to be updated")
             return
-        self.name = Path(kwargs.pop('path')).name
+        _path = Path(kwargs.pop('path'))
+        self.name = _path.name
+        self._path = _path if _path.is_absolute() else None  # Relative paths are searched within the vpn dir
         with open(self.path, 'r') as conf_file:
-            lines = conf_file.readlines()
-        try:  # Parse info
-            self.port = lines[3].split(' ')[2].strip()  # remote & port line 3
-            self.remote = lines[3].split(' ')[1].strip()
-            self.protocol = lines[2].strip()[-3:]  # protocol line 2
-            if self.protocol not in ['tcp', 'udp']:
-                raise ValueError(f"Unknown protocol '{self.protocol}'. Expected: tcp, udp ({self.path}:2)")
-        except (IndexError, ValueError): # Valid file name but invalid content
-            raise ValueError(f"VPN file syntax not recognized '{self.path}'")
+            try:  # Parse info
+                _conf = Vpn.parse(conf_file.read())
+            except ValueError as e:  # Valid file name but invalid content
+                raise ValueError(f"VPN file syntax not recognized '{self.path}' ({e})")
+        self.protocol, self.port, self.remote = _conf['protocol'], _conf['port'], _conf['remote']
 
     def open(self) -> None:
         """Updates the app runtime configuration with this VPN details"""
@@ -122,61 +193,247 @@ class Vpn(FileResource):
         CONF.update_values(_VPN=self)
 
     # Custom methods
-    def start(self, force: bool = False) -> int:
+    def start(self, force: bool = False, timeout: float = 30.0) -> int:
         """Starts the vpn using loaded configuration
 
-        Starts an `openvpn` process in the background.
+        Starts an `openvpn` client, owned by a supervisor running in the background (:class:`htv.vpn.VpnSupervisor`),
+        which reconnects it if the connection is lost.
         If a vpn is already running and `force` is False, this VPN will not be started
 
         :param force: If True and a VPN is already running, it is stopped
-        :return: 0 on success. 1 if a VPN is already running
+        :param timeout: Seconds to wait for the connection to be established
+        :return: 0 on success. 1 if a VPN is already running, or it failed to connect
         """
-        if 'CURRENT_VPN' in CONF:
-            if force:  # kill running VPN process
+        _state = VpnSupervisor.read_state()
+        if _state is not None and _state['state'] != 'stopped':
+            if force:  # Stop running VPN
                 print('[*] Stopping current VPN...')
-                os.kill(CONF['CURRENT_VPN'], 9)
-                self.__log_path__.unlink()
-                CONF.remove_values('CURRENT_VPN')
+                Vpn.stop()
             else:
                 print("[-] A VPN is already running. Stop it to run a new one")
                 return 1
         print(f'[*] Using VPN configuration from {self.path}')
+        try:  # Through sudo, the password may be prompted
+            _pid = VpnSupervisor.spawn(self.path)
+        except OSError as e:
+            print(f"[!] {e}")
+            return 1
+        CONF.update_values(CURRENT_VPN=_pid)
         print(f'[*] Establishing connection...')
-        self._proc = subprocess.Popen(f"sudo openvpn {self.path} &> {self.__log_path__} &", shell=True)
-        CONF.update_values(CURRENT_VPN=self._proc.pid)
-        print("[+] Connected to VPN")
+        _state = VpnSupervisor.wait('connected', 'failed', timeout=timeout)
+        if _state is not None and _state['state'] == 'connected':
+            print("[+] Connected to VPN")
+            return 0
+        elif _state is None or _state['state'] in ['failed', 'stopped']:
+            _log = _state['log'] if _state is not None else VpnSupervisor.default_path(VpnSupervisor.__log_name__)
+            print(f"[!] VPN connection failed. See the log: {_log}")
+            CONF.remove_values('CURRENT_VPN')
+            return 1
+        print(f"[*] VPN not connected yet ({_state['state']}). Check it with `htv vpn status`")
         return 0
 
-    def stop(self) -> int:
-        """Stops this VpnClient, if it is running
+    @staticmethod
+    def fastest(records: list[dict] = None, ttl: float = 300.0) -> 'Vpn | None':
+        """VPN configuration with the lowest latency
+
+        All the servers are probed at once (:class:`htv.vpn.LatencyProbe`)
 
-        :return: 0 on success
+        :param records: VPN configurations (:func:`VpnCatalog.query`). Defaults to all the configurations of the vault
+        :param ttl: Seconds the latency of a server is cached
+        :return: The fastest VPN. None if none is reachable
+        """
+        _catalog = VpnCatalog(conf=CONF.snapshot()).refresh()  # Workers read the snapshot, never CONF
+        records = _catalog.query() if records is None else records
+        if len(records) == 0:
+            print("[!] VPN configurations not found. Download them from HTB page and save into 'vpn/' dir")
+            return None
+        _target = lambda r: (r['protocol'], r['remote'], r['port'])
+        _latency = LatencyProbe.latency([_target(r) for r in records], ttl=ttl)
+        for r in sorted(records, key=lambda r: (_latency[_target(r)] is None, _latency[_target(r)] or 0)):
+            _rtt = _latency[_target(r)]
+            print(f"[*] {'unreachable' if _rtt is None else f'{_rtt * 1000:.1f} ms':>12}  {VpnCatalog.describe(r)}")
+        _fastest = LatencyProbe.fastest([_target(r) for r in records], ttl=ttl)
+        if _fastest is None:
+            print("[!] VPN servers unreachable")
+            return None
+        return Vpn._load(_catalog.root / next(r for r in records if _target(r) == _fastest)['path'])
+
+    @staticmethod
+    def _load(path: Path) -> 'Vpn | None':
+        try:
+            _vpn = Vpn()
+            _vpn.update(path=path)
+            return _vpn
+        except (ValueError, OSError) as e:
+            print(f"[-] {e}")
+            return None
+
+    @staticmethod
+    def stop() -> int:
+        """Stops the running VPN, if any
+
+        :return: 0 on success. 1 if no VPN was running
         """
-        # Get process running in bg and kill it
-        self._proc.kill()
-        self._proc = None
-        self.__log_path__.unlink()
+        _running = VpnSupervisor.terminate()
         CONF.remove_values('CURRENT_VPN')
+        if not _running:
+            print(f"[-] VPN not running")
+            return 1
+        print(f"[+] VPN stopped")
         return 0
 
-    def status(self, quiet: bool = False) -> int:
-        """Check if this VPN is running
+    @staticmethod
+    def status(quiet: bool = False, tail: int = 20, follow: bool = False) -> int:
+        """Check if the VPN is running
+
+        The status is read from the supervisor, so it is available to any `htv` process.
+        The log is bounded and rotated (:class:`htv.vpn.RotatingLog`), only its last lines are read
 
-        :param quiet: If True, the VPN log is shown in the terminal
+        :param quiet: If False, the last lines of the VPN log are shown in the terminal
+        :param tail: Number of lines of the log shown
+        :param follow: If True, new lines of the log are shown until the VPN stops (or Ctrl+C)
         :return: 0 if VPN is stopped. 1 if running
         """
-        if self._proc:
-            print(f"[+] VPN active")
-            # Print current contents of .log file
-            if not quiet:
-                os.system(f"more {self.__log_path__}")
-            # with open(self._log_path, 'r') as file:
-            #     # Open file in default text editor
-            #     print(file.read())
-            return 1
-        else:
+        _state = VpnSupervisor.read_state()
+        if _state is None or _state['state'] == 'stopped':
             print(f"[-] VPN stopped")
             return 0
+        print(f"[+] VPN {_state['state']} ({Path(_state['config']).name}, since {_state['since']})")
+        if _state['retries'] > 0:
+            print(f"[*] {_state['retries']} failed attempt(s) to reconnect")
+        if not quiet:  # Print the last lines of the log
+            print(*RotatingLog.tail(_state['log'], tail), sep='\n')
+            if follow:
+                _stopped = lambda: (VpnSupervisor.read_state() or dict(state='stopped'))['state'] == 'stopped'
+                try:
+                    for line in RotatingLog.follow(_state['log'], stop=_stopped):
+                        print(line, flush=True)
+                except KeyboardInterrupt:
+                    pass
+        return 1
+
+
+class VpnCatalog:
+    """
+    Catalog of the VPN configurations of the vault, saved within the vault (`.htv/vpn.json`).
+
+    Keeps the connection settings of each `.ovpn` file (:func:`Vpn.parse`), so configurations can be listed and
+    filtered without parsing them. Files are parsed again only when they change (mtime and size), in parallel.
+    The configuration is read from a snapshot taken when the catalog is created, never from `CONF` itself.
+
+    :ivar root: [`Path`] Directory of the VPN configurations
+    :ivar conf: [Mapping] Configuration snapshot (:func:`utils.Conf.snapshot`)
+    """
+    __route__ = Path('.htv/vpn.json')  # Relative to the vault
+    __version__ = 1
+    __workers__ = 8
+
+    def __init__(self, root: str | Path = None, conf: Mapping = None):
+        """
+        :param root: Directory of the VPN configurations. Defaults to `VAULT_DIR/htb/vpn`
+        :param conf: Configuration snapshot. Defaults to the current configuration
+        """
+        self.conf = CONF.snapshot() if conf is None else conf
+        self.root = Path(self.conf['VAULT_DIR'] / f"{__root_category__}/vpn" if root is None else root)
+        self._entries = dict()  # {rel_path: record}
+        self._changed = False
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def path(self) -> Path:
+        """Absolute path of the catalog file"""
+        return self.conf['VAULT_DIR'] / self.__route__
+
+    def load(self) -> None:
+        """Load the catalog from disk. If missing, or outdated, it is empty until refreshed"""
+        try:
+            with FileLock.of(self.path).shared(), open(self.path, 'r') as file:
+                _data = json.load(file)
+            if _data.get('version') == self.__version__ and _data.get('root') == str(self.root):
+                self._entries = _data.get('entries', dict())
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._entries = dict()
+
+    def save(self) -> None:
+        """Save the catalog to disk, if it changed"""
+        if not self._changed:
+            return
+        os.makedirs(self.path.parent, exist_ok=True)
+        _tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with FileLock.of(self.path).exclusive():
+            with open(_tmp, 'w') as file:
+                json.dump(dict(version=self.__version__, root=str(self.root), entries=self._entries), file, indent=1)
+            os.replace(_tmp, self.path)
+        self._changed = False
+
+    def refresh(self) -> 'VpnCatalog':
+        """Synchronize the catalog with the configuration files. Only new or modified files are parsed
+
+        :return: This catalog, to allow chaining
+        """
+        _found = dict()
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for f in filenames:
+                if f.endswith('.ovpn'):
+                    _found[Path(dirpath, f).relative_to(self.root).as_posix()] = os.stat(os.path.join(dirpath, f))
+        for _rel in set(self._entries) - set(_found):  # Deleted files
+            self._entries.pop(_rel)
+            self._changed = True
+        _modified = [
+            _rel for _rel, _stat in _found.items()
+            if _rel not in self._entries or self._entries[_rel]['__mtime__'] != _stat.st_mtime_ns
+            or self._entries[_rel]['__size__'] != _stat.st_size
+        ]
+        with ThreadPoolExecutor(max_workers=self.__workers__) as pool:
+            for _rel, _rec in zip(_modified, pool.map(lambda r: VpnCatalog._parse(self.root / r), _modified)):
+                if isinstance(_rec, Exception):
+                    print(f"[-] VPN file syntax not recognized '{_rel}' ({_rec})")
+                    self._entries.pop(_rel, None)
+                    continue
+                _rec.update(path=_rel, __mtime__=_found[_rel].st_mtime_ns, __size__=_found[_rel].st_size)
+                self._entries[_rel] = _rec
+                self._changed = True
+        self.save()
+        return self
+
+    @staticmethod
+    def _parse(path: Path) -> dict | Exception:
+        """Parse a configuration file. Run by the workers of :func:`VpnCatalog.refresh`
+
+        :return: The parsed settings, or the error found
+        """
+        try:
+            with open(path, 'r') as file:
+                return Vpn.parse(file.read())
+        except (ValueError, UnicodeDecodeError, OSError) as e:
+            return e
+
+    def query(self, country: str = None, tier: str = None, protocol: str = None) -> list[dict]:
+        """Filter the configurations. Filters are case-insensitive
+
+        :param country: Server country (EU, US, SG, AU)
+        :param tier: Server tier (FREE, VIP, VIP+)
+        :param protocol: Protocol (tcp, udp)
+        :return: Matching records, sorted by country, tier and server id
+        """
+        _filters = dict(country=country, tier=tier, protocol=protocol)
+        return sorted(
+            [
+                r for r in self._entries.values()
+                if all(v is None or str(r[k]).lower() == str(v).lower() for k, v in _filters.items())
+            ],
+            key=lambda r: (r['country'], r['tier'], r['server_id'] or 0, r['path'])
+        )
+
+    @staticmethod
+    def describe(record: dict) -> str:
+        return (f"{Path(record['path']).name} [{record['country']} - {record['tier']} {record['server_id']} "
+                f"({record['protocol']}:{record['port']})]")
+
 
 class AcademyModule(HtvModule):
     """Class representing an HTB Module
@@ -197,6 +454,7 @@ class AcademyModule(HtvModule):
         'IV': 1000
     }
     COST_TIER = {v: k for k, v in TIER_COST.items()}
+    __schema__ = dict(tier=Schema.choice(*TIER_COST))
 
     def __init__(self):
         super().__init__(
@@ -340,6 +598,7 @@ class LabTrack(HtvPath):
         )
 
 class LabProLab(HtvExercise):
+    __schema__ = dict(targets=Schema.items(Schema.resource()))
 
     def __init__(self):
         super().__init__(
@@ -352,10 +611,13 @@ class LabProLab(HtvExercise):
 
     @property
     def targets(self):
-        return self._targets
+        return self.__resolve__('targets', self._load_targets)
 
     @targets.setter
     def targets(self, value: list[dict]):
+        self.__defer__('targets', value)
+
+    def _load_targets(self, value: list[dict]) -> None:
         self._targets.clear()
         for item in value: # Sections are Modules/Exercises
             m = DataSources.get(item.pop('__type__'))
@@ -427,6 +689,26 @@ Vault = HtvVault(
     path=__root_category__,
 )
 
+#######  S T A T S  ####################
+
+def stats(records: list[dict]) -> dict:
+    """HTB aggregates for `htv stats`
+
+    :param records: Vault index records (:class:`htv.index.Index`)
+    :return: Academy cube spend (:attr:`AcademyModule.TIER_COST`) per tier, and lab resources per OS
+    """
+    _cubes = dict()
+    _os = dict()
+    for r in records:
+        if r['__type__'] == f"{__root_category__}.AcademyModule" and str(r.get('tier')) in AcademyModule.TIER_COST:
+            _cubes[str(r['tier'])] = _cubes.get(str(r['tier']), 0) + AcademyModule.TIER_COST[str(r['tier'])]
+        elif r['__type__'].startswith(f"{__root_category__}.Lab") and r.get('os') is not None:
+            _os[str(r['os']).lower()] = _os.get(str(r['os']).lower(), 0) + 1
+    return dict(
+        cubes=dict(total=sum(_cubes.values()), by_tier=_cubes),
+        lab_by_os=dict(sorted(_os.items()))
+    )
+
 #######  C L I   P A R S E R S  ####################
 
 def add_subparser(subparsers):
@@ -449,6 +731,45 @@ def add_subparser(subparsers):
         nargs='*',
         help='Name or ID of the vpn conf to be opened. To get the ID use the command `htv vpn list`. Defaults to value set in the configuration file'
     )
+    vpn_cli.add_argument(
+        '--country',
+        help='List only the VPNs in this country (EU, US, SG, AU)',
+        type=str.upper,
+        default=None
+    )
+    vpn_cli.add_argument(
+        '--tier',
+        help='List only the VPNs of this tier',
+        type=str.upper,
+        choices=['FREE', 'VIP', 'VIP+'],
+        default=None
+    )
+    vpn_cli.add_argument(
+        '--protocol',
+        help='List only the VPNs using this protocol',
+        type=str.lower,
+        choices=['tcp', 'udp'],
+        default=None
+    )
+    vpn_cli.add_argument(
+        '--fastest',
+        help='Start the VPN whose server has the lowest latency. Latencies are cached for 5 minutes',
+        action='store_true',
+        default=False
+    )
+    vpn_cli.add_argument(
+        '--tail',
+        metavar='N',
+        help='Number of lines of the log shown by `status`. Defaults to 20',
+        type=int,
+        default=20
+    )
+    vpn_cli.add_argument(
+        '--follow',
+        help='Keep showing the new lines of the log with `status`, until the VPN stops',
+        action='store_true',
+        default=False
+    )
     vpn_cli.set_defaults(vpn_mode=handle_args)
 
 def handle_args(args) -> int:
@@ -457,29 +778,45 @@ def handle_args(args) -> int:
     :return: 0 on success. 1 on error
     """
     if args.action == 'list':
-        args.categories = ['htb.vpn']
-        return list_mode(args)
+        _catalog = VpnCatalog().refresh()
+        _records = _catalog.query(country=args.country, tier=args.tier, protocol=args.protocol)
+        if len(_records) == 0:
+            print(f"[-] No VPN configurations found matching that criteria")
+            return 1
+        _div = '-' * 30
+        print(
+            _div,
+            *[f"{Templater.pad_num(ind, len(str(len(_records))))}. {VpnCatalog.describe(r)}"
+              for ind, r in enumerate(_records, 1)],
+            _div,
+            sep='\n'
+        )
+        Cache.set([_catalog.root / r['path'] for r in _records])  # Select them by index
+        return 0
     elif args.action == 'start':
-        if isinstance(args.target, list):
-            args.target = args.target.pop()  # Use the indicated file
-        elif args.target is None or len(args.target) == 0:  # VPN not specified, get first match
-            try:
-                args.target = CONF['VAULT_DIR'].glob('**/*.ovpn')[0]
-            except IndexError:
-                print("[!] VPN configurations not found. Download them from HTB page and save into 'vpn/' dir")
+        if args.fastest:  # Lowest latency
+            _vpn = Vpn.fastest()
+            if _vpn is None:
                 return 1
+            args.target = [_vpn.path.name]
+        elif len(args.target) > 0:
+            args.target = [args.target.pop()]  # Use the indicated file
         elif 'DEFAULT_VPN' in CONF:  # Using default configuration
             # print(f"[*] Using default VPN configuration")
-            args.target = CONF['DEFAULT_VPN']
-        use_mode(args)  # Use selected VPN
+            args.target = [CONF['DEFAULT_VPN']]
+        else:  # VPN not specified, get first match
+            _first = next(CONF['VAULT_DIR'].glob('**/*.ovpn'), None)
+            if _first is None:
+                print("[!] VPN configurations not found. Download them from HTB page and save into 'vpn/' dir")
+                return 1
+            args.target = [_first.name]
+        if use_mode(args) != 0:  # Use selected VPN
+            return 1
         return CONF['_VPN'].start()  # Start selected VPN
-    elif '_VPN' not in CONF:
-        print(f"[-] VPN not running")
-        return 1
     elif args.action == 'stop':
-        return CONF['_VPN'].stop()
+        return Vpn.stop()
     elif args.action == 'status':
-        return CONF['_VPN'].status()
+        return Vpn.status(tail=args.tail, follow=args.follow)
     else:
         return 1  # Unknown action
 
@@ -27,6 +27,10 @@ function cleanInnerText(elem, reg, rep='') {
 }
 
 function printJson(data) {
+    if (batchActive()) {  // Stored until exported, see batchExport()
+        batchAdd(data);
+        return;
+    }
     console.log(data);
     console.log(
         JSON.stringify(data)
@@ -37,6 +41,69 @@ function printJson(data) {
         );
 }
 
+// ++============================================++
+// ||                  B A T C H                 ||
+// ++============================================++
+// Resources parsed while batch mode is active are accumulated in the browser storage (one per line),
+// across pages, and exported at once as gzip+base64 JSONL. Paste the payload at the `>>> json:` prompt of htv.
+// Storage is per site: academy.hackthebox.com and app.hackthebox.com keep separate batches.
+
+const BATCH_KEY = 'htv.batch';
+const BATCH_WIDTH = 1000;  // Characters per line of the payload. Terminals truncate longer lines
+
+function batchActive() {
+    return localStorage.getItem(BATCH_KEY) !== null;
+}
+
+function batchItems() {
+    return (localStorage.getItem(BATCH_KEY) ?? '').split('\n').filter(line => line !== '');
+}
+
+function batchStart() {
+    if (!batchActive()) {
+        localStorage.setItem(BATCH_KEY, '');
+    }
+    console.log(`Batch mode active (${batchItems().length} resources). Run the parsers, then batchExport()`);
+}
+
+function batchAdd(data) {
+    const lines = (Array.isArray(data) ? data : [data]).map(item => JSON.stringify(item));
+    localStorage.setItem(BATCH_KEY, batchItems().concat(lines).join('\n'));
+    console.log(`Added ${lines.length} resource(s) to the batch (${batchItems().length} in total)`);
+}
+
+async function batchExport(clear=true) {
+    const lines = batchItems();
+    const compressed = new Blob([lines.join('\n') + '\n']).stream().pipeThrough(new CompressionStream('gzip'));
+    const bytes = new Uint8Array(await new Response(compressed).arrayBuffer());
+    let binary = '';
+    for (let i = 0; i < bytes.length; i += 0x8000) {
+        binary += String.fromCharCode(...bytes.subarray(i, i + 0x8000));
+    }
+    const data = btoa(binary);
+    const payload = [`htv:gz:${lines.length}`];
+    for (let i = 0; i < data.length; i += BATCH_WIDTH) {
+        payload.push(data.slice(i, i + BATCH_WIDTH));
+    }
+    payload.push('htv:end');
+    console.log(payload.join('\n'));
+    try {
+        copy(payload.join('\n'));  // dev-tools console utility
+        console.log(`Batch of ${lines.length} resources copied to the clipboard`);
+    } catch (error) {
+        console.warn('Clipboard not available. Copy the payload above');
+    }
+    if (clear) {
+        batchStop();
+    }
+    return payload.join('\n');
+}
+
+function batchStop() {
+    localStorage.removeItem(BATCH_KEY);
+    console.log('Batch mode stopped. Stored resources discarded');
+}
+
 // ++============================================++
 // ||               C L A S S E S                ||
 // ++============================================++
@@ -597,6 +664,10 @@ function help(){
 		'- getTrack()         -> Parses a Track',
 		'- getProLab()        -> Parses a Pro-Lab',
 		'- getFortress()      -> Parses a Fortress (advanced lab)',
+		'\nBATCH MODE',
+		'- batchStart()       -> Accumulate the parsed resources, across pages, instead of printing them',
+		'- batchExport()      -> Print (and copy) all of them as a single payload for htv, and stop',
+		'- batchStop()        -> Stop batch mode, discarding the accumulated resources',
 	].join('\n'));
 }
 
@@ -1,3 +1,6 @@
 from .constants import *
 from .resources import *
 from .utils import *
+from .index import *
+from .schema import *
+from .vpn import *
@@ -14,6 +14,7 @@ from htv.resources import HtvVault
 from importlib import import_module
 
 import argparse
+import json
 
 
 
@@ -23,6 +24,10 @@ def init_mode(args) -> int:
     :return: 0 if vault initialized successfully. 1 otherwise
     """
     _ = HtvVault(git_name=args.git_name, git_email=args.git_email)
+    if args.from_snapshot is not None:
+        if not _.path.exists() and _.makedirs(reset=args.reset) != 0:
+            return 1
+        return 0 if _.restore_snapshot(args.from_snapshot) >= 0 else 1
     if args.source is not None:
         if not _.path.exists():
             _.makedirs(reset=args.reset)
@@ -38,10 +43,18 @@ def add_mode(args) -> int:
 
     :return: 0 on success. 1 on error
     """
+    if args.drain_queue:
+        HtvVault().drain_queue(defer_missing=args.defer_missing)
+        return 0
+    if args.watch_clipboard:
+        HtvVault().watch_clipboard(defer_missing=args.defer_missing)
+        return 0
+    _data = args.data[0] if len(args.data) > 0 else None
     return HtvVault().add_resource(
-        args.data[0] if len(args.data) > 0 else None,
+        sys.stdin if _data == '-' else _data,  # Resources are added as they are read from stdin
         category=args.category,
         layout=args.layout,
+        defer_missing=args.defer_missing
     )
 
 
@@ -89,12 +102,42 @@ def rm_mode(args) -> int:
 
 
 
+def export_mode(args) -> int:
+    """Export the vault as a single snapshot
+
+    :return: 0 on success. 1 on error
+    """
+    _compress = args.gzip or args.output.suffix == '.gz'
+    return 0 if HtvVault().export_snapshot(args.output, compress=_compress) >= 0 else 1
+
+
+def diff_mode(args) -> int:
+    """Compare two states of the vault
+
+    :return: 0 on success. 1 on error
+    """
+    _diff = HtvVault().diff(args.old, args.new, quiet=args.json)
+    if _diff is None:
+        return 1
+    if args.json:
+        print(json.dumps([dict(change=c, path=p, fields=f) for c, p, f in _diff], indent=2))
+    return 0
+
+
 def list_mode(args) -> int:
     """List resource(s) from the vault
 
     :return: Number of listed elements [0, 256]
     """
     # TODO: if categories is None, list parent categories only
+    if getattr(args, 'where', None) or getattr(args, 'sort', None):  # Query the vault index
+        _ = HtvVault().query_resources(
+            *args.categories,
+            where=None if not args.where else ' and '.join([f"({w})" for w in args.where]),
+            sort=args.sort,
+            regex=args.name if hasattr(args, 'name') else None
+        )
+        return 0 if _ is None else len(_)
     _ = HtvVault().list_resources(
         *args.categories,
         regex=args.name if hasattr(args, 'name') else None
@@ -102,6 +145,40 @@ def list_mode(args) -> int:
     return 0 if _ is None else len(_)
 
 
+def stats_mode(args) -> int:
+    """Print vault statistics
+
+    :return: 0 on success. 1 on error
+    """
+    _stats = HtvVault().stats(
+        *args.categories,
+        where=None if not args.where else ' and '.join([f"({w})" for w in args.where])
+    )
+    if _stats is None:
+        return 1
+    if args.json:
+        print(json.dumps(_stats, indent=2))
+    else:
+        _div = '-' * 30
+
+        def print_section(title: str, data: dict, depth: int = 0) -> None:
+            print(f"{'  ' * depth}{title}:")
+            for k, v in data.items():
+                if isinstance(v, dict) and 'rate' in v:  # Completion rate
+                    print(f"{'  ' * (depth + 1)}{k}: {v['completed']}/{v['total']} ({v['rate'] * 100:.1f} %)")
+                elif isinstance(v, dict):
+                    print_section(k, v, depth + 1)
+                else:
+                    print(f"{'  ' * (depth + 1)}{k}: {v}")
+
+        print(f"[*] Vault statistics", _div, f"Resources: {_stats['completed']}/{_stats['total']} completed", sep='\n')
+        for k, v in _stats.items():
+            if isinstance(v, dict):
+                print_section(k, v)
+        print(_div)
+    return 0
+
+
 def use_mode(args) -> int:
     """Open resource(s) from the vault
 
@@ -120,7 +197,10 @@ def clean_mode(args) -> int:
 
     :return: 0 on success. 1 if an error occurred
     """
-    return HtvVault.clean()
+    _ret = HtvVault.clean()
+    if _ret == 0 and args.dedupe:
+        HtvVault().dedupe()
+    return _ret
 
 
 def version_mode(args) -> int:
@@ -177,6 +257,64 @@ def _parse_args(cmd = None):
         default=None,
         help='Import the contents of the provided directory into the vault'
     )
+    vault_cli.add_argument(
+        '--from-snapshot',
+        type=Path,
+        default=None,
+        metavar='SNAPSHOT',
+        help='Rebuild the vault from a snapshot exported with `htv export`'
+    )
+    # EXPORT CLI
+    export_cli = subparser.add_parser(
+        name='export',
+        help='Export the vault as a single snapshot',
+        description='Export every resource of the vault, and its path, into a single file. '
+                    'Restore it with `htv init --from-snapshot`'
+    )
+    export_cli.add_argument(
+        'output',
+        type=Path,
+        help='Snapshot file. Files ending with .gz are compressed'
+    )
+    export_cli.add_argument(
+        '-f', '--format',
+        choices=['jsonl'],
+        default='jsonl',
+        help='Snapshot format: one serialized resource per line (default)'
+    )
+    export_cli.add_argument(
+        '-z', '--gzip',
+        help='Compress the snapshot with gzip',
+        action='store_true',
+        default=False
+    )
+    # DIFF CLI
+    diff_cli = subparser.add_parser(
+        name='diff',
+        help='Compare two states of the vault',
+        description='Show the resources added, removed or changed between two states of the vault, '
+                    'and the fields that changed (status, completion_date, points, ...). '
+                    'A state is an index file (.htv/index.json), a snapshot (`htv export`) or a git revision. '
+                    'E.g. `htv diff ORIG_HEAD` after a `git pull`'
+    )
+    diff_cli.add_argument(
+        'old',
+        metavar='OLD',
+        help='Old state: index file, snapshot or git revision'
+    )
+    diff_cli.add_argument(
+        'new',
+        metavar='NEW',
+        nargs='?',
+        default=None,
+        help='New state: index file, snapshot or git revision. Defaults to the current state of the vault'
+    )
+    diff_cli.add_argument(
+        '--json',
+        help='Print the differences in JSON format',
+        action='store_true',
+        default=False
+    )
     # ADD CLI
     add_cli =subparser.add_parser(
         name='add',
@@ -198,12 +336,31 @@ def _parse_args(cmd = None):
         default='custom',
         help="Resource layout. Defaults to 'custom', but it is deduced from json data if possible"
     )
+    add_cli.add_argument(
+        '--defer-missing',
+        help='Queue the sections missing in the added paths instead of requesting them one by one',
+        action='store_true',
+        default=False
+    )
+    add_cli.add_argument(
+        '--drain-queue',
+        help='Add the queued resources. Their URLs are opened at once, and the results may be pasted in any order',
+        action='store_true',
+        default=False
+    )
+    add_cli.add_argument(
+        '--watch-clipboard',
+        help='Add the resources copied to the clipboard as they are copied, until Ctrl+C. '
+             'They are written and committed in batches',
+        action='store_true',
+        default=False
+    )
     add_cli.add_argument(
         'data',
         nargs='*',
         type=str,
         metavar='NAME_DATA',
-        help='Name, or details in JSON format, of the resource to be added. This JSON is returned by the corresponding datasource toolkit.js when executed in the correspondent page.'
+        help='Name, or details in JSON format, of the resource to be added. This JSON is returned by the corresponding datasource toolkit.js when executed in the correspondent page. Use - to read a JSON resource, or an array of them, from stdin'
     )
     # Remove CLI
     remove_cli = subparser.add_parser(
@@ -237,6 +394,20 @@ def _parse_args(cmd = None):
         type=str,
         help='Name regex to filter the results'
     )
+    list_cli.add_argument(
+        '-w', '--where',
+        type=str,
+        action='append',
+        metavar='EXPR',
+        help='Filter by metadata, e.g. "difficulty=hard and status!=completed" or "points>=100 and tags=Offensive". '
+             'Operators: = != > >= < <= ~ (wildcards), combined with and/or/not. Repeat the option to combine them with and'
+    )
+    list_cli.add_argument(
+        '-s', '--sort',
+        type=str,
+        metavar='FIELD',
+        help="Sort results by any metadata field or attribute (e.g. points, completion_date). Use '--sort=-FIELD' for descending order"
+    )
     list_cli.add_argument(
         'categories',
         metavar='CAT',
@@ -246,6 +417,34 @@ def _parse_args(cmd = None):
         default=['all']
     )
 
+    # Stats CLI
+    stats_cli = subparser.add_parser(
+        name='stats',
+        help='Shows vault statistics',
+        description='Shows aggregated statistics of the vault: resources per category and type, points, '
+                    'completion rate per difficulty and resources created/completed per week'
+    )
+    stats_cli.add_argument(
+        '-w', '--where',
+        type=str,
+        action='append',
+        metavar='EXPR',
+        help='Aggregate only the resources matching this metadata filter (see `htv list -h`)'
+    )
+    stats_cli.add_argument(
+        '--json',
+        help='Print the statistics in JSON format',
+        action='store_true',
+        default=False
+    )
+    stats_cli.add_argument(
+        'categories',
+        metavar='CAT',
+        nargs='*',
+        help="Categories to be aggregated. Use 'all' to aggregate everything (default)",
+        default=['all']
+    )
+
     # Use CLI
     use_cli = subparser.add_parser(
         name='use',
@@ -260,12 +459,18 @@ def _parse_args(cmd = None):
     )
 
     # Clean CLI
-    subparser.add_parser(
+    clean_cli = subparser.add_parser(
         name='clean',
         help='Removes temp files and cache data',
         description='Removes hidden directories, temp files and cache data created by text editors. '
              'We do not want them in the repo'
     )
+    clean_cli.add_argument(
+        '--dedupe',
+        help='Replace resources copied out of their category (e.g. modules copied into paths) by links',
+        action='store_true',
+        default=False
+    )
 
     # Add add-on parsers
     for _ in (ROOT_PKG / 'datasources').iterdir():
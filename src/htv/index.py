@@ -0,0 +1,769 @@
+from pathlib import Path
+import sys
+
+ROOT_PKG = Path(__file__).parents[1] # Points to install-dir/src/
+sys.path.insert(0, str(ROOT_PKG))
+
+from htv.utils import CONF, FileLock, FsTools, Git, Snapshot
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from fnmatch import fnmatch
+from functools import lru_cache
+from typing import Callable
+
+import atexit
+import pickle
+import yaml
+import json
+import os
+import re
+
+__all__ = [
+    'aggregate',
+    'diff',
+    'Index',
+    'InfoCache',
+    'Query',
+]
+
+#####   C L A S S E S   #####
+
+class Query:
+    """
+    Compiled filter expression evaluated over :class:`Index` records.
+
+    Expressions are comparisons ``field OP value`` combined with ``and``, ``or``, ``not`` and parentheses.
+    Operators: ``=``, ``!=``, ``>``, ``>=``, ``<``, ``<=`` and ``~`` (case-insensitive wildcard match).
+    On list fields (e.g. ``tags``) ``=`` and ``~`` match if any item matches. Use ``none`` to match empty values.
+
+    >>> Query("type=htb.LabMachine and difficulty=hard and status!=completed")
+    >>> Query("categories~htb/academy* and points>=100 and tags=Offensive")
+
+    :ivar expr: [str] Source expression
+    """
+    __token_regex__ = re.compile(
+        r"\s*(?:(?P<par>[()])|(?P<op>!=|>=|<=|=|>|<|~)|\"(?P<dq>[^\"]*)\"|'(?P<sq>[^']*)'|(?P<word>[^\s()=!<>~\"']+))"
+    )
+
+    """Field aliases"""
+    __aliases__ = dict(type='__type__', path='__path__', category='categories')
+
+    def __init__(self, expr: str):
+        """Compile an expression
+
+        :param expr: Filter expression
+        :raise ValueError: If the expression is not valid
+        """
+        self.expr = str(expr)
+        self._tokens = self._tokenize(self.expr)
+        self._pos = 0
+        self._predicate = self._parse_or()
+        if self._pos < len(self._tokens):
+            raise ValueError(f"Unexpected token '{self._tokens[self._pos][1]}' in query '{self.expr}'")
+
+    def __repr__(self) -> str:
+        return f"Query({self.expr})"
+
+    def __call__(self, record: dict) -> bool:
+        return self._predicate(record)
+
+    @staticmethod
+    def _tokenize(expr: str) -> list[tuple[str, str]]:
+        _tokens = list()
+        pos = 0
+        expr = expr.strip()
+        while pos < len(expr):
+            _match = Query.__token_regex__.match(expr, pos)
+            if _match is None or _match.end() == pos:
+                raise ValueError(f"Invalid query '{expr}' (position {pos})")
+            _kind = _match.lastgroup
+            _value = _match.group(_kind)
+            if _kind in ['dq', 'sq']:  # Quoted values are always literals
+                _tokens.append(('str', _value))
+            elif _kind == 'word' and _value.lower() in ['and', 'or', 'not']:
+                _tokens.append((_value.lower(), _value))
+            else:
+                _tokens.append((_kind, _value))
+            pos = _match.end()
+        return _tokens
+
+    def _peek(self) -> tuple[str, str] | None:
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+
+    def _next(self, *kinds) -> tuple[str, str]:
+        _tk = self._peek()
+        if _tk is None or (len(kinds) > 0 and _tk[0] not in kinds):
+            raise ValueError(f"Incomplete query '{self.expr}'. Expected {' or '.join(kinds)}")
+        self._pos += 1
+        return _tk
+
+    def _parse_or(self) -> Callable:
+        _terms = [self._parse_and()]
+        while self._peek() is not None and self._peek()[0] == 'or':
+            self._next()
+            _terms.append(self._parse_and())
+        return _terms[0] if len(_terms) == 1 else lambda r: any(t(r) for t in _terms)
+
+    def _parse_and(self) -> Callable:
+        _terms = [self._parse_not()]
+        while self._peek() is not None and self._peek()[0] == 'and':
+            self._next()
+            _terms.append(self._parse_not())
+        return _terms[0] if len(_terms) == 1 else lambda r: all(t(r) for t in _terms)
+
+    def _parse_not(self) -> Callable:
+        if self._peek() is not None and self._peek()[0] == 'not':
+            self._next()
+            _term = self._parse_not()
+            return lambda r: not _term(r)
+        elif self._peek() is not None and self._peek()[1] == '(':
+            self._next('par')
+            _term = self._parse_or()
+            if self._next('par')[1] != ')':
+                raise ValueError(f"Unbalanced parenthesis in query '{self.expr}'")
+            return _term
+        return self._parse_comparison()
+
+    def _parse_comparison(self) -> Callable:
+        field = self._next('word')[1]
+        field = Query.__aliases__.get(field, field)
+        op = self._next('op')[1]
+        kind, value = self._next('word', 'str')
+        if kind == 'word' and value.lower() in ['none', 'null']:
+            value = None
+        return Query._compile(field, op, value)
+
+    @staticmethod
+    def _compile(field: str, op: str, value: str | None) -> Callable:
+        _num = Query._to_number(value)
+
+        def _eq(x) -> bool:
+            if x is None or value is None:
+                return x is None and value is None
+            if _num is not None and Query._to_number(x) is not None:
+                return Query._to_number(x) == _num
+            return str(x).lower() == value.lower()
+
+        def _match(x) -> bool:
+            return x is not None and value is not None and fnmatch(str(x).lower(), value.lower())
+
+        def _order(x) -> int | None:
+            """-1, 0, 1 comparing x against value. None if not comparable"""
+            if x is None or value is None:
+                return None
+            if _num is not None and Query._to_number(x) is not None:
+                x, y = Query._to_number(x), _num
+            else:
+                x, y = str(x).lower(), value.lower()
+            return (x > y) - (x < y)
+
+        def _any(x, test) -> bool:
+            if isinstance(x, list | tuple):
+                return any(test(i) for i in x) if len(x) > 0 else test(None)
+            return test(x)
+
+        if op == '=':
+            return lambda r: _any(r.get(field), _eq)
+        elif op == '!=':
+            return lambda r: not _any(r.get(field), _eq)
+        elif op == '~':
+            return lambda r: _any(r.get(field), _match)
+        _cmp = {
+            '>': lambda c: c > 0,
+            '>=': lambda c: c >= 0,
+            '<': lambda c: c < 0,
+            '<=': lambda c: c <= 0,
+        }[op]
+        return lambda r: _any(r.get(field), lambda x: (c := _order(x)) is not None and _cmp(c))
+
+    @staticmethod
+    def _to_number(value) -> float | None:
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, int | float):
+            return float(value)
+        try:
+            return float(str(value))
+        except (ValueError, TypeError):
+            return None
+
+    @staticmethod
+    def sort_key(field: str) -> Callable:
+        """Sort key over a record field. Empty values are placed last, numbers before text
+
+        :param field: Field name. Aliases are allowed (e.g. `type`)
+        """
+        field = Query.__aliases__.get(field, field)
+
+        def _key(record: dict) -> tuple:
+            v = record.get(field)
+            if isinstance(v, list | tuple):
+                v = ', '.join(map(str, v)) if len(v) > 0 else None
+            if v is None:
+                return 1, 0, 0.0, ''
+            elif Query._to_number(v) is not None:
+                return 0, 0, Query._to_number(v), ''
+            return 0, 1, 0.0, str(v).lower()
+        return _key
+
+
+class InfoCache:
+    """
+    Cache of parsed resource files (`info.yml`), saved within the vault (`.htv/info.cache`).
+
+    Entries are keyed by absolute path, and they are valid while the file keeps its mtime and size.
+    Parsed data is kept pickled, so every :func:`InfoCache.get` returns a fresh copy that can be modified,
+    and loading an unchanged resource skips YAML parsing.
+    The cache file is saved once, when the process exits.
+
+    :ivar root: [`Path`] Vault directory
+    :cvar __instances__: [dict] Shared instances, one per vault (see :func:`InfoCache.shared`)
+    """
+    __route__ = Path('.htv/info.cache')  # Relative to the vault
+    __version__ = 1
+    __instances__ = dict()
+
+    @staticmethod
+    def shared(root: str | Path = None) -> 'InfoCache':
+        """Get the cache of a vault, shared within this process. It is saved at exit
+
+        :param root: Vault directory. Defaults to `CONF['VAULT_DIR']`
+        """
+        root = Path(CONF['VAULT_DIR'] if root is None else root)
+        if root not in InfoCache.__instances__:
+            InfoCache.__instances__[root] = InfoCache(root)
+            atexit.register(InfoCache.__instances__[root].save)
+        return InfoCache.__instances__[root]
+
+    def __init__(self, root: str | Path = None):
+        """
+        :param root: Vault directory. Defaults to `CONF['VAULT_DIR']`
+        """
+        self.root = Path(CONF['VAULT_DIR'] if root is None else root)
+        self._entries = dict()  # {abs_path: (mtime_ns, size, pickled data)}
+        self._changed = False
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def path(self) -> Path:
+        """Absolute path of the cache file"""
+        return self.root / self.__route__
+
+    def get(self, path: str | Path) -> dict | None:
+        """Get the parsed contents of a YAML file
+
+        :param path: Path of the file
+        :return: A copy of the parsed data. None if the file is missing, or it is not a YAML mapping
+        """
+        _key = os.path.abspath(path)
+        try:
+            _stat = os.stat(_key)
+        except OSError:
+            return None
+        _entry = self._entries.get(_key)
+        if _entry is not None and _entry[0] == _stat.st_mtime_ns and _entry[1] == _stat.st_size:
+            self.hits += 1
+            return pickle.loads(_entry[2])
+        self.misses += 1
+        try:
+            with open(_key, 'r') as file:
+                _data = FsTools.load_yaml(file)
+        except (yaml.YAMLError, UnicodeDecodeError):
+            return None
+        if not isinstance(_data, dict):
+            return None
+        self._entries[_key] = (_stat.st_mtime_ns, _stat.st_size, pickle.dumps(_data, protocol=5))
+        self._changed = True
+        return _data
+
+    def load(self) -> None:
+        """Load the cache from disk. If missing, corrupted or outdated, it is empty"""
+        try:
+            with FileLock.of(self.path).shared(), open(self.path, 'rb') as file:
+                _data = pickle.load(file)
+            self._entries = _data['entries'] if _data.get('version') == self.__version__ else dict()
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, KeyError, TypeError):
+            self._entries = dict()
+
+    def save(self) -> None:
+        """Save the cache to disk, if it changed. Entries of deleted files are dropped"""
+        if not self._changed or not self.root.exists():
+            return
+        self._entries = {k: v for k, v in self._entries.items() if os.path.exists(k)}
+        os.makedirs(self.path.parent, exist_ok=True)
+        _tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with FileLock.of(self.path).exclusive():  # Read-only commands save it too
+            with open(_tmp, 'wb') as file:
+                pickle.dump(dict(version=self.__version__, entries=self._entries), file, protocol=5)
+            os.replace(_tmp, self.path)
+        self._changed = False
+
+    def clear(self) -> None:
+        """Drop all the entries, and the cache file"""
+        self._entries = dict()
+        self._changed = False
+        if self.path.exists():
+            self.path.unlink()
+
+
+class Index:
+    """
+    Metadata index of the vault.
+
+    Keeps one flat record per resource (`info.yml`), with its metadata fields and scalar attributes,
+    so resources can be filtered and sorted without loading them.
+    Records are refreshed only when the `info.yml` file changed (mtime and size).
+    The index is saved within the vault (`.htv/index.json`), and it is excluded from the repository.
+
+    Records of paths (:class:`resources.HtvPath`) also keep the location of their sections and their `progress`.
+    A reverse map section -> paths is maintained, so when a section is completed (or not anymore)
+    only the progress of the paths containing it is updated.
+
+    :ivar root: [`Path`] Vault directory
+    :cvar __instances__: [dict] Shared instances, one per vault (see :func:`Index.shared`)
+    """
+    __route__ = Path('.htv/index.json')  # Relative to the vault
+    __version__ = 2
+    __instances__ = dict()
+
+    @staticmethod
+    def shared(root: str | Path = None) -> 'Index':
+        """Get the index of a vault, shared within this process. It is refreshed once, when first requested
+
+        :param root: Vault directory. Defaults to `CONF['VAULT_DIR']`
+        """
+        root = Path(CONF['VAULT_DIR'] if root is None else root)
+        if root not in Index.__instances__:
+            Index.__instances__[root] = Index(root).refresh()
+        return Index.__instances__[root]
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def resource_dir(_type: str) -> str | None:
+        """Location within the vault of the resources of a type
+
+        :param _type: Resource type (e.g. `htb.AcademyModule`)
+        :return: Resource dir (e.g. `htb/academy/module`), None if the type is unknown
+        """
+        from htv.resources import DataSources  # Resources depend on the index
+        return getattr(DataSources.get(_type), '__resource_dir__', None)
+
+    def __init__(self, root: str | Path = None):
+        """
+        :param root: Vault directory. Defaults to `CONF['VAULT_DIR']`
+        """
+        self.root = Path(CONF['VAULT_DIR'] if root is None else root)
+        self._records = dict()  # {rel_path: record}
+        self._paths = dict()  # {section_rel_path: set(path_rel_path)}, reverse map of path sections
+        self._changed = False
+        self.load()
+
+    def get(self, path: str | Path, default=None) -> dict | None:
+        """Get the record of a resource
+
+        :param path: Resource path. Absolute, or relative to the vault
+        :param default: Value returned if the resource is not indexed
+        """
+        path = Path(path)
+        if path.is_absolute():
+            try:
+                path = path.relative_to(self.root)
+            except ValueError:  # Resource outside this vault
+                return default
+        return self._records.get(path.as_posix(), default)
+
+    def progress(self, path: str | Path) -> float:
+        """Progress of a path: completed sections / total sections
+
+        :param path: Path resource. Absolute, or relative to the vault
+        :return: Progress [0.0, 1.0]. 0.0 if the resource is not indexed, or it is not a path
+        """
+        return self.get(path, dict()).get('progress', 0.0)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+    def __contains__(self, item) -> bool:
+        return str(item) in self._records
+
+    def __getitem__(self, item) -> dict:
+        return self._records[str(item)]
+
+    @property
+    def path(self) -> Path:
+        """Absolute path of the index file"""
+        return self.root / self.__route__
+
+    @property
+    def records(self) -> list[dict]:
+        """Indexed records, sorted by path"""
+        return [self._records[k] for k in sorted(self._records)]
+
+    @staticmethod
+    def record(data: dict, path: str) -> dict:
+        """Build the index record of a serialized resource
+
+        Metadata fields are flattened. Scalar attributes are copied, list attributes (sections, tasks, targets)
+        are replaced by their length.
+
+        :param data: Serialized resource (`info.yml` contents)
+        :param path: Resource path, relative to the vault
+        :return: Index record
+        """
+        path = Path(path)
+        _rec = dict(
+            __type__=data.get('__type__', 'custom'),
+            __path__=path.as_posix(),
+            name=path.name,
+            categories=path.parent.as_posix(),
+        )
+        for k, v in data.items():
+            if k in ['__type__', 'metadata'] or k.startswith('__'):
+                continue
+            elif isinstance(v, list):
+                _rec[k] = len(v)
+            elif isinstance(v, str | int | float | bool | None):
+                _rec[k] = v
+        for k, v in (data.get('metadata') or dict()).items():
+            if isinstance(v, list):
+                _rec[k] = [i for i in v if isinstance(i, str | int | float)]
+            elif isinstance(v, str | int | float | bool | None):
+                _rec[k] = v
+            else:
+                _rec[k] = str(v)
+        _sections = data.get('sections')
+        if isinstance(_sections, list) and len(_sections) > 0 and all(
+                isinstance(st, dict) and isinstance(st.get('metadata'), dict) for st in _sections):
+            # Path sections are serialized resources. Keep their location within the vault
+            _rec['__sections__'] = list()
+            for st in _sections:
+                _dir = Index.resource_dir(st.get('__type__', 'custom'))
+                if _dir is not None and st['metadata'].get('title') is not None:
+                    _rec['__sections__'].append(f"{_dir}/{FsTools.secure_dirname(st['metadata']['title'])}")
+        return _rec
+
+    def load(self) -> None:
+        """Load the index from disk. If missing or outdated, it is empty until refreshed"""
+        try:
+            with FileLock.of(self.path).shared(), open(self.path, 'r') as file:
+                _data = json.load(file)
+            if _data.get('version') == self.__version__:
+                self._records = _data.get('records', dict())
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._records = dict()
+        self._paths = dict()
+        for _key, _rec in self._records.items():
+            self._link(_key, _rec)
+
+    def save(self) -> None:
+        """Save the index to disk, if it changed"""
+        if not self._changed:
+            return
+        os.makedirs(self.path.parent, exist_ok=True)
+        _tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with FileLock.of(self.path).exclusive():  # Read-only commands (`list`, `stats`) save it too
+            with open(_tmp, 'w') as file:
+                json.dump(dict(version=self.__version__, records=self._records), file, separators=(',', ':'))
+            os.replace(_tmp, self.path)
+        self._changed = False
+
+    def scan(self) -> dict[str, os.stat_result]:
+        """Find all the resources (`info.yml`) of the vault. Hidden directories are skipped
+
+        :return: Mapping {rel_path: stat of the info.yml}
+        """
+        _found = dict()
+        if not self.root.exists():
+            return _found
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if 'info.yml' in filenames:
+                _rel = Path(dirpath).relative_to(self.root).as_posix()
+                _found[_rel] = os.stat(os.path.join(dirpath, 'info.yml'))
+                dirnames.clear()  # Resources do not contain other resources
+            else:
+                dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        return _found
+
+    def refresh(self) -> 'Index':
+        """Synchronize the index with the vault
+
+        Only new or modified `info.yml` files are parsed. Records of deleted resources are dropped.
+
+        :return: This index, to allow chaining
+        """
+        _found = self.scan()
+        for _rel in set(self._records) - set(_found):  # Deleted resources
+            self._records.pop(_rel)
+            self._changed = True
+        for _rel, _stat in _found.items():
+            _rec = self._records.get(_rel)
+            if _rec is not None and _rec.get('__mtime__') == _stat.st_mtime_ns and _rec.get('__size__') == _stat.st_size:
+                continue  # Up-to-date
+            _data = InfoCache.shared(self.root).get(self.root / _rel / 'info.yml')
+            if _data is None:
+                print(f"[!] Cannot parse '{_rel}/info.yml'. Skipped from index")
+                continue
+            self.update(_rel, _data, _stat)
+        self.save()
+        return self
+
+    def update(self, path: str | Path, data: dict, stat: os.stat_result = None) -> dict:
+        """Add or replace a record
+
+        If the resource is completed, or not anymore, the progress of the paths containing it is updated.
+
+        :param path: Resource path, relative to the vault
+        :param data: Serialized resource
+        :param stat: Stat of the `info.yml`. Used to detect changes in the file
+        :return: The new record
+        """
+        _rec = Index.record(data, path)
+        if stat is not None:
+            _rec.update(__mtime__=stat.st_mtime_ns, __size__=stat.st_size)
+        _key = _rec['__path__']
+        _old = self._records.get(_key)
+        if _old is not None:
+            self._unlink(_key, _old)
+        if '__sections__' in _rec:  # Count completed sections once, then it is updated incrementally
+            _rec['__done__'] = sum(
+                1 for st in _rec['__sections__'] if st in self._records and is_completed(self._records[st])
+            )
+            _rec['progress'] = Index._ratio(_rec['__done__'], len(_rec['__sections__']))
+        self._records[_key] = _rec
+        self._link(_key, _rec)
+        self._propagate(_key, _old is not None and is_completed(_old), is_completed(_rec))
+        self._changed = True
+        return _rec
+
+    def remove(self, path: str | Path) -> dict | None:
+        """Remove a record
+
+        :param path: Resource path, relative to the vault
+        :return: The removed record, None if not found
+        """
+        _key = Path(path).as_posix()
+        _rec = self._records.pop(_key, None)
+        if _rec is not None:
+            self._unlink(_key, _rec)
+            self._propagate(_key, is_completed(_rec), False)
+            self._changed = True
+        return _rec
+
+    @staticmethod
+    def _ratio(done: int, total: int) -> float:
+        return round(done / total, 4) if total > 0 else 0.0
+
+    def _link(self, key: str, record: dict) -> None:
+        """Register the sections of a path in the reverse map"""
+        for st in record.get('__sections__', list()):
+            self._paths.setdefault(st, set()).add(key)
+
+    def _unlink(self, key: str, record: dict) -> None:
+        """Remove the sections of a path from the reverse map"""
+        for st in record.get('__sections__', list()):
+            self._paths.get(st, set()).discard(key)
+
+    def _propagate(self, key: str, was_completed: bool, completed: bool) -> None:
+        """Update the progress of the paths containing a resource whose completion changed"""
+        if was_completed == completed:
+            return
+        for _path in self._paths.get(key, set()):
+            _rec = self._records[_path]
+            # A section may be included more than once in the same path
+            _rec['__done__'] += (1 if completed else -1) * _rec['__sections__'].count(key)
+            _rec['progress'] = Index._ratio(_rec['__done__'], len(_rec['__sections__']))
+
+    @staticmethod
+    def snapshot(source: str | Path = None, root: str | Path = None) -> list[dict]:
+        """Records of a state of the vault, sorted by path
+
+        :param source: State of the vault. One of:
+
+            - None: current state (the index is refreshed first)
+            - An index file (`.json`), e.g. a copy of `.htv/index.json`
+            - A snapshot (see `htv export`), compressed or not
+            - A git revision of the vault (e.g. `HEAD~1`, `ORIG_HEAD`). Its `info.yml` files are read from the repository
+
+        :param root: Vault directory. Defaults to `CONF['VAULT_DIR']`
+        :return: Index records
+        :raise ValueError: If the file is not valid, or the revision is not found
+        """
+        root = Path(CONF['VAULT_DIR'] if root is None else root)
+        if source is None:
+            return Index.shared(root).refresh().records
+        elif Path(source).is_file() and Path(source).suffix == '.json':
+            try:
+                with open(source, 'r') as file:
+                    _data = json.load(file)
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                raise ValueError(f"Not an index ({source}). {e}")
+            if not isinstance(_data, dict) or _data.get('version') != Index.__version__:
+                raise ValueError(f"Not an index, or outdated ({source})")
+            _records = list(_data.get('records', dict()).values())
+        elif Path(source).is_file():
+            _records = [
+                Index.record(entry['resource'], entry['path'])
+                for entry in Snapshot.read(source) if isinstance(entry.get('resource'), dict)
+            ]
+        else:
+            _records = list()
+            for _file, _content in Git.read_files(str(source), 'info.yml', path=root):
+                try:
+                    _data = FsTools.load_yaml(_content)
+                except yaml.YAMLError:
+                    _data = None
+                if not isinstance(_data, dict):
+                    print(f"[!] Cannot parse '{_file}' ({source}). Skipped")
+                    continue
+                _records.append(Index.record(_data, Path(_file).parent))
+        return sorted(_records, key=lambda r: r['__path__'])  # Snapshots and git trees are nearly sorted already
+
+    def query(self, where: str | Query = None, sort: str = None, categories: list[str] = None, name: str = None) -> list[dict]:
+        """Filter and sort the indexed records
+
+        :param where: Filter expression (see :class:`Query`). If None, all the records match
+        :param sort: Field used to sort the results. Prefix it with '-' for descending order. Defaults to path
+        :param categories: Only records within these categories are returned. If None, or 'all', no filter is applied
+        :param name: Wildcard applied on the resource name (see `htv list -n`)
+        :return: Matching records
+        """
+        if where is not None and not isinstance(where, Query):
+            where = Query(where)
+        _prefixes = [
+            str(c).replace('.', '/').strip('/') + '/' for c in (categories or list()) if c not in ['all', '']
+        ]
+        if name not in [None, ''] and name.find('*') == -1:
+            name = f"*{name}*"
+        _res = [
+            r for r in self.records
+            if (len(_prefixes) == 0 or any(f"{r['__path__']}/".startswith(p) for p in _prefixes))
+            and (name in [None, ''] or fnmatch(r['name'], name))
+            and (where is None or where(r))
+        ]
+        if sort not in [None, '']:
+            _res.sort(key=Query.sort_key(sort.lstrip('-')), reverse=sort.startswith('-'))
+            if sort.startswith('-'):  # Keep empty values at the end
+                _res.sort(key=lambda r: Query.sort_key(sort.lstrip('-'))(r)[0])
+        return _res
+
+
+#####   F U N C T I O N S   #####
+
+"""Status values considered as completed (case-insensitive)"""
+COMPLETED_STATUS = ['completed', 'complete', 'done', 'owned', 'solved', 'pwned']
+
+def is_completed(record: dict) -> bool:
+    """A resource is completed if it has a completion date, or its status says so
+
+    :param record: Index record
+    """
+    return record.get('completion_date') is not None or str(record.get('status')).lower() in COMPLETED_STATUS
+
+def iso_week(date: str | None) -> str | None:
+    """ISO week of a date string (e.g. `2025-05-19 18:04:39 +0200` -> `2025-W21`)
+
+    :param date: Date string, as generated by :func:`utils.Templater.now`. Only the date part is used
+    :return: Week string, None if the date is not valid
+    """
+    try:
+        _year, _week, _ = datetime.fromisoformat(str(date)[:10]).isocalendar()
+        return f"{_year}-W{_week:02d}"
+    except ValueError:
+        return None
+
+def diff(old: Iterable[dict], new: Iterable[dict]) -> Iterator[tuple[str, str, dict]]:
+    """Compare two states of the vault in a single pass (sorted-merge over the resource paths)
+
+    Fields are compared by value. Internal fields (`__mtime__`, `__sections__`, ...) and the `progress` of paths
+    (derived from other resources) are not compared, but the type (`__type__`) is.
+
+    :param old: Index records of the old state, sorted by path (see :func:`Index.snapshot`)
+    :param new: Index records of the new state, sorted by path
+    :return: Iterator over the differences (change, path, fields), where change is '+' (added), '-' (removed)
+        or '*' (changed), and fields maps each changed field to its values {field: (old, new)}
+    :raise ValueError: If the records are not sorted by path. Raised while iterating
+    """
+    def _sorted(records: Iterable[dict]) -> Iterator[dict]:
+        _last = None
+        for r in records:
+            if _last is not None and r['__path__'] <= _last:
+                raise ValueError(f"Records not sorted by path ('{r['__path__']}' after '{_last}')")
+            _last = r['__path__']
+            yield r
+
+    def _fields(record: dict) -> dict:
+        return {k: v for k, v in record.items() if (k == '__type__' or not k.startswith('__')) and k != 'progress'}
+
+    _old, _new = _sorted(old), _sorted(new)
+    a, b = next(_old, None), next(_new, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a['__path__'] < b['__path__']):
+            yield '-', a['__path__'], dict()
+            a = next(_old, None)
+        elif a is None or b['__path__'] < a['__path__']:
+            yield '+', b['__path__'], dict()
+            b = next(_new, None)
+        else:
+            _a, _b = _fields(a), _fields(b)
+            _delta = {k: (_a.get(k), _b.get(k)) for k in sorted(_a.keys() | _b.keys()) if _a.get(k) != _b.get(k)}
+            if len(_delta) > 0:
+                yield '*', a['__path__'], _delta
+            a, b = next(_old, None), next(_new, None)
+
+def aggregate(records: Iterable[dict]) -> dict:
+    """Compute vault statistics in a single pass over the index records
+
+    The records are first split into columns, then each aggregate is computed over the columns it needs.
+
+    :param records: Index records (see :func:`Index.query`)
+    :return: Dictionary with the aggregates: counts per category and type, points, completion per difficulty,
+        progress of the paths and resources created/completed per week
+    """
+    _fields = ['__type__', 'categories', 'difficulty', 'points', 'creation_date', 'completion_date']
+    _cols = {f: list() for f in _fields}
+    _done = list()
+    _records = list(records)
+    for r in _records:  # Columnar layout, one pass
+        for f in _fields:
+            _cols[f].append(r.get(f))
+        _done.append(is_completed(r))
+
+    _points = [Query._to_number(p) or 0.0 for p in _cols['points']]
+    _week = lru_cache(maxsize=None)(iso_week)  # Many resources share the same dates
+    _by_difficulty = dict()
+    for _diff, _ok in zip(_cols['difficulty'], _done):
+        _entry = _by_difficulty.setdefault(str(_diff).lower() if _diff is not None else 'unknown', [0, 0])
+        _entry[0] += 1
+        _entry[1] += _ok
+    return dict(
+        total=len(_done),
+        completed=sum(_done),
+        by_category=dict(sorted(Counter(_cols['categories']).items())),
+        by_type=dict(sorted(Counter(_cols['__type__']).items())),
+        points=dict(
+            total=sum(_points),
+            completed=sum((p for p, _ok in zip(_points, _done) if _ok), 0.0)
+        ),
+        by_difficulty={
+            k: dict(total=v[0], completed=v[1], rate=round(v[1] / v[0], 4))
+            for k, v in sorted(_by_difficulty.items())
+        },
+        progress={
+            r['__path__']: r['progress'] for r in _records if 'progress' in r
+        },
+        created_per_week=dict(sorted(Counter(
+            w for w in map(_week, _cols['creation_date']) if w is not None
+        ).items())),
+        completed_per_week=dict(sorted(Counter(
+            w for w, _ok in zip(map(_week, _cols['completion_date']), _done) if w is not None and _ok
+        ).items())),
+    )
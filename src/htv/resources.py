@@ -7,13 +7,20 @@ ROOT_PKG = Path(__file__).parents[1] # Points to install-dir/src/
 sys.path.insert(0, str(ROOT_PKG))
 ## TEMPLATE END
 
-from htv.utils import CONF, FsTools, Templater, open_browser_tab, Git, Cache, flatten
-from collections.abc import Iterable
+from htv.utils import CONF, Batch, ClipboardWatcher, FsTools, Templater, open_browser_tab, Git, Cache, FileLock, JsonStream, Queue, \
+    Snapshot, flatten
+from htv.index import Index, InfoCache, Query, aggregate, diff
+from htv.schema import Schema, SchemaError
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from typing import TextIO
 from htv import ROOT_DIR
 from tqdm import tqdm
 
+import copy
 import importlib
+import io
+import filecmp
 import shutil
 import yaml
 import json
@@ -48,6 +55,40 @@ def is_resource(path: str | Path) -> bool:
     )
 
 
+def _same_tree(left: Path, right: Path) -> bool:
+    """Compare the contents of two directories, recursively"""
+    _cmp = filecmp.dircmp(left, right)
+    if len(_cmp.left_only) > 0 or len(_cmp.right_only) > 0 or len(_cmp.funny_files) > 0:
+        return False
+    _, _mismatch, _errors = filecmp.cmpfiles(left, right, _cmp.common_files, shallow=False)
+    if len(_mismatch) > 0 or len(_errors) > 0:
+        return False
+    return all(_same_tree(left / d, right / d) for d in _cmp.common_dirs)
+
+
+_PLAIN_TYPES = frozenset([str, int, float, bool, dict, type(None)])  # Serialized as they are
+
+
+def _serialize(key: str, value):
+    """Serializable representation of an attribute value (see :func:`CustomResource.to_dict`)"""
+    if type(value) in _PLAIN_TYPES or isinstance(value, str | int | float | dict):
+        return value
+    elif isinstance(value, CustomResource | Metadata):
+        return value.to_dict()
+    elif isinstance(value, Iterable):  # sections
+        _ret = list()
+        for _ in value:
+            if type(_) in _PLAIN_TYPES or isinstance(_, str | int | float | dict):
+                _ret.append(_)
+            elif isinstance(_, HtvResource | Metadata | HtvModule.Section | HtvExercise.Task):
+                _ret.append(_.to_dict())
+            else:
+                raise TypeError(f"Unknown type ({type(_)}) for attribute '{key}' ({_})")
+        return _ret
+    print(f"[-] Unknown type for attribute '{key}' ({value})")
+    return value
+
+
 class Metadata:
 
     def __init__(self):
@@ -92,6 +133,8 @@ class CustomResource:
     __type__ = None  # :str E.g. htb.AcademyModule
     # File reference
     __resource_dir__ = None  # :str E.g. academy/module
+    # Serialization plans, by class and attributes (see :func:`CustomResource.__plan__`)
+    __plans__ = dict()
 
 
     def __init__(self, category: str | Path | tuple = None, _type: str = None, **kwargs):
@@ -142,7 +185,8 @@ class CustomResource:
         """Secure file name (no spaces, no special chars, lowercased)"""
         # re.sub('[ ,&-/:]+', '-', str(self._name)).lower()
         if hasattr(self, 'metadata'):
-            return FsTools.secure_dirname(self.metadata.title)
+            _title = self.metadata.title
+            return self.__memoize__('name', (_title,), lambda: FsTools.secure_dirname(_title))
         elif hasattr(self, '_name'):
             return FsTools.secure_dirname(getattr(self, '_name'))
         else:
@@ -152,7 +196,51 @@ class CustomResource:
     @property
     def path(self) -> Path:
         """Absolute path of this resource"""
-        return CONF['VAULT_DIR'] / self.__resource_dir__ / self.name
+        _deps = (CONF['VAULT_DIR'], self.__resource_dir__, self.name)
+        return self.__memoize__('path', _deps, lambda: _deps[0] / _deps[1] / _deps[2])
+
+    def __memoize__(self, key: str, deps: tuple, func):
+        """Get a cached value, recomputing it only if any of its dependencies changed
+
+        :param key: Name of the cached value
+        :param deps: Values the cached value depends on (e.g. title, resource dir, vault dir)
+        :param func: Callable computing the value
+        :return: The cached value
+        """
+        _cc = self.__dict__.setdefault('__cache__', dict())
+        if key not in _cc or _cc[key][0] != deps:
+            _cc[key] = (deps, func())
+        return _cc[key][1]
+
+    def __defer__(self, key: str, value) -> None:
+        """Keep a serialized attribute to be loaded on first access (see :func:`CustomResource.__resolve__`)
+
+        Heavy collections (sections, tasks, targets) are not deserialized until they are needed,
+        so loading a resource only parses its type and metadata
+
+        :param key: Name of the attribute
+        :param value: Serialized value
+        """
+        _deferred = self.__dict__.setdefault('__deferred__', dict())
+        if key in _deferred:  # Load the previous value first, setters may extend the current value
+            getattr(self, key)
+        _deferred[key] = value
+
+    def __resolve__(self, key: str, load):
+        """Get an attribute, loading its deferred value if any
+
+        :param key: Name of the attribute. Its value is stored in the private attribute `_<key>`
+        :param load: Callable receiving the serialized value and loading it into `_<key>`
+        :return: The attribute value
+        """
+        _deferred = self.__dict__.get('__deferred__', dict())
+        if key in _deferred:
+            load(_deferred.pop(key))
+        return getattr(self, f"_{key}")
+
+    def invalidate(self) -> None:
+        """Drop the cached values (name, path). They are recomputed on next access"""
+        self.__dict__.pop('__cache__', None)
 
     def __str__(self) -> str:
         return self.name
@@ -179,6 +267,30 @@ class CustomResource:
         return hash(self.path)
 
 
+    def __plan__(self, include_private: bool) -> tuple[tuple[str, str, bool], ...]:
+        """Serialization plan of this resource: which attributes are serialized, and how
+
+        Plans are computed once for each class and set of attributes (see :func:`CustomResource.to_dict`)
+
+        :param include_private: If True, private attributes (starting with '_') are also serialized
+        :return: Tuples (key, attribute, read through its getter)
+        """
+        _attrs = tuple(self.__dict__)
+        _key = (type(self), _attrs, include_private)
+        _plan = CustomResource.__plans__.get(_key)
+        if _plan is None:
+            _plan = list()
+            for k in _attrs:
+                if k.startswith('__'):
+                    continue  # Always skip static attributes
+                elif k.startswith('_'):  # Replace private attributes by their getter
+                    if include_private:
+                        _plan.append((k.replace('_', ''), k.replace('_', ''), True))
+                else:
+                    _plan.append((k, k, False))
+            _plan = CustomResource.__plans__[_key] = tuple(_plan)
+        return _plan
+
     def to_dict(self, include_private: bool = True) -> dict:
         """
         :param include_private: If True, private attributes (starting with '_') are also serialized
@@ -188,44 +300,20 @@ class CustomResource:
             __type__=self.__type__,
             # __resource_dir__=self.__resource_dir__  # Ignore this attribute
         )
-        for k, v in vars(self).items():
-            if k.startswith('__'):
-                continue # Always skip static attributes
-            elif k.startswith('_') :  # Replace private attributes by their getter
-                if include_private:
-                    k = k.replace('_', '')
-                    v = self.__getattribute__(k)
-                else:
-                    continue # Skipping private attributes
-            if isinstance(v, str | int | float | dict | None):
-                _data[k] = v
-            elif isinstance(v, CustomResource | Metadata):
-                _data[k] = v.to_dict()
-            elif isinstance(v, Iterable):  # sections
-                _data[k] = list()
-                for _ in iter(v):
-                    if isinstance(_, str | int | float | dict | None):
-                        _data[k].append(_)
-                    elif isinstance(_, HtvResource | Metadata | HtvModule.Section | HtvExercise.Task):
-                        _data[k].append(_.to_dict())
-                    else:
-                        raise TypeError(f"Unknown type ({type(k)}) for attribute '{k}' ({_})")
-            else:
-                print(f"[-] Unknown type for attribute '{k}' ({v})")
-                _data[k] = v
+        _attrs = self.__dict__
+        for k, attr, getter in self.__plan__(include_private):
+            _data[k] = _serialize(k, getattr(self, attr) if getter else _attrs[attr])
         return _data
 
     def update(self, **kwargs):
         """Update the attributes of this resource
 
+        Values are set as they are. Serialized resources are coerced to their types on load (:class:`schema.Schema`)
+
         :param kwargs: Attributes to be updated
         :return: None
         """
         for key, value in kwargs.items():
-            if re.match(r"^[-+]?\d$", str(value)) is not None:
-                value = int(value)
-            elif re.match(r"^[-+]?\d*\.\d+$", str(value)) is not None:
-                value = float(value)
             try:
                 setattr(self, key, value)
             except AttributeError: # Property has no setter
@@ -264,10 +352,11 @@ class CustomResource:
     def __dir_struct__(self, *args) -> list:
         return [
             ('README.md', 't:custom.md', dict(resource=self)),
-            ('info.yml', yaml.dump(self.to_dict())),
+            ('info.yml', FsTools.dump_yaml(self.to_dict())),
             *args
         ]
 
+    @FileLock.vault().exclusive()
     def makedirs(self, *args, exists_ok: bool = False):
         """Dump serialized object to file
 
@@ -334,6 +423,7 @@ class FileResource(CustomResource):
     def __dir_struct__(self, *args) -> list:
         raise NotImplemented("FileResources are only files, no directories")
 
+    @FileLock.vault().exclusive()
     def makedirs(self, *args, exists_ok: bool = False):
         try:
             FsTools.dump_file(self.path, b'', exists_ok=exists_ok)
@@ -355,24 +445,43 @@ class HtvResource(CustomResource):
     def read_stdin(self, _stdout: tqdm | TextIO = sys.stdout):
         if self.metadata.url is not None:
             _stdout.write(f"[*] Opening module URL and waiting for input\n")
-            open_browser_tab(self.metadata.url, delay=3)
+            open_browser_tab(self.metadata.url)
         else:
             _stdout.write("[-] Resource's URL not defined. Manual browsing required")
         self.copy_js_toolkit(_stdout=_stdout)
 
         while True:
             # Init module
-            _user_input = input('>>> json: ')
+            _user_input = Batch.read()
             if _user_input == 'skip':
                 return None
             res = DataSources.load(_user_input)
+            if res is not None and not isinstance(res, CustomResource):  # Batch, other resources are added too
+                res = self._from_batch(res, _stdout=_stdout)
             if res is not None:
                 _stdout.write(f"[+] Module added\n")
                 return res
 
+    def _from_batch(self, resources: Iterable, _stdout: tqdm | TextIO = sys.stdout) -> 'HtvResource | None':
+        """Find this resource among the ones pasted at once. The others are added to the vault as they are read
+
+        :return: The resource found. None if the batch did not include it
+        """
+        _found = None
+        for r in flatten([resources]):
+            if not isinstance(r, CustomResource):
+                continue
+            elif r.path == self.path:
+                _found = r
+            elif not r.path.exists():
+                r.makedirs()
+        if _found is None:
+            _stdout.write(f"[-] {self.__repr__()} not found in the batch\n")
+        return _found
+
     def __dir_struct__(self, *args) -> list:
         return [
-            ('info.yml', yaml.dump(self.to_dict())),
+            ('info.yml', FsTools.dump_yaml(self.to_dict())),
             *args
         ]
 
@@ -426,16 +535,26 @@ class HtvModule(HtvResource):
             return dict(__type__=self.__type__, title=self.title)
 
 
+    __schema__ = dict(
+        sections=Schema.union(
+            Schema.of(int, nullable=False),
+            Schema.items(Schema.fields(dict(__type__=Schema.of(str), title=Schema.of(str)), extra=False))
+        )
+    )
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._sections = list()
 
     @property
     def sections(self) -> int | list[Section]:
-        return self._sections
+        return self.__resolve__('sections', self._load_sections)
 
     @sections.setter
     def sections(self, value: int | list[dict]) -> None:
+        self.__defer__('sections', value)
+
+    def _load_sections(self, value: int | list[dict]) -> None:
         if isinstance(value, list):
             self._sections = sorted([HtvModule.Section(**item, number=ind) for ind, item in enumerate(value, 1)])
         else:
@@ -449,10 +568,14 @@ class HtvModule(HtvResource):
     #     return '\n'.join(_index)
 
     def __dir_struct__(self, *args) -> list:
+        _nav = Templater.neighbors(self.sections)  # Computed once for the whole module
         return super().__dir_struct__(
             ('README.md', 't:module.md', dict(resource=self)),
             self.path / 'resources/img',
-            *[(_.__file_name__, 't:mod_section.md', dict(resource=self, section=_)) for _ in self.sections],
+            *[
+                (_.__file_name__, 't:mod_section.md', dict(resource=self, section=_, neighbors=_nav[ind]))
+                for ind, _ in enumerate(self.sections)
+            ],
             * args
             # Add custom files here
         )
@@ -483,25 +606,30 @@ class HtvPath(HtvResource):
 
     """
 
+    __schema__ = dict(sections=Schema.items(Schema.resource()))
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._sections = list() # Collection of modules and/or exercises
-        self._progress = 0.0
 
-    # TODO: status = completed_mods / total_mods (completed)
     @property
     def progress(self) -> str:
-        """Completion status string"""
-        return f"{self._progress * 100} % completed"
-        # return f"TODO: 0 % completed"
+        """Completion status string: completed sections / total sections
+
+        Progress is read from the vault index (:func:`index.Index.progress`), sections are not loaded
+        """
+        return f"{round(Index.shared().progress(self.path) * 100, 2)} % completed"
 
     @property
     def sections(self):
         """Collection of modules and/or exercises"""
-        return self._sections
+        return self.__resolve__('sections', self._load_sections)
 
     @sections.setter
     def sections(self, value: list[dict]):
+        self.__defer__('sections', value)
+
+    def _load_sections(self, value: list[dict]) -> None:
         for item in value: # Sections are Modules/Exercises
             m = DataSources.get(item.pop('__type__'))
             m.update(**item)
@@ -515,23 +643,49 @@ class HtvPath(HtvResource):
             *args
         )
 
-    def makedirs(self, *args, missing_ok: bool = False) -> None:
+    def link(self, index: int, section: HtvResource) -> Path:
+        """Location of the link to a section within this path (`sections/NN_name`)
+
+        :param index: Section number, starting at 1
+        :param section: Module or exercise of this path
+        """
+        return self.path / 'sections' / f"{Templater.pad_num(index, 2)}_{section.name}"
+
+    def makedirs(self, *args, missing_ok: bool = False, defer_missing: bool = False) -> None:
         """Create the directory structure of the path, including the corresponding modules/exercises
 
+        Sections are not copied into the path. The path contains links (`sections/`) to the
+        modules/exercises in their own category, so they are shared by all the paths including them.
+
         :param missing_ok: If True, user will not be prompted to add the missing modules
+        :param defer_missing: If True, missing modules are queued (:class:`utils.Queue`) instead of prompting the user
         :return: None
         """
         super().makedirs()
 
         bar = tqdm(self.sections, unit='section')
-        for st in self.sections:  # TODO Create soft-links to modules
-            if not (missing_ok or st.path.exists()):
+        _deferred = list()
+        for ind, st in enumerate(self.sections, 1):
+            if not (missing_ok or st.path.exists()) and defer_missing:
+                _deferred.append(dict(
+                    key=st.path.relative_to(CONF['VAULT_DIR']).as_posix(),
+                    __type__=st.__type__,
+                    title=st.metadata.title,
+                    url=st.metadata.url,
+                    paths=[self.path.relative_to(CONF['VAULT_DIR']).as_posix()]
+                ))
+            elif not (missing_ok or st.path.exists()):
                 bar.write(f"[-] Path section not found in local vault ({st.__repr__()})")
                 # If module not found locally, request the user to get the info from the web
-                st = st.read_stdin(_stdout=bar)
-                if isinstance(st, HtvModule | HtvExercise):
-                    st.makedirs()
+                _res = st.read_stdin(_stdout=bar)
+                if isinstance(_res, HtvModule | HtvExercise):
+                    _res.makedirs()
+            with FileLock.vault().exclusive():
+                FsTools.link(st.path, self.link(ind, st))  # Links to missing sections are resolved once they are added
             bar.update(1)
+        if len(_deferred) > 0:
+            Queue.put(*_deferred)
+            bar.write(f"[*] {len(_deferred)} missing section(s) queued. Add them with `htv add --drain-queue`")
 
 
 class HtvExercise(HtvResource):
@@ -583,16 +737,28 @@ class HtvExercise(HtvResource):
             """
             return f"> T{self.number}. {f'[{self.points} pts] ' if self.points > 0 else ''}{self.text}\n> > **{self.answer}**"
 
+    __schema__ = dict(
+        tasks=Schema.items(
+            Schema.fields(
+                # Points may be missing in the page, e.g. 'Show Answer'
+                dict(text=Schema.of(str), answer=Schema.of(str), points=Schema.of(int, lenient=True)), extra=False
+            )
+        )
+    )
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._tasks = list()
 
     @property
     def tasks(self) -> list[Task]:
-        return self._tasks
+        return self.__resolve__('tasks', self._load_tasks)
 
     @tasks.setter
     def tasks(self, value: list[dict]) -> None:
+        self.__defer__('tasks', value)
+
+    def _load_tasks(self, value: list[dict]) -> None:
         self._tasks = sorted([HtvExercise.Task(**_, number=ind) for ind, _ in enumerate(value, 1)])
 
 
@@ -657,6 +823,7 @@ class HtvVault:
     __resources__ = None # list
 
     @staticmethod
+    @FileLock.vault().exclusive()
     def clean() -> int:
         """Clean-up vault
 
@@ -665,7 +832,7 @@ class HtvVault:
 
         :return: 0 on success. 1 if an error occurred
         """
-        __excluded__ = ['.git', '.gitignore', '.gitmodules', '.private', '.blog']
+        __excluded__ = ['.git', '.gitignore', '.gitmodules', '.private', '.blog', '.htv']
         if not CONF['VAULT_DIR'].exists():
             print(f"[!] Vault not initialized. Run `htv init` to start")
             return 1
@@ -681,6 +848,7 @@ class HtvVault:
         return 0
 
     @staticmethod
+    @FileLock.vault().exclusive()
     def remove_resources(*args) -> int:
         """Remove resources from the vault
 
@@ -798,13 +966,15 @@ class HtvVault:
         print(f"[+] Vault deleted")
         return 0
 
-    def add_resource(self, data: str | CustomResource, category: str = None, layout: str = None, _stdout: tqdm | TextIO = sys.stdout):
+    def add_resource(self, data: str | TextIO | CustomResource, category: str = None, layout: str = None,
+                     _stdout: tqdm | TextIO = sys.stdout, defer_missing: bool = False):
         """Add a resource to the vault
 
-        :param data: Resource data. It may be a name, a json-serialized resource, or a HtvResource object
+        :param data: Resource data. It may be a name, a json-serialized resource (or a stream of them, e.g. `sys.stdin`), or a HtvResource object
         :param category: Resource categories
         :param layout: Template name.
         :param _stdout: Output stream
+        :param defer_missing: If True, the sections missing in paths are queued instead of requested (:func:`HtvPath.makedirs`)
         :return: 0 on success, 1 on error
         """
         # TODO: create an empty resource with name 'name', in the category 'personal', using template 'custom'
@@ -822,7 +992,8 @@ class HtvVault:
                 FsTools.copy_js_toolkit(ROOT_PKG / f"datasources/{category.split('/')[0]}/toolkit.js")
                 try:
                     self.add_categories(category)
-                    self.add_resources(DataSources.load(input('>>> json: ')))  # Add resource, info from stdin
+                    # Add resource, info from stdin
+                    self.add_resources(DataSources.load(Batch.read()), defer_missing=defer_missing)
                 except KeyboardInterrupt:
                     _stdout.write(f"\n[-] Operation cancelled\n")
                     return 0
@@ -831,12 +1002,20 @@ class HtvVault:
                 return 1
         elif isinstance(data, CustomResource):
             self.add_categories('/'.join(data.categories))  # Create categories if needed
-            data.makedirs()
-            return 1
+            _exists = data.path.exists()  # Not overwritten
+            if isinstance(data, HtvPath):
+                data.makedirs(defer_missing=defer_missing)
+            else:
+                data.makedirs()
+            return 1 if _exists else 0
         else:  # Data is a string, either a name, or a json-serialized resource
             self.add_categories(category)  # Create categories if needed
             try:
-                return self.add_resource(DataSources.load(data))  # Try to load serialized object
+                _res = DataSources.load(data)  # Try to load serialized object
+            except SchemaError as e:  # Serialized, but invalid. Nothing is added
+                _stdout.write(f"[-] Invalid resource data. {len(e.errors)} error(s):\n")
+                _stdout.writelines(f"    {_}\n" for _ in e.errors)
+                return 1
             except ValueError:  # Not a serialized object, then it is the name of the resource
                 __layouts__ = {
                     'file': FileResource,
@@ -852,28 +1031,158 @@ class HtvVault:
                     return self.add_resource(
                         __layouts__[layout](categories=category, title=data)
                     )
+            if isinstance(_res, CustomResource):
+                return self.add_resource(_res, defer_missing=defer_missing)
+            try:  # Many resources, streamed into the vault as they are parsed
+                return 0 if self.add_resources(_res, defer_missing=defer_missing) > 0 else 1
+            except ValueError as e:
+                _stdout.write(f"[-] Invalid data ({e}). Resources read before the error were added\n")
+                return 1
 
-    def add_resources(self, res: CustomResource | list[CustomResource], _stdout: tqdm | TextIO = sys.stdout) -> int:
+    def add_resources(self, res: CustomResource | list[CustomResource], _stdout: tqdm | TextIO = sys.stdout,
+                      defer_missing: bool = False) -> int:
         """Add resource(s) to the vault
 
-        :param res: :class:`HtbResource` or a list of them. If None, user will be prompt to input required Resource data
+        :param res: :class:`HtbResource`, a list of them, or an iterator yielding them (e.g. :func:`DataSources.load` on a batch)
         :param _stdout: Stdout to log information. Default to STDOUT
+        :param defer_missing: If True, the sections missing in paths are queued instead of requested
         :return: number of resources added successfully
         """
         _ret = 0
         if isinstance(res, HtvResource):
-            _ret += 1 if self.add_resource(res, _stdout=_stdout) == 0 else 0
-        elif isinstance(res, list):
-            bar = tqdm(res, unit='resource')
+            _ret += 1 if self.add_resource(res, _stdout=_stdout, defer_missing=defer_missing) == 0 else 0
+        elif isinstance(res, list | Iterator):  # Iterators are consumed as they yield, e.g. batches being decoded
+            bar = tqdm(total=len(res) if isinstance(res, list) else None, unit='resource')
             for item in res:
-                _ret += self.add_resources(item, _stdout=bar)
+                _ret += self.add_resources(item, _stdout=bar, defer_missing=defer_missing)
                 bar.update(1)
-            print(f"[+] {len(res)} resource(s) added successfully")
+            bar.close()
+            print(f"[+] {_ret} resource(s) added successfully")
         else:
             print(f"[-] Not a HtvResource ({type(res)})")
             _ret = 0
         return _ret
 
+    def drain_queue(self, defer_missing: bool = False) -> int:
+        """Add the queued resources (:class:`utils.Queue`)
+
+        The URLs of all the queued resources are opened at once. Then the serialized resources returned by the
+        toolkit are read from STDIN, in any order, until the queue is empty or the user types 'done'.
+        Resources not added remain queued.
+
+        :param defer_missing: If True, the sections missing in the added paths are queued instead of requested
+        :return: Number of resources added
+        """
+        _pending = Queue.get()
+        if len(_pending) == 0:
+            print(f"[*] Queue is empty. Nothing to add")
+            return 0
+        print(f"[*] {len(_pending)} queued resource(s). Opening their URLs...")
+        for e in _pending:  # Batched into a single launcher
+            if e.get('url') not in [None, '', '#']:
+                open_browser_tab(e['url'])
+        for _ds in sorted({str(e['__type__']).split('.')[0] for e in _pending}):
+            if (ROOT_PKG / f"datasources/{_ds}/toolkit.js").exists():
+                FsTools.copy_js_toolkit(ROOT_PKG / f"datasources/{_ds}/toolkit.js")
+        _keys = {e['key'] for e in _pending}
+        _added = 0
+        while len(_keys) > 0:
+            try:
+                _user_input = Batch.read()
+            except (EOFError, KeyboardInterrupt):
+                break
+            if _user_input.strip() in ['', 'done', 'skip']:
+                break
+            try:
+                res = DataSources.load(_user_input)
+            except ValueError:
+                print(f"[-] Invalid data. Expected a serialized resource")
+                continue
+            try:  # Batches are decoded while their resources are added
+                for r in flatten([res]):
+                    if not isinstance(r, CustomResource):
+                        continue
+                    _key = r.path.relative_to(CONF['VAULT_DIR']).as_posix()
+                    if _key not in _keys:
+                        print(f"[*] '{_key}' was not queued. Adding it anyway")
+                    try:
+                        _ret = self.add_resource(r, defer_missing=defer_missing)
+                    except OSError as e:
+                        print(f"[-] '{_key}' not added ({e}). It remains queued")
+                        continue
+                    if not r.path.exists():
+                        print(f"[-] '{_key}' not added. It remains queued")
+                        continue
+                    Queue.remove(_key)  # Added now, or already in the vault
+                    _keys.discard(_key)
+                    _added += 1 if _ret == 0 else 0
+            except ValueError as e:
+                print(f"[-] Batch interrupted ({e}). Resources read before the error were processed")
+        print(f"[+] {_added} resource(s) added. {len(_keys)} still queued")
+        return _added
+
+    def watch_clipboard(self, limit: int = None, batch_size: int = 10, commit: bool = True,
+                        defer_missing: bool = False, interval: tuple[float, float] = (0.25, 2.0)) -> int:
+        """Add the serialized resources copied to the clipboard, as they are copied
+
+        The clipboard is polled (:class:`utils.ClipboardWatcher`) until `limit` resources are added, or Ctrl+C.
+        Resources are written in batches: when `batch_size` of them are pending, or when the clipboard becomes idle.
+        If the vault is a git repository, every batch is committed.
+
+        :param limit: Number of resources after which watching ends. If None, until Ctrl+C
+        :param batch_size: Maximum number of resources pending to be written
+        :param commit: If True, every batch written is committed
+        :param defer_missing: If True, the sections missing in paths are queued instead of requested
+        :param interval: Minimum and maximum polling intervals, in seconds
+        :return: Number of resources added
+        """
+        _watcher = ClipboardWatcher(
+            interval=interval,
+            accept=lambda text: Batch.is_batch(text) or text.lstrip()[:1] in ['{', '[']
+        )
+        _pending = list()
+        _added = 0
+
+        def _flush():
+            nonlocal _added
+            if len(_pending) == 0:
+                return
+            _added += self.add_resources(list(_pending), defer_missing=defer_missing)
+            if commit and (self.path / '.git').exists():
+                try:
+                    Git.commit(f"Add {len(_pending)} resource(s)", quiet=True)
+                except subprocess.CalledProcessError:
+                    print(f"[!] Resources not committed")
+            _pending.clear()
+
+        print(f"[*] Watching the clipboard. Copy the resources returned by the JavaScript toolkit (Ctrl+C to stop)")
+        try:
+            for text in _watcher.watch(stop=lambda: limit is not None and _added + len(_pending) >= limit):
+                if text is None:  # Idle, write pending resources
+                    _flush()
+                    continue
+                try:
+                    res = DataSources.load(text)
+                except (ValueError, KeyError, TypeError):
+                    print(f"[-] Invalid data copied. Expected a serialized resource")
+                    continue
+                try:  # Batches are decoded while iterating
+                    for r in flatten([res]):
+                        if isinstance(r, CustomResource):
+                            print(f"[*] Resource copied: {r.name}")
+                            _pending.append(r)
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"[-] Batch interrupted ({e}). Resources read before the error are kept")
+                if len(_pending) >= batch_size:
+                    _flush()
+        except KeyboardInterrupt:
+            print()
+        finally:
+            _flush()
+        print(f"[+] {_added} resource(s) added from the clipboard")
+        return _added
+
+    @FileLock.vault().exclusive()
     def add_categories(self, path: str, description: str = None):
         """Add new categories to the vault
 
@@ -903,6 +1212,7 @@ class HtvVault:
                 _parent += f"{_}/"
 
 
+    @FileLock.vault().shared()
     def list_resources(self, path: str | Path = None, regex: str = None) -> list[Path] | None:
         """List resources from the vault
 
@@ -946,11 +1256,9 @@ class HtvVault:
             _grp = dict()
             for _res in filter(lambda x: x is not None, set(args)):
                 _key = '/'.join(_res.main_categories)
-                if _key in _grp:
-                    # Add the resource keeping alphabetical order
-                    _grp.update({_key: sorted(_grp[_key] + [_res])})
-                else:
-                    _grp[_key] = [_res]
+                _grp.setdefault(_key, list()).append(_res)
+            for _items in _grp.values():  # Keep alphabetical order, sorting each group once
+                _items.sort()
             return dict(sorted(_grp.items()))  # Order the keys (categories) alphabetically
 
         def list_path(_path, _regex):
@@ -975,6 +1283,160 @@ class HtvVault:
             return list()
 
 
+    @FileLock.vault().exclusive()
+    def dedupe(self) -> int:
+        """Replace duplicated resources by links
+
+        Resources copied out of their own category (e.g. modules copied within several paths) are replaced by a link
+        to the resource in its category. If the resource is not found in its category, the copy is moved there.
+        Copies whose contents differ from the original are kept, they must be merged manually.
+
+        :return: Number of copies replaced by links
+        """
+        if not self.path.exists():
+            print(f"[!] Vault not initialized. Run `htv init` to start")
+            return 0
+        _replaced = 0
+        print(f"[*] Looking for duplicated resources...")
+        for dirpath, dirnames, filenames in os.walk(self.path):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]  # Symlinks are not followed
+            if 'info.yml' not in filenames:
+                continue
+            _copy = Path(dirpath)
+            try:
+                with open(_copy / 'info.yml', 'r') as file:
+                    _data = FsTools.load_yaml(file)
+                if str(_data['__type__']).find('.') == -1:
+                    continue  # Custom resources may be placed anywhere
+                _dir = Index.resource_dir(_data['__type__'])
+                _original = self.path / _dir / FsTools.secure_dirname(_data['metadata']['title'])
+            except (yaml.YAMLError, KeyError, TypeError):
+                continue  # Not a valid resource, it has no canonical location
+            if _copy == _original:
+                continue
+            if not _original.exists():
+                print(f"[*] Moving '{_copy.relative_to(self.path)}' to '{_original.relative_to(self.path)}'")
+                os.makedirs(_original.parent, exist_ok=True)
+                shutil.move(_copy, _original)
+            elif _same_tree(_copy, _original):
+                shutil.rmtree(_copy)
+            else:
+                print(f"[!] '{_copy.relative_to(self.path)}' differs from '{_original.relative_to(self.path)}'. Merge them manually")
+                continue
+            FsTools.link(_original, _copy)
+            dirnames.clear()
+            _replaced += 1
+        print(f"[+] {_replaced} duplicated resource(s) replaced by links")
+        return _replaced
+
+    @FileLock.vault().shared()
+    def query_resources(self, *categories, where: str = None, sort: str = None, regex: str = None) -> list[Path] | None:
+        """List resources from the vault matching a metadata query
+
+        Resources are filtered using the vault index (:class:`index.Index`), instead of loading them.
+
+        :param categories: List the resources found in these categories. If empty, or 'all', the entire vault is queried
+        :param where: Filter expression (:class:`index.Query`). For example: `difficulty=hard and status!=completed`
+        :param sort: Field used to sort the results. Prefix it with '-' for descending order
+        :param regex: regex applied on the resource name. If None, no filter is applied
+        :return: A list with the paths of the resources found, or None if no match
+        """
+        if not self.path.exists():
+            print(f"[!] Vault not initialized. Run `htv init` to start")
+            return list()
+        try:
+            _records = Index.shared().refresh().query(where, sort=sort, categories=list(categories), name=regex)
+        except ValueError as e:
+            print(f"[-] {e}")
+            return None
+        _div = '-' * 30
+        print(f"[*] Listing: {' '.join(categories) if len(categories) > 0 else 'all'} "
+              f"{'' if where in ['', None] else f'(where: {where}) '}"
+              f"{'' if sort in ['', None] else f'(sort: {sort})'}")
+        if len(_records) <= 0:
+            print(
+                _div,
+                f"[-] No resources found matching that criteria",
+                f"[*] Tip: Add a new resource with `htv add`",
+                sep='\n'
+            )
+            return None
+        _field = None if sort in ['', None] else sort.lstrip('-')
+
+        def describe(r: dict) -> str:
+            _line = f"{r['name']} [{r['categories']}]"
+            if 'progress' in r:  # Paths
+                _line += f" {round(r['progress'] * 100, 2)} %"
+            if _field is not None:
+                _line += f" ({_field}: {r.get(Query.__aliases__.get(_field, _field))})"
+            return _line
+
+        print(
+            _div,
+            *[f"{Templater.pad_num(ind, len(str(len(_records))))}. {describe(r)}" for ind, r in enumerate(_records, 1)],
+            _div,
+            sep='\n'
+        )
+        path_pool = [CONF['VAULT_DIR'] / r['__path__'] for r in _records]
+        Cache.set(path_pool)
+        return path_pool
+
+    @FileLock.vault().shared()
+    def stats(self, *categories, where: str = None) -> dict | None:
+        """Compute statistics of the vault
+
+        Aggregates are computed over the vault index (:func:`index.aggregate`).
+        Datasources may add their own aggregates defining a function `stats(records) -> dict`
+
+        :param categories: Only resources within these categories are aggregated. If empty, or 'all', the entire vault is used
+        :param where: Filter expression (:class:`index.Query`)
+        :return: Dictionary with the aggregates, or None if the vault is not initialized or the query is not valid
+        """
+        if not self.path.exists():
+            print(f"[!] Vault not initialized. Run `htv init` to start")
+            return None
+        try:
+            _records = Index.shared().refresh().query(where, categories=list(categories))
+        except ValueError as e:
+            print(f"[-] {e}")
+            return None
+        _stats = aggregate(_records)
+        for _ in (ROOT_PKG / 'datasources').iterdir():  # Datasource aggregates
+            if _.is_dir() and (_ / '__init__.py').exists():
+                _mod = importlib.import_module(f"datasources.{_.name}")
+                if hasattr(_mod, 'stats'):
+                    _stats[_.name] = _mod.stats(_records)
+        return _stats
+
+    @FileLock.vault().shared()
+    def diff(self, old: str | Path, new: str | Path = None, quiet: bool = False) -> list[tuple[str, str, dict]] | None:
+        """Compare two states of the vault: resources added, removed or changed, and their changed fields
+
+        :func:`index.diff`
+
+        :param old: Old state. An index file (`.htv/index.json`), a snapshot (`htv export`) or a git revision
+        :param new: New state, as `old`. If None, the current state of the vault is used
+        :param quiet: If True, the differences are not printed
+        :return: The differences (change, path, fields). None if the vault is not initialized or a state is not valid
+        """
+        if not self.path.exists():
+            print(f"[!] Vault not initialized. Run `htv init` to start")
+            return None
+        try:
+            _ret = list(diff(Index.snapshot(old, root=self.path), Index.snapshot(new, root=self.path)))
+        except (OSError, ValueError) as e:
+            print(f"[-] {e}")
+            return None
+        if quiet:
+            return _ret
+        for change, path, fields in _ret:
+            print(f"[{change}] {path}")
+            for k, (a, b) in fields.items():
+                print(f"      {k}: {a} -> {b}")
+        _count = {c: sum(1 for _ in _ret if _[0] == c) for c in '+-*'}
+        print(f"[*] {_count['+']} added, {_count['-']} removed, {_count['*']} changed")
+        return _ret
+
     def use_resource(self, *args) -> HtvResource | list[HtvResource] | None:
         """Opens resource(s)
 
@@ -1000,6 +1462,126 @@ class HtvVault:
         for r in resources:
             r.post()
 
+    @FileLock.vault().shared()
+    def export_snapshot(self, output: str | Path, compress: bool = False) -> int:
+        """Export the vault as a single snapshot (:class:`utils.Snapshot`)
+
+        Resources are exported as their `info.yml` is, along with their path, and categories by their path.
+        They are not serialized again (:func:`CustomResource.to_dict`), since loading a resource may normalize some
+        values: the snapshot holds the same data as the vault, and the index (see `htv diff`).
+        Resources not matching their schema are skipped.
+        Entries are sorted by path, so exporting the same vault always writes the same file.
+        Other files (notes, evidences, plain files) are not exported
+
+        :param output: Snapshot file
+        :param compress: If True, the snapshot is compressed with gzip
+        :return: Number of resources exported. -1 on error
+        """
+        if not self.path.exists():
+            print(f"[!] Vault not initialized. Run `htv init` to start")
+            return -1
+        _categories, _resources = list(), list()
+        for dirpath, dirnames, filenames in os.walk(self.path):  # Links (path sections) are not followed
+            _rel = Path(dirpath).relative_to(self.path).as_posix()
+            if 'info.yml' in filenames:
+                _resources.append(_rel)
+                dirnames.clear()  # Resources do not contain other resources
+                continue
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            if _rel != '.' and 'README.md' in filenames:
+                _categories.append(_rel)
+        print(f"[*] Exporting {len(_resources)} resource(s) to '{output}' ...")
+        _exported = 0
+        with Snapshot.writer(output, compress=compress) as write:
+            _resources = {r: None for r in _resources}
+            for _rel in sorted([*_categories, *_resources]):
+                if _rel not in _resources:
+                    write(dict(path=_rel))
+                    continue
+                _data = InfoCache.shared(self.path).get(self.path / _rel / 'info.yml')
+                try:
+                    if _data is None:
+                        raise ValueError("Cannot parse 'info.yml'")
+                    Schema.validate(copy.deepcopy(_data))
+                except ValueError as e:
+                    print(f"[-] '{_rel}' skipped. {e}")
+                    continue
+                write(dict(path=_rel, resource=_data))
+                _exported += 1
+        print(f"[+] {_exported} resource(s) exported")
+        return _exported
+
+    @FileLock.vault().exclusive()
+    def restore_snapshot(self, source: str | Path, workers: int = None, commit: bool = True) -> int:
+        """Rebuild the vault from a snapshot (:func:`HtvVault.export_snapshot`)
+
+        All the resources are loaded, and validated, before anything is written. Categories are created first,
+        then resources are rendered in parallel, and finally paths are linked to their sections.
+        Resources already in the vault are kept. The files written only depend on the snapshot contents,
+        and `info.yml` files are written with the exported data, as they were in the vault.
+
+        :param source: Snapshot file
+        :param workers: Number of resources rendered at once. Defaults to the number of CPUs
+        :param commit: If True, restored resources are committed to the vault repository
+        :return: Number of resources restored. -1 on error
+        """
+        if not self.path.exists():
+            print(f"[!] Vault not initialized. Run `htv init` to start")
+            return -1
+        print(f"[*] Restoring snapshot '{source}' ...")
+        _categories, _resources, _errors = list(), list(), list()
+        try:
+            for entry in Snapshot.read(source):
+                if 'resource' not in entry:
+                    _categories.append(entry['path'])
+                    continue
+                _data = copy.deepcopy(entry['resource'])  # Written as it is, see _render
+                # Custom resources may be placed in any category
+                _data.setdefault('__path__', Path(entry['path']).parent.as_posix())
+                try:
+                    _res = DataSources.load(_data)
+                except SchemaError as e:
+                    _errors.extend(f"{entry['path']}: {_}" for _ in e.errors)
+                    continue
+                if _res.path != self.path / entry['path']:
+                    print(f"[!] '{entry['path']}' restored to '{_res.path.relative_to(self.path)}'")
+                _resources.append((_res, entry['resource']))
+        except (OSError, ValueError) as e:
+            print(f"[-] {e}")
+            return -1
+        except (KeyError, TypeError) as e:
+            print(f"[-] Invalid snapshot entry ({e})")
+            return -1
+        if len(_errors) > 0:
+            print(f"[-] Invalid snapshot. {len(_errors)} error(s):", *[f"    {_}" for _ in _errors], sep='\n')
+            return -1
+        for _cat in _categories:
+            self.add_categories(_cat)
+        _new = [(r, data) for r, data in _resources if not r.path.exists()]
+        if len(_new) < len(_resources):
+            print(f"[*] {len(_resources) - len(_new)} resource(s) already in the vault. Skipped")
+
+        def _render(item: tuple[CustomResource, dict]) -> None:
+            res, data = item
+            _files = [f for f in res.__dir_struct__() if isinstance(f, str | Path) or f[0] != 'info.yml']
+            FsTools.dump_files([*_files, ('info.yml', FsTools.dump_yaml(data))], root_dir=res.path, exists_ok=True)
+
+        if len(_new) > 0:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for _ in tqdm(executor.map(_render, _new), total=len(_new), unit='resource'):
+                    pass
+        for res, _ in _new:  # Links to sections, once all of them exist
+            if isinstance(res, HtvPath):
+                for ind, st in enumerate(res.sections, 1):
+                    FsTools.link(st.path, res.link(ind, st))
+        print(f"[+] {len(_new)} resource(s) restored")
+        if commit and len(_new) > 0 and (self.path / '.git').exists():
+            try:
+                Git.commit(f"Restore {len(_new)} resource(s) from snapshot", quiet=True)
+            except subprocess.CalledProcessError:
+                print(f"[!] Resources not committed")
+        return len(_new)
+
     def import_vault(self, source: str | Path) -> int:
         if not self.path.exists():
             print(f"[!] Vault not initialized. Run `htv init` to start")
@@ -1052,40 +1634,72 @@ class DataSources:
 
 
     @staticmethod
-    def load(data: str | dict | Path | Iterable) -> HtvResource | list[HtvResource] | None:
+    def _from_dict(data: dict) -> CustomResource:
+        """Load a validated resource (:func:`schema.Schema.validate`)"""
+        resource = DataSources.get(data.pop('__type__'))
+        # If CustomResource use path as resource_dir
+        if Templater.class_str(resource) == 'resources.CustomResource':
+            resource.__resource_dir__ = data.pop('__path__', CONF['DEFAULT_CAT'])
+        resource.update(**data)
+        return resource
+
+    @staticmethod
+    def load(data: str | dict | Path | TextIO | Iterable) -> HtvResource | list[HtvResource] | Iterator[HtvResource] | None:
         """Load serialized Resources
 
-        :param data: Serialized data. It may be a JSON string/file, a serialized HtbResource (dict) or a list of them (llist[dict])
-        :return: the deserialized HtbResource or list of them
+        :param data: Serialized data. It may be a JSON string/file/stream, a serialized HtbResource (dict) or a list of them (llist[dict])
+        :return: the deserialized HtbResource or list of them. JSON arrays, streams, iterators and batches are loaded
+            lazily: an iterator yields the resources as they are parsed
+        :raise SchemaError: Invalid serialized resource(s) (:class:`schema.Schema`). Lists are validated before
+            any resource is loaded, iterators validate each resource as it is parsed
         """
         resource = None
         if data is None:
             print(f"[-] Missing parameter 'data'")
             return None
         elif isinstance(data, dict):  # load from dict
-            resource = DataSources.get(data.pop('__type__'))
-            # If CustomResource use path as resource_dir
-            if Templater.class_str(resource) == 'resources.CustomResource':
-                resource.__resource_dir__ = data.pop('__path__', CONF['DEFAULT_CAT'])
-            resource.update(**data)
+            resource = DataSources._from_dict(Schema.validate(data))
+        elif isinstance(data, io.TextIOBase):  # Load JSON from a stream (e.g. stdin), items are loaded as they are read
+            return (DataSources.load(item) for item in JsonStream.items(data))
+        elif isinstance(data, Iterator):  # Load HtbResources as they are yielded
+            return (DataSources.load(item) for item in data)
         elif isinstance(data, Iterable) and not isinstance(data, str):  # Load several HtbResources
-            return [DataSources.load(item) for item in iter(data)]
+            data = list(data)
+            # Serialized resources are validated together, none is loaded if any of them is invalid
+            _valid = iter(Schema.validate_all([item for item in data if isinstance(item, dict)]))
+            return [DataSources._from_dict(next(_valid)) if isinstance(item, dict) else DataSources.load(item)
+                    for item in data]
         elif isinstance(data, str):  # Load serialized data from JSON/YML string
-            if FsTools.is_json(data):
+            if Batch.is_batch(data):  # Exported by toolkit.js. Resources are loaded as they are decoded
+                return (DataSources.load(item) for item in Batch.decode(data))
+            elif JsonStream.is_array(data):  # Items are parsed and loaded one at a time
+                return (DataSources.load(item) for item in JsonStream.items(data))
+            elif FsTools.is_json(data):
                 resource = DataSources.load(json.loads(data))
             elif FsTools.is_yaml(data):
-                resource = DataSources.load(yaml.safe_load(data))
+                resource = DataSources.load(FsTools.load_yaml(data))
             else:
                 raise ValueError("Invalid data. Expected a serialized object string or path")
         elif Path(data).exists():  # Load data from path
             if Path(data).is_dir():  # Get info.yml in that dir
                 data = Path(data) / 'info.yml'
-            if FsTools.is_json(data):
+            data = Path(data)
+            _ = InfoCache.shared().get(data) if data.name == 'info.yml' else None
+            if _ is None and data.suffix == '.json':
+                with open(data, 'r') as file:
+                    _array = JsonStream.is_array(file)
+                if _array:  # Items are parsed and loaded one at a time, the file is closed once consumed
+                    return (DataSources.load(item) for item in JsonStream.items(data))
+            if _ is not None:  # Parsed resource, YAML is skipped if unchanged
+                # Path relative to vault dir
+                _.update({'__path__': str(data.parents[1]).split(f"{CONF['VAULT_DIR'].name}/")[1]})
+                resource = DataSources.load(_)
+            elif FsTools.is_json(data):
                 with open(data, 'r') as file:
                     resource = DataSources.load(json.load(file))
             elif FsTools.is_yaml(data):
                 with open(data, 'r') as file:
-                    _ = yaml.safe_load(file)
+                    _ = FsTools.load_yaml(file)
                     # Path relative to vault dir
                     _.update({'__path__': str(data.parents[1]).split(f"{CONF['VAULT_DIR'].name}/")[1]})
                     resource = DataSources.load(_)
@@ -0,0 +1,282 @@
+from pathlib import Path
+import sys
+
+ROOT_PKG = Path(__file__).parents[1] # Points to install-dir/src/
+sys.path.insert(0, str(ROOT_PKG))
+
+from collections.abc import Callable, Iterable
+from datetime import date
+from typing import Any
+
+__all__ = [
+    'Schema',
+    'SchemaError',
+]
+
+#####   C L A S S E S   #####
+
+class SchemaError(ValueError):
+    """
+    Serialized resource(s) not matching their schema
+
+    :ivar errors: [list[str]] All the errors found. Each error starts with the location of the invalid value
+    """
+
+    def __init__(self, errors: list[str]):
+        self.errors = list(errors)
+        super().__init__(f"{len(self.errors)} invalid value(s): {'; '.join(self.errors)}")
+
+
+class Schema:
+    """
+    Compiled validators of serialized resources (toolkit output, `info.yml`).
+
+    A schema is derived for each resource type (`__type__`) from a fresh instance of its class: the type of the
+    default value of each attribute and metadata field (e.g. a list stays a list, a string stays a string).
+    Attributes with no default (None) accept any value. Classes refine their fields with a `__schema__` class attribute,
+    merged along the class hierarchy. Unknown fields are kept as they are.
+
+    Validators are functions ``(value, location, errors) -> value``: values are coerced to the expected type
+    (e.g. ``'10'`` for an integer) and every error is appended to `errors`, so all of them are reported together.
+
+    >>> Schema.validate(dict(__type__='htb.LabMachine', metadata=dict(title='Resolute'), tasks=[dict(points='10')]))
+    """
+    __compiled__ = dict()  # Validators by __type__
+
+    @staticmethod
+    def _at(location: str, key: str | int) -> str:
+        if isinstance(key, int):
+            return f"{location}[{key}]"
+        return f"{location}.{key}" if location else key
+
+    @staticmethod
+    def any(value: Any, location: str, errors: list[str]) -> Any:
+        return value
+
+    @staticmethod
+    def of(kind: type, nullable: bool = True, lenient: bool = False) -> Callable:
+        """Values of a basic type: str, int, float, list or dict
+
+        Numbers are coerced to strings and numeric strings to numbers. Missing lists and dicts (None) are empty
+
+        :param kind: Expected type
+        :param nullable: If True, None is a valid value
+        :param lenient: If True, values that cannot be coerced are replaced by None instead of being errors
+        :return: The validator
+        """
+        def _validate(value: Any, location: str, errors: list[str]) -> Any:
+            if value is None:
+                if kind in [list, dict]:
+                    return kind()
+                elif nullable:
+                    return None
+            elif isinstance(value, bool):  # Booleans are never coerced
+                pass
+            elif kind is str:
+                if isinstance(value, str | date):  # YAML loads timestamps as dates
+                    return value
+                elif isinstance(value, int | float):
+                    return str(value)
+            elif kind is int:
+                if isinstance(value, int) or (isinstance(value, float) and value.is_integer()):
+                    return int(value)
+                elif isinstance(value, str):
+                    try:
+                        return int(value.strip())
+                    except ValueError:
+                        pass
+            elif kind is float:
+                if isinstance(value, int | float):
+                    return float(value)
+                elif isinstance(value, str):
+                    try:
+                        return float(value.strip())
+                    except ValueError:
+                        pass
+            elif isinstance(value, kind):
+                return value
+            if lenient:
+                return None
+            errors.append(f"{location}: expected {kind.__name__}, got {type(value).__name__} ({str(value)[:40]!r})")
+            return value
+        return _validate
+
+    @staticmethod
+    def choice(*values: str, nullable: bool = False) -> Callable:
+        """One of several values. Values are compared (and coerced) as strings
+
+        :param values: Valid values
+        :param nullable: If True, None is a valid value
+        :return: The validator
+        """
+        _values = frozenset(values)
+
+        def _validate(value: Any, location: str, errors: list[str]) -> Any:
+            if value is None and nullable:
+                return None
+            elif value is not None and str(value) in _values:
+                return str(value)
+            errors.append(f"{location}: expected one of {', '.join(values)}, got {value!r}")
+            return value
+        return _validate
+
+    @staticmethod
+    def union(*validators: Callable) -> Callable:
+        """Values valid for any of the validators. The first one that succeeds is applied
+
+        :param validators: Alternative validators
+        :return: The validator
+        """
+        def _validate(value: Any, location: str, errors: list[str]) -> Any:
+            _failed = list()
+            for validator in validators:
+                _errors = list()
+                _value = validator(value, location, _errors)
+                if len(_errors) == 0:
+                    return _value
+                _failed.extend(_errors)
+            errors.append(' or '.join(_failed))
+            return value
+        return _validate
+
+    @staticmethod
+    def items(validator: Callable) -> Callable:
+        """List of values, each one validated by `validator`
+
+        :param validator: Items validator
+        :return: The validator
+        """
+        _list = Schema.of(list)
+
+        def _validate(value: Any, location: str, errors: list[str]) -> Any:
+            _errors = len(errors)
+            value = _list(value, location, errors)
+            if len(errors) > _errors:
+                return value
+            return [validator(item, Schema._at(location, ind), errors) for ind, item in enumerate(value)]
+        return _validate
+
+    @staticmethod
+    def fields(validators: dict[str, Callable], required: Iterable[str] = (), extra: bool = True) -> Callable:
+        """Mapping with known fields
+
+        :param validators: Validators by field name
+        :param required: Fields that must be present
+        :param extra: If True, unknown fields are kept as they are. Otherwise, they are errors
+        :return: The validator
+        """
+        _required = tuple(required)
+
+        def _validate(value: Any, location: str, errors: list[str]) -> Any:
+            if not isinstance(value, dict):
+                errors.append(f"{location or '.'}: expected a mapping, got {type(value).__name__}")
+                return value
+            _ret = dict()
+            for key, item in value.items():
+                _validator = validators.get(key)
+                if _validator is not None:
+                    _ret[key] = _validator(item, Schema._at(location, key), errors)
+                elif extra:
+                    _ret[key] = item
+                else:
+                    errors.append(f"{Schema._at(location, key)}: unexpected field")
+            for key in _required:
+                if key not in value:
+                    errors.append(f"{Schema._at(location, key)}: missing field")
+            return _ret
+        return _validate
+
+    @staticmethod
+    def resource() -> Callable:
+        """Serialized resource, validated by the schema of its own `__type__`
+
+        :return: The validator
+        """
+        def _validate(value: Any, location: str, errors: list[str]) -> Any:
+            if not isinstance(value, dict):
+                errors.append(f"{location or '.'}: expected a serialized resource, got {type(value).__name__}")
+                return value
+            elif '__type__' not in value:
+                errors.append(f"{Schema._at(location, '__type__')}: missing field")
+                return value
+            _validator = Schema.get(value['__type__'])
+            if _validator is None:
+                errors.append(f"{Schema._at(location, '__type__')}: unknown resource type {value['__type__']!r}")
+                return value
+            return _validator(value, location, errors)
+        return _validate
+
+    @staticmethod
+    def default(value: Any) -> Callable:
+        """Validator inferred from a default value"""
+        if isinstance(value, bool) or value is None:
+            return Schema.any
+        elif isinstance(value, str | int | float | list | dict):
+            return Schema.of(type(value))
+        return Schema.any
+
+    @staticmethod
+    def compile(resource) -> Callable:
+        """Compile the schema of a resource
+
+        :param resource: Fresh instance of the resource (:class:`resources.CustomResource`), holding its default values
+        :return: The validator
+        """
+        _defaults = {
+            key: Schema.default(value) for key, value in vars(resource).items()
+            if not key.startswith('__') and key != '_metadata'
+        }
+        # Private attributes are serialized by their getter (without '_'), whose setter is refined by the class
+        _fields = {key.lstrip('_'): value for key, value in _defaults.items()}
+        for cls in reversed(type(resource).__mro__):  # Subclasses refine their parents
+            _fields.update(vars(cls).get('__schema__', dict()))
+        _fields.update(_defaults)  # Toolkits may set the private attribute itself
+        _metadata = {key: Schema.default(value) for key, value in vars(resource.metadata).items()}
+        _metadata['title'] = Schema.of(str, nullable=False)
+        _fields['metadata'] = Schema.fields(_metadata, required=['title'])
+        _fields['__type__'] = Schema.of(str, nullable=False)
+        return Schema.fields(_fields, required=['__type__'])
+
+    @staticmethod
+    def get(_type: str) -> Callable | None:
+        """Compiled schema of a resource type. Schemas are compiled once
+
+        :param _type: Resource type (`__type__`), e.g. `htb.AcademyModule`
+        :return: The validator. None if the type is unknown
+        """
+        if not isinstance(_type, str):
+            return None
+        elif _type not in Schema.__compiled__:
+            from htv.resources import CustomResource, DataSources
+            _resource = DataSources.get(_type)
+            Schema.__compiled__[_type] = Schema.compile(_resource) if isinstance(_resource, CustomResource) else None
+        return Schema.__compiled__[_type]
+
+    @staticmethod
+    def validate(data: dict) -> dict:
+        """Validate a serialized resource
+
+        :param data: Serialized resource
+        :return: The resource, with its values coerced to the expected types
+        :raise SchemaError: The resource is not valid. The error includes all the invalid values
+        """
+        _errors = list()
+        data = Schema.resource()(data, '', _errors)
+        if len(_errors) > 0:
+            raise SchemaError(_errors)
+        return data
+
+    @staticmethod
+    def validate_all(items: Iterable[dict]) -> list[dict]:
+        """Validate several serialized resources at once, e.g. before any of them is added
+
+        :param items: Serialized resources
+        :return: The resources, with their values coerced to the expected types
+        :raise SchemaError: Some resource is not valid. The error includes the invalid values of all the resources
+        """
+        _errors = list()
+        _validator = Schema.resource()
+        items = [_validator(item, f"[{ind}]", _errors) for ind, item in enumerate(items)]
+        if len(_errors) > 0:
+            raise SchemaError(_errors)
+        return items
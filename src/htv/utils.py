@@ -9,34 +9,493 @@ ROOT_PKG = Path(__file__).parents[1] # Points to install-dir/src/
 sys.path.insert(0, str(ROOT_PKG))
 
 from htv.constants import CONF_PATH, RUNTIME_CONF, DEFAULT_CONF
-from collections.abc import Iterable
+from collections.abc import Iterable, Iterator, Callable
+from contextlib import contextmanager
 from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType
 from typing import TextIO, Any
 from tqdm import tqdm
 
 import webbrowser
 import subprocess
 import traceback
+import threading
 import pyperclip
-import time
+import atexit
+import base64
+import binascii
+import copy
+import errno
+import gzip
+import hashlib
+import io
 import json
 import os
 import re
+import time
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows. Locks are disabled
+    fcntl = None
 
 __all__ = [
     'add_extensions',
+    'Batch',
+    'Browser',
     'Cache',
+    'ClipboardWatcher',
     'Conf',
     'CONF',
+    'FileLock',
     'flatten',
     'FsTools',
     'Git',
+    'JsonStream',
     'open_browser_tab',
+    'Queue',
+    'Snapshot',
     'Templater',
+    'WritePlan',
 ]
 
+#####   C O N S T A N T S   #####
+
+_UNSAFE_FILENAME_CHARS = re.compile(r"[ ,&:\"'-]+")
+_UNSAFE_DIRNAME_CHARS = re.compile(r"[ ,&:?\"'-]+")
+# libyaml bindings are several times faster than the pure-Python emitter/parser. Same output
+_YAML_DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 #####   C L A S S E S   #####
 
+class Batch:
+    """
+    Batches of serialized resources, exported by the JavaScript toolkits (`batchExport()`).
+
+    A batch is a JSONL document (one resource per line) compressed with gzip and encoded in base64.
+    Terminals truncate very long lines, so the payload is split in short lines between a header and a footer::
+
+        htv:gz:<number of resources>
+        H4sIAAAAAAAA...
+        htv:end
+    """
+    __header__ = 'htv:gz:'
+    __footer__ = 'htv:end'
+    __width__ = 1000  # Characters per line
+
+    @staticmethod
+    def is_batch(data: Any) -> bool:
+        return isinstance(data, str) and data.lstrip().startswith(Batch.__header__)
+
+    @staticmethod
+    def encode(items: Iterable[dict]) -> str:
+        """Serialize resources into a batch payload
+
+        :param items: Serialized resources
+        :return: Payload, as exported by the JavaScript toolkits
+        """
+        _lines = [json.dumps(_) for _ in items]
+        _data = base64.b64encode(gzip.compress('\n'.join(_lines).encode() + b'\n', mtime=0)).decode()
+        return '\n'.join([
+            f"{Batch.__header__}{len(_lines)}",
+            *[_data[i:i + Batch.__width__] for i in range(0, len(_data), Batch.__width__)],
+            Batch.__footer__
+        ])
+
+    @staticmethod
+    def decode(payload: str) -> Iterator[dict]:
+        """Deserialize a batch payload
+
+        The header and the encoding are checked right away. Then the payload is decompressed and parsed line by line,
+        resources are yielded as they are read.
+        Lines may be joined or split anywhere, e.g. when pasted in the terminal
+
+        :param payload: Batch payload
+        :return: Iterator over the serialized resources
+        :raise ValueError: Invalid payload. Corrupted or truncated data is raised while iterating
+        """
+        _tokens = payload.split()
+        if len(_tokens) == 0 or not _tokens[0].startswith(Batch.__header__):
+            raise ValueError(f"Invalid batch. Expected header '{Batch.__header__}'")
+        _count = _tokens[0][len(Batch.__header__):]
+        if Batch.__footer__ in _tokens:
+            _tokens = _tokens[:_tokens.index(Batch.__footer__)]
+        try:
+            _data = base64.b64decode(''.join(_tokens[1:]), validate=True)
+        except binascii.Error as e:
+            raise ValueError(f"Invalid batch. {e}")
+        return Batch._lines(gzip.GzipFile(fileobj=io.BytesIO(_data)), int(_count) if _count.isdigit() else None)
+
+    @staticmethod
+    def _lines(stream: gzip.GzipFile, count: int = None) -> Iterator[dict]:
+        _read = 0
+        try:
+            with stream:
+                for line in stream:
+                    if line.strip():
+                        _read += 1
+                        yield json.loads(line)
+        except (OSError, EOFError, JSONDecodeError) as e:
+            raise ValueError(f"Invalid batch. {e}")
+        if count is not None and count != _read:
+            raise ValueError(f"Incomplete batch. {_read} of {count} resources read")
+
+    @staticmethod
+    def read(prompt: str = '>>> json: ') -> str:
+        """Read a serialized resource, or a batch of them, from the standard input
+
+        When a batch header is read, the following lines are read until the footer
+
+        :param prompt: Input prompt
+        :return: The user input
+        """
+        _lines = [input(prompt)]
+        if Batch.is_batch(_lines[0]):
+            while Batch.__footer__ not in _lines[-1].split():
+                _lines.append(input())
+        return '\n'.join(_lines)
+
+
+class JsonStream:
+    """
+    Incremental reader of JSON arrays.
+
+    Top-level items are parsed one at a time from a file or a string, so the whole document is never parsed at once.
+    Only the item being read is kept in memory
+    """
+    __chunk_size__ = 1 << 16  # Characters read at once
+
+    @staticmethod
+    def is_array(data: str | TextIO) -> bool:
+        """Check whether the JSON document starts with an array. Streams are not consumed
+
+        :param data: JSON string or seekable text stream
+        """
+        if isinstance(data, str):
+            return data.lstrip()[:1] == '['
+        _pos = data.tell()
+        _head = data.read(JsonStream.__chunk_size__).lstrip()
+        data.seek(_pos)
+        return _head[:1] == '['
+
+    @staticmethod
+    def items(source: str | Path | TextIO, chunk_size: int = None) -> Iterator[Any]:
+        """Yield the items of a JSON array as they are parsed. Other documents are yielded whole
+
+        :param source: JSON string, path to a JSON file or text stream, e.g. `sys.stdin`
+        :param chunk_size: Characters read at once
+        :return: Iterator over the parsed items
+        :raise ValueError: Invalid JSON. Raised while iterating, after the items read before the error
+        """
+        if isinstance(source, Path):
+            with open(source, 'r') as file:
+                yield from JsonStream.items(file, chunk_size)
+            return
+        _stream = io.StringIO(source) if isinstance(source, str) else source
+        _chunk = JsonStream.__chunk_size__ if chunk_size is None else chunk_size
+        _decoder = json.JSONDecoder()
+        _buffer, _pos, _eof = '', 0, False
+
+        def _fill(size: int) -> bool:
+            nonlocal _buffer, _pos, _eof
+            _data = _stream.read(size)
+            _eof = _data == ''
+            _buffer = _buffer[_pos:] + _data  # Parsed items are dropped
+            _pos = 0
+            return not _eof
+
+        def _next_char() -> str:
+            nonlocal _pos
+            while True:
+                while _pos < len(_buffer) and _buffer[_pos].isspace():
+                    _pos += 1
+                if _pos < len(_buffer) or not _fill(_chunk):
+                    return _buffer[_pos:_pos + 1]
+
+        if _next_char() != '[':  # Not an array, parsed at once
+            _fill(-1)
+            try:
+                yield json.loads(_buffer)
+            except JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON. {e}")
+            return
+        _pos += 1
+        _index = 0
+        while True:
+            _char = _next_char()
+            if _char == ']' and _index == 0:
+                break
+            _size = _chunk
+            while True:
+                try:
+                    _item, _end = _decoder.raw_decode(_buffer, _pos)
+                    if _eof or (_end < len(_buffer) and _buffer[_end] not in '0123456789.eE+-'):
+                        break  # Otherwise, the item (e.g. a number) may continue in the next chunk
+                except JSONDecodeError as e:
+                    if _eof:
+                        raise ValueError(f"Invalid JSON. Item {_index}: {e}")
+                _fill(_size)
+                _size = max(_size, len(_buffer))  # Large items are read in growing chunks
+            _pos = _end
+            _index += 1
+            yield _item
+            _char = _next_char()
+            if _char == ']':
+                break
+            elif _char != ',':
+                raise ValueError(f"Invalid JSON. Expected ',' or ']' after item {_index}")
+            _pos += 1
+        _pos += 1  # Closing bracket
+        if _next_char() != '':
+            raise ValueError(f"Invalid JSON. Extra data after the array")
+
+
+class Snapshot:
+    """
+    Vault snapshots: a JSONL document (one entry per line), optionally compressed with gzip.
+
+    The first line is a header. Categories and resources follow, sorted by their path within the vault::
+
+        {"__htv__":"snapshot","version":1}
+        {"path":"htb"}
+        {"path":"htb/lab/machine/resolute","resource":{"__type__":"htb.LabMachine",...}}
+
+    Snapshots are reproducible: keys are sorted, and the gzip header has neither a timestamp nor a file name
+    """
+    __header__ = dict(__htv__='snapshot', version=1)
+    __magic__ = b'\x1f\x8b'  # gzip
+
+    @staticmethod
+    def dumps(entry: dict) -> str:
+        """Serialize an entry, always to the same line. Dates (parsed from YAML) are serialized as strings"""
+        return json.dumps(entry, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+
+    @staticmethod
+    @contextmanager
+    def writer(path: str | Path, compress: bool = False):
+        """Write a snapshot. The file is replaced once it is complete
+
+        >>> with Snapshot.writer('vault.jsonl.gz', compress=True) as write:
+        >>>     write(dict(path='htb'))
+
+        :param path: Output file
+        :param compress: If True, the snapshot is compressed with gzip
+        :return: Callable writing an entry
+        """
+        _tmp = Path(path).with_name(f".{Path(path).name}.{os.getpid()}.tmp")
+        try:
+            with open(_tmp, 'wb') as raw:
+                _bin = gzip.GzipFile(filename='', mode='wb', fileobj=raw, mtime=0) if compress else raw
+                with io.TextIOWrapper(_bin, encoding='utf-8', newline='\n') as file:
+                    def _write(entry: dict) -> None:
+                        file.write(Snapshot.dumps(entry))
+                        file.write('\n')
+                    _write(Snapshot.__header__)
+                    yield _write
+        except BaseException:
+            _tmp.unlink(missing_ok=True)
+            raise
+        os.replace(_tmp, path)
+
+    @staticmethod
+    def read(path: str | Path) -> Iterator[dict]:
+        """Read a snapshot, compressed or not. Entries are yielded as they are read
+
+        :param path: Snapshot file
+        :return: Iterator over the entries, header excluded
+        :raise ValueError: Not a snapshot, or corrupted. Raised while iterating
+        """
+        with open(path, 'rb') as raw:
+            _compressed = raw.read(2) == Snapshot.__magic__
+            raw.seek(0)
+            with io.TextIOWrapper(gzip.GzipFile(fileobj=raw) if _compressed else raw, encoding='utf-8') as file:
+                ind = 1
+                try:
+                    _header = json.loads(file.readline() or 'null')
+                    if not isinstance(_header, dict) or _header.get('__htv__') != Snapshot.__header__['__htv__']:
+                        raise ValueError(f"Not a snapshot ({path})")
+                    elif _header.get('version') != Snapshot.__header__['version']:
+                        raise ValueError(f"Unsupported snapshot version {_header.get('version')} ({path})")
+                    for ind, line in enumerate(file, 2):
+                        if line.strip():
+                            yield json.loads(line)
+                except (OSError, EOFError, UnicodeDecodeError) as e:
+                    raise ValueError(f"Corrupted snapshot ({path}). {e}")
+                except JSONDecodeError as e:
+                    raise ValueError(f"Corrupted snapshot ({path}), line {ind}. {e}")
+
+
+class Browser:
+    """
+    Opens URLs in the web browser without blocking the caller.
+
+    URLs requested within a short time window (`__batch_delay__`) are batched and sent together to a single
+    launcher process, which is started once and reused for the rest of the execution.
+    The batching window runs in a background thread, the caller never waits.
+    Set `Browser.opener` to replace the launcher, e.g. with a stub in tests.
+    """
+    __batch_delay__ = 0.05  # Seconds
+    __launcher__ = 'import sys, webbrowser\nfor url in sys.stdin:\n    webbrowser.open_new_tab(url.strip())'
+
+    opener = None  # Callable receiving a list of URLs. If None, the launcher process is used
+    _pending = list()
+    _lock = threading.RLock()
+    _timer = None
+    _proc = None
+
+    @staticmethod
+    def open(*urls: str) -> None:
+        """Request URLs to be opened. Returns immediately
+
+        :param urls: URLs to be opened in new tabs
+        """
+        with Browser._lock:
+            Browser._pending.extend(urls)
+            if Browser._timer is None:  # Open a new batch
+                Browser._timer = threading.Timer(Browser.__batch_delay__, Browser.flush)
+                Browser._timer.start()
+
+    @staticmethod
+    def flush() -> None:
+        """Send the pending URLs to the opener now"""
+        with Browser._lock:
+            if Browser._timer is not None:
+                Browser._timer.cancel()
+                Browser._timer = None
+            _urls, Browser._pending = Browser._pending, list()
+            if len(_urls) > 0:
+                (Browser._launch if Browser.opener is None else Browser.opener)(_urls)
+
+    @staticmethod
+    def close() -> None:
+        """Flush pending URLs and release the launcher. It exits once all URLs are opened"""
+        Browser.flush()
+        with Browser._lock:
+            if Browser._proc is not None and Browser._proc.stdin is not None:
+                Browser._proc.stdin.close()
+            Browser._proc = None
+
+    @staticmethod
+    def _launch(urls: list[str]) -> None:
+        for _ in range(2):  # Restart the launcher once if it died
+            if Browser._proc is None or Browser._proc.poll() is not None:
+                Browser._proc = subprocess.Popen(
+                    [sys.executable, '-c', Browser.__launcher__],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    text=True,
+                    start_new_session=True  # Survives this process
+                )
+            try:
+                Browser._proc.stdin.write(''.join(f"{u}\n" for u in urls))
+                Browser._proc.stdin.flush()
+                return
+            except (BrokenPipeError, OSError):
+                Browser._proc = None
+
+
+class FileLock:
+    """
+    Advisory lock shared by all the htv processes, with reader/writer semantics (`fcntl.flock`).
+
+    Readers (:func:`FileLock.shared`) run in parallel, while a writer (:func:`FileLock.exclusive`) waits for
+    all of them and excludes everyone else. Locks are reentrant within a process: a shared lock taken while
+    holding the exclusive one is a no-op, and a shared lock is upgraded if the exclusive one is requested.
+    Threads of the same process take turns. Both methods can be used as context managers or decorators.
+
+    >>> with FileLock.conf().exclusive():
+    >>>     ...
+    >>> @FileLock.vault().shared()
+    >>> def list_resources(): ...
+
+    :ivar _path: [`Path` | Callable] Lock file, or a callable returning it (evaluated when the lock is taken)
+    :cvar __held__: [dict] Locks held by this process {path: [fd, exclusive, depth]}
+    """
+    __held__ = dict()
+    __guards__ = dict()  # {path: RLock}, one per lock file
+    __mutex__ = threading.Lock()
+
+    @staticmethod
+    def _reset() -> None:
+        """Forget the locks held by the parent process. Forked processes must acquire their own locks"""
+        FileLock.__held__ = dict()
+        FileLock.__guards__ = dict()
+        FileLock.__mutex__ = threading.Lock()
+
+    @staticmethod
+    def conf() -> 'FileLock':
+        """Lock of the configuration file (`conf.yml`)"""
+        return FileLock(CONF_PATH.with_name(f".{CONF_PATH.name}.lock"))
+
+    @staticmethod
+    def of(path: str | Path) -> 'FileLock':
+        """Lock of a single file (`.<name>.lock`, next to it), e.g. a cache updated by read-only commands"""
+        return FileLock(Path(path).with_name(f".{Path(path).name}.lock"))
+
+    @staticmethod
+    def vault() -> 'FileLock':
+        """Lock of the current vault (`.htv/vault.lock`), taken by operations adding or removing resources
+
+        Nothing is locked while the vault does not exist, so the lock never creates it
+        """
+        return FileLock(lambda: CONF['VAULT_DIR'] / '.htv/vault.lock' if CONF['VAULT_DIR'].exists() else None)
+
+    def __init__(self, path: str | Path | Callable):
+        """
+        :param path: Lock file, or a callable returning it (None to skip locking). It is created if it does not exist
+        """
+        self._path = path
+
+    @property
+    def path(self) -> Path | None:
+        _path = self._path() if callable(self._path) else self._path
+        return None if _path is None else Path(_path)
+
+    def shared(self):
+        """Reader lock, compatible with other readers"""
+        return self._lock(exclusive=False)
+
+    def exclusive(self):
+        """Writer lock, excludes readers and other writers"""
+        return self._lock(exclusive=True)
+
+    @contextmanager
+    def _lock(self, exclusive: bool):
+        if self.path is None:
+            yield self
+            return
+        _key = os.path.abspath(self.path)
+        with FileLock.__mutex__:
+            _guard = FileLock.__guards__.setdefault(_key, threading.RLock())
+        with _guard:
+            _held = FileLock.__held__.get(_key)
+            if _held is None:  # First acquisition in this process
+                os.makedirs(os.path.dirname(_key), exist_ok=True)
+                _fd = os.open(_key, os.O_RDWR | os.O_CREAT, 0o644)
+                if fcntl is not None:
+                    fcntl.flock(_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                FileLock.__held__[_key] = _held = [_fd, exclusive, 0]
+            _upgraded = exclusive and not _held[1]
+            if _upgraded and fcntl is not None:
+                fcntl.flock(_held[0], fcntl.LOCK_EX)
+            _held[1] = _held[1] or exclusive
+            _held[2] += 1
+            try:
+                yield self
+            finally:
+                _held[2] -= 1
+                if _held[2] == 0:  # Outermost lock released
+                    FileLock.__held__.pop(_key)
+                    os.close(_held[0])  # Closing the file releases the lock
+                elif _upgraded:
+                    _held[1] = False
+                    if fcntl is not None:
+                        fcntl.flock(_held[0], fcntl.LOCK_SH)
+
+
 class Cache:
     """
     Implements a cache using a temp file.
@@ -52,7 +511,7 @@ class Cache:
         :return: `Path` or a list of them. None if cache was empty or index provided out of bounds
         """
         try:  # load last list results (.tmp)
-            with open(Cache.__route__, 'r') as file:
+            with Cache.lock().shared(), open(Cache.__route__, 'r') as file:
                 _cc = [Path(i) for i in json.load(file)]
                 return _cc if index is None else _cc.pop(index)
         except FileNotFoundError:
@@ -62,19 +521,185 @@ class Cache:
     @staticmethod
     def set(items: list) -> None:
         """Update cache with provided items"""
-        with open(Cache.__route__, 'w') as file:
-            json.dump([str(i) for i in items], file)
+        with Cache.lock().exclusive():
+            with open(Cache.__route__.with_suffix('.tmp'), 'w') as file:
+                json.dump([str(i) for i in items], file)
+            os.replace(Cache.__route__.with_suffix('.tmp'), Cache.__route__)
 
     @staticmethod
     def clear() -> None:
         """Clears cache"""
-        if Cache.__route__.exists():
-            Cache.__route__.unlink()
+        with Cache.lock().exclusive():
+            if Cache.__route__.exists():
+                Cache.__route__.unlink()
+
+    @staticmethod
+    def lock() -> FileLock:
+        """Lock of the cache file"""
+        return FileLock(Cache.__route__.with_name(f"{Cache.__route__.name}.lock"))
+
+
+class Queue:
+    """
+    Persistent queue of pending resources, saved within the vault (`.htv/queue.json`).
+    Resources missing when a path is added can be queued (`htv add --defer-missing`) and added later in batch (`htv add --drain-queue`).
+    Each entry is a dict with the keys: `key` (resource path relative to the vault), `__type__`, `title`, `url` and `paths` (paths requesting it)
+    """
+    __route__ = Path('.htv/queue.json')  # Relative to the vault
+
+    @staticmethod
+    def path() -> Path:
+        """Absolute path of the queue file"""
+        return CONF['VAULT_DIR'] / Queue.__route__
+
+    @staticmethod
+    def get() -> list[dict]:
+        """Get queued entries
+
+        :return: List of entries. Empty if nothing is queued
+        """
+        try:
+            with open(Queue.path(), 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, JSONDecodeError):
+            return list()
+
+    @staticmethod
+    def _set(entries: list[dict]) -> None:
+        os.makedirs(Queue.path().parent, exist_ok=True)
+        with open(Queue.path().with_suffix('.tmp'), 'w') as file:
+            json.dump(entries, file, indent=1)
+        os.replace(Queue.path().with_suffix('.tmp'), Queue.path())
+
+    @staticmethod
+    @FileLock.vault().exclusive()
+    def put(*entries: dict) -> int:
+        """Queue entries. Entries already queued (same key) are merged
+
+        :return: Number of entries queued
+        """
+        _queue = {e['key']: e for e in Queue.get()}
+        for e in entries:
+            if e['key'] in _queue:  # Already queued, add the paths requesting it
+                _paths = _queue[e['key']].setdefault('paths', list())
+                _paths.extend([p for p in e.get('paths', list()) if p not in _paths])
+            else:
+                _queue[e['key']] = e
+        Queue._set(list(_queue.values()))
+        return len(_queue)
+
+    @staticmethod
+    @FileLock.vault().exclusive()
+    def remove(*keys: str) -> int:
+        """Remove entries from the queue
+
+        :param keys: Keys of the entries to be removed
+        :return: Number of entries still queued
+        """
+        _queue = [e for e in Queue.get() if e['key'] not in keys]
+        Queue._set(_queue)
+        return len(_queue)
+
+    @staticmethod
+    @FileLock.vault().exclusive()
+    def clear() -> None:
+        """Clears the queue"""
+        if Queue.path().exists():
+            Queue.path().unlink()
+
+
+class ClipboardWatcher:
+    """
+    Polls the clipboard for new contents.
+
+    The polling interval adapts to the activity: it is reset to its minimum when the clipboard changes, and doubles
+    on every poll without changes, up to its maximum. So an idle clipboard is barely polled.
+    Contents are identified by their hash, each one is reported only once, even if it is copied again.
+    Set `ClipboardWatcher.backend` to replace `pyperclip.paste`, e.g. with a fake clipboard in tests.
+
+    :ivar interval: [float] Current polling interval, in seconds
+    :ivar seen: [set] Hashes of the contents already reported (or ignored)
+    :ivar available: [bool] False if there is no clipboard (e.g. headless system)
+    """
+    backend = None  # Callable returning the contents of the clipboard. If None, `pyperclip.paste` is used
+
+    def __init__(self, interval: tuple[float, float] = (0.25, 2.0), accept: Callable[[str], bool] = None):
+        """
+        :param interval: Minimum and maximum polling intervals, in seconds
+        :param accept: Called with new contents. If it returns False, they are ignored
+        """
+        self.min_interval, self.max_interval = interval
+        self.interval = self.min_interval
+        self.accept = accept
+        self.seen = set()
+        self.available = True
+
+    @staticmethod
+    def paste() -> str | None:
+        """Current contents of the clipboard
+
+        :return: The contents of the clipboard. None if there is no copy/paste mechanism (e.g. headless system)
+        """
+        try:
+            return (pyperclip.paste if ClipboardWatcher.backend is None else ClipboardWatcher.backend)() or ''
+        except pyperclip.PyperclipException:
+            print(f"[!] Clipboard not available")
+            return None
+
+    @staticmethod
+    def digest(text: str) -> bytes:
+        return hashlib.blake2b(text.encode(errors='replace'), digest_size=16).digest()
+
+    def poll(self) -> str | None:
+        """Read the clipboard once, and adapt the polling interval
+
+        :return: The contents of the clipboard, if not seen before and accepted. Otherwise, None
+        """
+        _text = ClipboardWatcher.paste()
+        if _text is None:
+            self.available = False
+            return None
+        _digest = ClipboardWatcher.digest(_text)
+        if _digest in self.seen:
+            self.interval = min(self.interval * 2, self.max_interval)
+            return None
+        self.seen.add(_digest)
+        self.interval = self.min_interval
+        return _text if self.accept is None or self.accept(_text) else None
+
+    def watch(self, stop: Callable[[], bool] = None) -> Iterator[str | None]:
+        """Yield the new contents of the clipboard as they are copied
+
+        Contents copied before watching are ignored.
+        None is yielded once each time the clipboard becomes idle (the interval reaches its maximum), e.g. to flush
+        pending work. Watching ends if the clipboard is not available
+
+        :param stop: Called after every poll. If it returns True, watching ends
+        """
+        _text = ClipboardWatcher.paste()
+        if _text is None:
+            self.available = False
+            return
+        self.seen.add(ClipboardWatcher.digest(_text))
+        _idle = True
+        while self.available and (stop is None or not stop()):
+            time.sleep(self.interval)
+            _text = self.poll()
+            if _text is not None:
+                _idle = False
+                yield _text
+            elif not _idle and self.interval >= self.max_interval:
+                _idle = True
+                yield None
 
 
 class Conf(dict):
     """
     Configuration class. Allows to have a callable runtime instance that read/write the changes to a file.
+
+    Changes must be done through :func:`Conf.update_values`, :func:`Conf.remove_values` or :func:`Conf.reset`.
+    They are serialized between threads, and listeners (:func:`Conf.subscribe`) are notified after each of them.
+    Workers should read an immutable snapshot (:func:`Conf.snapshot`), which never changes under them.
     """
     def __init__(self, runtime: dict, default: dict):
         """Initialize a Configuration instance
@@ -85,31 +710,121 @@ class Conf(dict):
         super().__init__()
         self._default = default
         self._runtime = runtime
+        self._mutex = threading.RLock()
+        self._listeners = list()  # [(callback, keys)]
+        self._snapshot = None
         self.load(**self._runtime)
 
-    def _save(self) -> None:
+    def __setitem__(self, key, value) -> None:
+        super().__setitem__(key, value)
+        self._snapshot = None  # Direct changes are neither saved nor notified, but they are seen by new snapshots
+
+    def __delitem__(self, key) -> None:
+        super().__delitem__(key)
+        self._snapshot = None
+
+    def snapshot(self) -> MappingProxyType:
+        """Immutable copy of the current configuration
+
+        The same snapshot is returned until the configuration changes, so reading it needs neither locks nor disk I/O.
+
+        :return: Read-only mapping
+        """
+        _snap = self._snapshot
+        if _snap is None:
+            with self._mutex:
+                if self._snapshot is None:
+                    self._snapshot = MappingProxyType(self._copy())
+                _snap = self._snapshot
+        return _snap
+
+    def _copy(self) -> dict:
+        """Copy of the current configuration. Mutable values (dict, list) are copied too"""
+        return {k: copy.deepcopy(v) if isinstance(v, dict | list) else v for k, v in self.items()}
+
+    def subscribe(self, callback: Callable, *keys: str) -> None:
+        """Get notified of configuration changes
+
+        The callback receives the changes `{key: (old_value, new_value)}` (None if missing) and the new snapshot.
+        It is called after the change is applied, in the thread that made it.
+
+        :param callback: Function called on every change
+        :param keys: Keys to watch. If none, any change is notified
+        """
+        with self._mutex:
+            self._listeners.append((callback, {k.upper() for k in keys}))
+
+    def unsubscribe(self, callback: Callable) -> None:
+        """Stop notifying a callback"""
+        with self._mutex:
+            self._listeners = [(c, k) for c, k in self._listeners if c != callback]
+
+    def _commit(self, old: dict, merge: bool = True) -> None:
+        """Save and notify the changes made to the configuration, compared to its previous content
+
+        Only persistent values (keys not starting with '_') cause the file to be written.
+        Must be called holding the lock.
+
+        :param old: Previous content, see :func:`Conf._copy`. Values modified in place are detected too
+        :param merge: If True, only the changed values are written over the saved configuration (see :func:`Conf._save`)
+        """
+        _changes = {
+            k: (old.get(k), self.get(k)) for k in old.keys() | self.keys()
+            if k not in old or k not in self or old[k] != self[k]
+        }
+        if len(_changes) == 0:
+            return
+        self._snapshot = None
+        if any(not k.startswith('_') for k in _changes):
+            self._save(_changes.keys() if merge else None)
+        _snap = self.snapshot()
+        for callback, keys in list(self._listeners):
+            if len(keys) == 0 or not keys.isdisjoint(_changes):
+                try:
+                    callback({k: v for k, v in _changes.items() if len(keys) == 0 or k in keys}, _snap)
+                except Exception:
+                    print(f"[!] Configuration listener failed ({callback})")
+                    print(traceback.format_exc())
+
+    def _save(self, keys: Iterable[str] = None) -> None:
         """Save current configuration
 
         Save current configuration parameters to disk.
         Runtime values (keys starting by `_`) are not dump into local file.
-        If a parameter contained environment variables, they are shortened again
+        If a parameter contained environment variables, they are shortened again.
+        Other processes may have saved their own changes: the file is read again under the lock,
+        and only the keys changed by this process are written over it
 
+        :param keys: Keys changed by this process. If None, or the file cannot be read, the whole configuration is saved
         :return: None
         """
-        with open(CONF_PATH, 'w') as file:  # Save changes to disk
-            _data = {}
-            for k, v in self.items():
+        _tmp = CONF_PATH.with_name(f".{CONF_PATH.name}.{os.getpid()}.tmp")
+        with FileLock.conf().exclusive():
+            _data = None
+            if keys is not None:
+                try:
+                    with open(CONF_PATH, 'r') as file:
+                        _data = yaml.safe_load(file)
+                except (OSError, yaml.YAMLError):
+                    pass
+            if not isinstance(_data, dict):
+                _data, keys = dict(), self.keys()
+            for k in list(keys):
                 if k.startswith('_'):  # Skip keys starting with '_', they are only used in execution time
                     continue
-                if isinstance(v, int|float):
-                    _data[k] = v
+                elif k not in self:  # Removed
+                    _data.pop(k, None)
+                elif isinstance(self[k], int|float):
+                    _data[k] = self[k]
                 elif hasattr(self, f'_{k.lower()}'):  # If vars were expanded, replace them
                     _data[k] = self.__getattribute__(f'_{k.lower()}')
-                elif isinstance(v, dict|list):
-                    _data[k] = v
+                elif isinstance(self[k], dict|list):
+                    _data[k] = self[k]
                 else:
-                    _data[k] = str(v)  # cast any non-numeric value to str to avoid serialization problems
-            yaml.dump(_data, file)
+                    _data[k] = str(self[k])  # cast any non-numeric value to str to avoid serialization problems
+            with open(_tmp, 'w') as file:
+                yaml.dump(_data, file)
+            os.replace(_tmp, CONF_PATH)  # Readers never see a partial file
 
     def load(self, **kwargs) -> None:
         """Load configuration
@@ -123,7 +838,7 @@ class Conf(dict):
         :return: None
         """
         try:
-            with open(CONF_PATH, 'r') as file:
+            with FileLock.conf().shared(), open(CONF_PATH, 'r') as file:
                 _data = yaml.safe_load(file)
             for k in self._default:
                 if k not in _data:
@@ -148,13 +863,18 @@ class Conf(dict):
         :param kwargs: Values to be updated in the configuration
         :return: None
         """
+        with self._mutex:
+            _old = self._copy()
+            self._set(**kwargs)
+            self._commit(_old)
+
+    def _set(self, **kwargs) -> None:
         for k, v in kwargs.items():
             if isinstance(v, str|Path) and str(v).find('$') != -1:  # String contains env variables
                 self.__setattr__(f'_{k.lower()}', str(v))  # Save original value
                 self[k.upper()] = Path(os.path.expandvars(v))  # Expand variables
             else:
                 self[k.upper()] = v
-        self._save()
 
     def remove_values(self, *args) -> None:
         """Remove configuration values
@@ -164,10 +884,12 @@ class Conf(dict):
         :param args: Name(s) of the params to be removed from configuration
         :return: None
         """
-        for v in args:
-            if v.upper() in self.keys():
-                self.pop(v.upper())
-        self._save()
+        with self._mutex:
+            _old = self._copy()
+            for v in args:
+                if v.upper() in self.keys():
+                    self.pop(v.upper())
+            self._commit(_old)
 
     def reset(self, restart: bool = False) -> None:
         """Resets the configuration to defaults parameters
@@ -175,10 +897,12 @@ class Conf(dict):
         :return: None
         """
         print(f"[*] Resetting default config...")
-        self.clear()
-        self.update_values(**self._default, **self._runtime)  # Default conf values and runtime parameters
-        # self.update_values(**self._runtime)  # Add runtime parameters
-        self._save()
+        with self._mutex:
+            _old = self._copy()
+            self.clear()
+            self._set(**copy.deepcopy(self._default), **self._runtime)  # Default conf values and runtime parameters
+            # self.update_values(**self._runtime)  # Add runtime parameters
+            self._commit(_old, merge=False)  # Saved if anything changed
         if restart:
             print(f"[*] Re-starting the application to apply the changes")
             exit(0)
@@ -195,6 +919,7 @@ class FsTools:
         Dump the provided content into a file.
         If it does not exist, or any of the intermediate directories, they will be created
         To render a template set 'content' to 't:<template_name>'. Instead of  dumping content as plain text, it will dump the rendered template.
+        The file is written atomically, see :class:`WritePlan`
 
         :param path: Path of the output file.
         :param content: Content to be dumped into the file. Use 't:<template_name>' to use a template.
@@ -203,33 +928,20 @@ class FsTools:
         :raise FileExistsError: If file already exists and param `exists_ok` is False
         :return: None
         """
-        if not path.parent.exists():  # Create directory if it does not exist
-            os.makedirs(path.parent)
-        if os.path.exists(path) and not exists_ok:  # If file exists
-            raise FileExistsError(f"File {path} already exists and it's not empty")
-        if content is None:
-            content = ''
-        if isinstance(content, str) and content.startswith('t:'):
-            content = FsTools.render_template(content.split(':').pop(), path, **kwargs)
-        if isinstance(content, bytes):
-            mode = 'wb'
-        else:
-            mode = 'w'
-            if content.startswith('t:'):  # Render template
-                content = FsTools.render_template(content.split(':').pop(), path, **kwargs)
-        with open(path, mode) as file:  # Dump content to file
-            file.write(content)
+        WritePlan([(path, '' if content is None else content, kwargs)]).execute(exists_ok=exists_ok)
 
 
     @staticmethod
-    def dump_files(files: Iterable, root_dir: str | Path = None, exists_ok: bool = False):
+    def dump_files(files: Iterable, root_dir: str | Path = None, exists_ok: bool = False, fsync: bool = False) -> list[Path]:
         """Dump a list of files.
 
-        See also :func:`FsTools.dump_file`
+        All the files are written at once, see :class:`WritePlan`
 
         :param files: list of tuples (path:str, content:str, kwargs:dict)
         :param root_dir: Root dir for the files. If None, files' path will be equal to the name provided
         :param exists_ok: If False and file already exists, raise FileExistError
+        :param fsync: If True, changes are flushed to disk once all the files are written
+        :return: Paths of the files written
 
         >>> _files = [
         >>>    'any/other/dir',
@@ -238,24 +950,41 @@ class FsTools:
         >>>    ('file3.md', 't:readme.md', dict(param1="value1", param2="value2"))
         >>> ]
         """
-        for f in iter(files):  # (name, content, dict())
-            if isinstance(f, Path | str): # Just one arg provided
-                name = f
-                content = None
-                kwargs = dict()
-            else:  # Many arguments (tuple)
-                name = f[0]
-                content = f[1] if len(f) >= 2 else ''
-                kwargs = f[2] if len(f) == 3 else dict()
+        return WritePlan(files, root_dir=root_dir).execute(exists_ok=exists_ok, fsync=fsync)
 
-            if root_dir is not None:  # Name is relative to root_dir
-                name = Path(root_dir) / name
 
-            if content is None: # Name points to directory
-                os.makedirs(name, exist_ok=True)
-            else: # Name points to file
-                FsTools.dump_file(name, content=content, exists_ok=exists_ok, **kwargs)
+    @staticmethod
+    def link(target: str | Path, path: str | Path) -> Path:
+        """Create a relative link pointing to target
+
+        A symbolic link is created. If the filesystem (or the user) does not support them,
+        a link manifest (`<path>.md`) with a relative Markdown link is created instead.
+        Existing links are replaced, other existing files are not.
 
+        :param target: Path to be linked. It may not exist yet
+        :param path: Path of the link
+        :return: Path of the link (or the manifest)
+        :raise FileExistsError: `path` exists and it is not a link
+        """
+        target, path = Path(target), Path(path)
+        os.makedirs(path.parent, exist_ok=True)
+        _rel = Path(os.path.relpath(target, path.parent))
+        if path.is_symlink():
+            path.unlink()
+        try:
+            os.symlink(_rel, path, target_is_directory=True)
+            return path
+        except OSError as e:
+            # Symlinks not supported (or privilege not held, WinError 1314). Use a manifest
+            if e.errno not in (errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP, errno.ENOSYS) \
+                    and getattr(e, 'winerror', None) != 1314:
+                raise
+        except NotImplementedError:
+            pass
+        _manifest = path.with_name(f"{path.name}.md")
+        with open(_manifest, 'w') as file:
+            file.write(f"[{target.name}]({_rel.as_posix()}/README.md)\n")
+        return _manifest
 
     @staticmethod
     def set_clipboard(value: str | Path):
@@ -270,24 +999,31 @@ class FsTools:
 
     @staticmethod
     def copy_js_toolkit(path: str | Path, _stdout: TextIO | tqdm = sys.stdout):
-        _prompt = '[*] Use the script in the dev-tools console (F12). Then copy the returned value into the terminal.'
-        FsTools.set_clipboard(path)
-        _stdout.write('[+] JavaScript tools copied to the clipboard\n')
+        _prompt = ('[*] Use the script in the dev-tools console (F12). Then copy the returned value into the terminal.\n'
+                   '[*] Several pages? Run batchStart() first, and batchExport() when done to copy all of them at once.')
+        try:
+            FsTools.set_clipboard(path)
+            _stdout.write('[+] JavaScript tools copied to the clipboard\n')
+        except pyperclip.PyperclipException:  # No copy/paste mechanism (e.g. headless system)
+            _stdout.write(f"[!] Clipboard not available. Copy the JavaScript tools from '{path}'\n")
         _stdout.write(f"{_prompt}\n")
 
 
     @staticmethod
-    def render_template(template: str, out: str | Path = None, **kwargs) -> str:
+    def render_template(template: str, out: str | Path = None, **kwargs) -> str | None:
         """Render a template
 
         Renders a template from the template directory (`CONF['_JINJA_ENV']`)
-        If out is provided, saves the rendered template into that file
+        If out is provided, the template is streamed into that file, see :func:`FsTools.stream_template`
 
         :param template: template to be used from /templates
         :param out: output file to write the template. If None, just returns the rendered template
         :param kwargs: Additional arguments for the render
-        :return: The rendered template. None if the render failed for any reason
+        :return: The rendered template. None if it was written to `out`. Empty if the render failed for any reason
         """
+        if out is not None:
+            FsTools.dump_file(Path(out), f"t:{template}", exists_ok=True, **kwargs)
+            return None
         kwargs.update({'templater': Templater})
         try:
             _render = CONF['_JINJA_ENV'].get_template(template).render(kwargs)
@@ -295,35 +1031,57 @@ class FsTools:
             print(f"[!] Failed to render the template '{template}'")
             print(traceback.format_exc())
             _render = ''
-        if out is not None:
-            FsTools.dump_file(out, _render, exists_ok=True)
         return _render
 
     @staticmethod
+    def stream_template(template: str, file: TextIO, **kwargs) -> None:
+        """Render a template chunk by chunk into an open file
+
+        The rendered output is never held in memory as a whole, which matters for long documents.
+        If the render fails, the file is truncated, as :func:`FsTools.render_template` would render an empty string
+
+        :param template: template to be used from /templates
+        :param file: Text file handle, opened for writing
+        :param kwargs: Additional arguments for the render
+        :return: None
+        """
+        kwargs.update({'templater': Templater})
+        start = file.tell()
+        try:
+            CONF['_JINJA_ENV'].get_template(template).stream(kwargs).dump(file)
+        except TypeError:
+            print(f"[!] Failed to render the template '{template}'")
+            print(traceback.format_exc())
+            file.seek(start)
+            file.truncate()
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
     def secure_filename(name) -> str:
         """Returns a secure filename:
 
         Returns a secure filename: lowercased, not containing special characters and
-        with all spaces replaced by underscores (`_`)
+        with all spaces replaced by underscores (`_`). Results are cached, names are usually requested many times
 
         :return: Secured filename
         """
-        return re.sub(
-            r"[ ,&:\"'-]+", '_',
+        return _UNSAFE_FILENAME_CHARS.sub(
+            '_',
             None if name is None else str(name).strip()
         ).lower().strip('_')
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def secure_dirname(name) -> str:
         """Returns a secure dir name:
 
         Returns a secure dir name: lowercased, not containing special characters and
-        with all spaces replaced by dashes (`-`)
+        with all spaces replaced by dashes (`-`). Results are cached, names are usually requested many times
 
         :return: Secured dir name
         """
-        return re.sub(
-            r"[ ,&:?\"'-]+", '-',
+        return _UNSAFE_DIRNAME_CHARS.sub(
+            '-',
             None if name is None else str(name).strip()
         ).lower().strip('-')
 
@@ -349,7 +1107,8 @@ class FsTools:
             print(f"[-] Index {selector} does not exist. Run command `list` again.")
             return None
         except ValueError:  # Not an index, try string search
-            _tgs = list(CONF['VAULT_DIR'].glob(f"**/{str(selector).lower()}"))
+            # Links to resources (e.g. path sections) are skipped, they point to the resource itself
+            _tgs = [p for p in CONF['VAULT_DIR'].glob(f"**/{str(selector).lower()}") if not p.is_symlink()]
             if len(_tgs) == 1:
                 return _tgs[0]
             else:
@@ -359,6 +1118,29 @@ class FsTools:
                     print(f"[-] Not matches found")
                 return None
 
+    @staticmethod
+    def dump_yaml(data) -> str:
+        """Serialize to YAML, with the libyaml emitter when available
+
+        The output is the same as `yaml.dump`. Objects unknown to the safe dumper are serialized by `yaml.dump`
+
+        :param data: Data to be serialized
+        :return: The YAML document
+        """
+        try:
+            return yaml.dump(data, Dumper=_YAML_DUMPER)
+        except yaml.representer.RepresenterError:
+            return yaml.dump(data)
+
+    @staticmethod
+    def load_yaml(data: str | TextIO):
+        """Parse YAML (as `yaml.safe_load`), with the libyaml parser when available
+
+        :param data: YAML document or stream
+        :return: The parsed data
+        """
+        return yaml.load(data, Loader=_YAML_LOADER)
+
     @staticmethod
     def is_json(data):
         try:
@@ -374,7 +1156,7 @@ class FsTools:
         try:
             if isinstance(data, Path):
                 data = open(data, 'r').read()
-            return isinstance(yaml.safe_load(data), dict) and not FsTools.is_json(data)
+            return isinstance(FsTools.load_yaml(data), dict) and not FsTools.is_json(data)
         except (yaml.YAMLError, UnicodeDecodeError):
             return False
 
@@ -447,6 +1229,49 @@ class Git:
         else:  # Set upstream for main branch, then push
             subprocess.run('git push -u origin main', shell=True, cwd=CONF['VAULT_DIR'])
 
+    @staticmethod
+    def read_files(rev: str, name: str, path: str | Path = None) -> list[tuple[str, bytes]]:
+        """Read every file with a given name, as it was at a revision
+
+        Files are listed with `git ls-tree`, and read at once by a single `git cat-file --batch` process.
+        Files within hidden directories are skipped.
+
+        :param rev: Git revision (e.g. `HEAD`, `HEAD~1`, `ORIG_HEAD`)
+        :param name: File name (e.g. `info.yml`)
+        :param path: Directory of the repository to be read. Defaults to `CONF['VAULT_DIR']`
+        :return: Pairs (file path relative to `path`, contents)
+        :raise ValueError: If the revision is not found
+        """
+        path = CONF['VAULT_DIR'] if path in [None, ''] else Path(path)
+        _proc = subprocess.run(['git', 'ls-tree', '-r', '-z', rev], capture_output=True, cwd=path)
+        if _proc.returncode != 0:
+            raise ValueError(f"Unknown revision '{rev}'. {_proc.stderr.decode(errors='replace').strip()}")
+        _files = list()  # [(path, object id)]
+        for entry in _proc.stdout.split(b'\0'):
+            _meta, _, _file = entry.decode(errors='surrogateescape').partition('\t')
+            if _file == '' or _meta.split()[1] != 'blob':
+                continue
+            _parts = _file.split('/')
+            if _parts[-1] == name and not any(p.startswith('.') for p in _parts[:-1]):
+                _files.append((_file, _meta.split()[2]))
+        if len(_files) == 0:
+            return list()
+        _proc = subprocess.run(
+            ['git', 'cat-file', '--batch'],
+            input=''.join(f"{oid}\n" for _, oid in _files).encode(),
+            capture_output=True,
+            check=True,
+            cwd=path
+        )
+        _ret = list()
+        _out, pos = _proc.stdout, 0
+        for _file, _ in _files:  # Output: '<oid> <type> <size>\n<contents>\n' per object, in the same order
+            _eol = _out.index(b'\n', pos)
+            _size = int(_out[pos:_eol].split()[2])
+            _ret.append((_file, _out[_eol + 1:_eol + 1 + _size]))
+            pos = _eol + 1 + _size + 1
+        return _ret
+
     @staticmethod
     def freeze_virtual_environments(path: str | Path = None):
         """Create requirements.txt
@@ -475,6 +1300,128 @@ class Git:
             shutil.rmtree(p)  # Remove the virtual environment. Can be installed again with
 
 
+class WritePlan:
+    """
+    Set of directories and files to be written at once.
+
+    The plan is executed in phases, so an error does not leave half-written resources behind:
+    the directories are created in a single pass, all contents are written (templates are streamed) to temp files,
+    and finally temp files are renamed to their final names. Optionally, the files written and their directories
+    are synced once at the end.
+
+    Entries use the same syntax as :func:`FsTools.dump_files`: a path (directory), or a tuple
+    (path, content, kwargs) where content may be 't:<template_name>' to render a template with kwargs.
+
+    :ivar dirs: [set[Path]] Directories to be created
+    :ivar files: [dict] Files to be written {path: (content, kwargs)}
+    """
+
+    def __init__(self, files: Iterable = None, root_dir: str | Path = None):
+        """
+        :param files: Entries to be added to the plan
+        :param root_dir: Root dir for the entries. If None, entries' path are used as provided
+        """
+        self.dirs = set()
+        self.files = dict()
+        if files is not None:
+            self.add(*files, root_dir=root_dir)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def add(self, *files, root_dir: str | Path = None) -> 'WritePlan':
+        """Add entries to the plan
+
+        :param files: Entries. Paths (directories) or tuples (path, content, kwargs)
+        :param root_dir: Root dir for the entries. If None, entries' path are used as provided
+        :return: This plan, to allow chaining
+        """
+        for f in files:
+            if isinstance(f, Path | str):  # Just one arg provided
+                name, content, kwargs = f, None, dict()
+            else:  # Many arguments (tuple)
+                name = f[0]
+                content = f[1] if len(f) >= 2 else ''
+                kwargs = f[2] if len(f) == 3 else dict()
+            name = Path(name) if root_dir is None else Path(root_dir) / name
+            if content is None:  # Name points to directory
+                self.dirs.add(name)
+            else:  # Name points to file
+                self.files[name] = (content, kwargs)
+        return self
+
+    @staticmethod
+    def template(path: Path, content: str | bytes) -> str | None:
+        """Template used to render a file, if its content is 't:<template_name>'
+
+        :raise TypeError: If content is not str or bytes
+        """
+        if not isinstance(content, str | bytes):
+            raise TypeError(f"Expected str or bytes content for '{path}', found {type(content)}")
+        if isinstance(content, str) and content.startswith('t:'):
+            return content.split(':').pop()
+        return None
+
+    def execute(self, exists_ok: bool = False, fsync: bool = False) -> list[Path]:
+        """Write the plan to disk
+
+        :param exists_ok: If False and any file already exists, raise FileExistError. Nothing is written
+        :param fsync: If True, files are flushed to disk before being renamed, and their directories once, after all the renames
+        :raise FileExistsError: If any file already exists and param `exists_ok` is False
+        :return: Paths of the files written
+        """
+        if not exists_ok:
+            for path in self.files:
+                if os.path.exists(path):
+                    raise FileExistsError(f"File {path} already exists and it's not empty")
+        # Create directories. Parents are created by their deepest children
+        _dirs = self.dirs | {path.parent for path in self.files}
+        _parents = {p for d in _dirs for p in d.parents}
+        for d in _dirs - _parents:
+            os.makedirs(d, exist_ok=True)
+        # Write contents to temp files, then rename them
+        _tmp = dict()
+        try:
+            for path, (content, kwargs) in self.files.items():
+                template = WritePlan.template(path, content)
+                _tmp[path] = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+                with open(_tmp[path], 'xb' if isinstance(content, bytes) else 'x') as file:
+                    if template is None:
+                        file.write(content)
+                    else:  # Rendered chunks go straight to the file
+                        FsTools.stream_template(template, file, **kwargs)
+                    if fsync:  # Contents are durable before the rename, so a crash never leaves a truncated file
+                        file.flush()
+                        os.fsync(file.fileno())
+        except BaseException:
+            for t in _tmp.values():  # Discard everything written so far
+                if t.exists():
+                    t.unlink()
+            raise
+        for path, t in _tmp.items():
+            os.replace(t, path)
+        if fsync:
+            WritePlan.sync(*_tmp)
+        return list(_tmp)
+
+    @staticmethod
+    def sync(*paths: Path) -> None:
+        """Flush the directories containing the files to disk, so their renames are durable
+
+        Each directory is synced once. Directories cannot be opened on Windows, nothing is synced there
+
+        :param paths: Files renamed
+        """
+        if os.name == 'nt':
+            return
+        for d in {Path(path).parent for path in paths}:  # Renames are durable once their directory is synced
+            _fd = os.open(d, os.O_RDONLY)
+            try:
+                os.fsync(_fd)
+            finally:
+                os.close(_fd)
+
+
 class Templater:
 
     @staticmethod
@@ -531,24 +1478,35 @@ class Templater:
                 return None
 
     @staticmethod
-    def pagination(resource, section) -> str:
-        """Generates pagination link
+    def neighbors(items: list) -> list[tuple]:
+        """Precompute the navigation table of a sequence
+
+        :param items: Ordered sequence, like the sections of a :class:`resources.HtvModule`
+        :return: A list of (previous, next) tuples, one per item. Missing neighbors are None
+        """
+        items = list(items)
+        if len(items) == 0:
+            return list()
+        return list(zip([None, *items[:-1]], [*items[1:], None]))
+
+    @staticmethod
+    def pagination(resource, section, neighbors: tuple = None) -> str:
+        """Generates pagination links
 
         :param resource: HtvResource instance owning the section
         :param section: HtvModule.Section whose pagination links will be generated
+        :param neighbors: (previous, next) sections, see :func:`Templater.neighbors`. If None, they are searched in `resource.sections`
         """
+        if neighbors is None:  # Not precomputed, lookup the section
+            ind = resource.sections.index(section)
+            neighbors = (
+                resource.sections[ind - 1] if ind > 0 else None,
+                resource.sections[ind + 1] if ind < len(resource.sections) - 1 else None
+            )
         _nav_menu_md = ['---\n']
-        ind = resource.sections.index(section)
-        if ind < len(resource.sections) - 1:
-            _nav_menu_md.append(
-                f"[Next: {resource.sections[ind + 1].title}]"
-                f"(./{resource.sections[ind + 1].__file_name__})"
-                f"< br >")
-        elif ind > 0:
-            _nav_menu_md.append(
-                f"[Previous: {resource.sections[ind - 1].title}]"
-                f"(./{resource.sections[ind - 1].__file_name__})"
-                f"< br >")
+        for label, _st in zip(['Previous', 'Next'], neighbors):
+            if _st is not None:
+                _nav_menu_md.append(f"[{label}: {_st.title}](./{_st.__file_name__})< br >")
         return '\n'.join(_nav_menu_md)
 
     @staticmethod
@@ -586,35 +1544,30 @@ def open_browser_tab(url, quiet: bool = True, delay: int = 0) -> None:
     """Open url in a new tab
 
     :param url: URL to be opened
-    :param quiet: If True runs the command in the background. Else runs in foreground
-    :param delay: Seconds to wait before and after opening the page
+    :param quiet: If True the URL is opened in the background (:class:`Browser`), returning immediately. Else runs in foreground
+    :param delay: Deprecated, ignored. The caller is never delayed
     :return: None
     """
-    time.sleep(delay)
     if quiet:
-        subprocess.run(
-            'python3 -c "import webbrowser;webbrowser.open_new_tab(\'' + url + '\')" &',
-            shell=True,
-            capture_output=True
-        )
+        Browser.open(url)
     else:
         webbrowser.open_new_tab(url)
-    time.sleep(delay)
 
 def add_extensions(**kwargs) -> None:
     """Load add-on extensions
 
     :param kwargs: Extensions to be added ext=cat. For example: `.ovpn='htb.vpn'`
     """
-    _ext = CONF.get('EXTENSIONS', dict())
-    _ext.update(**kwargs)
-    CONF.update_values(EXTENSIONS=_ext)
+    with CONF._mutex:  # Values are replaced, never modified in place, so the change is detected, saved and notified
+        # Add-ons register their extensions on every run: they are defaults too, kept on reset
+        CONF._default = {**CONF._default, 'EXTENSIONS': {**CONF._default.get('EXTENSIONS', dict()), **kwargs}}
+        CONF.update_values(EXTENSIONS={**CONF.get('EXTENSIONS', dict()), **kwargs})
 
 def flatten(lst):
     if lst is None:
         return list()
     for item in lst:
-        if isinstance(item, list):
+        if isinstance(item, list | Iterator):  # Iterators, e.g. resources streamed from a batch
             yield from flatten(item)
         else:
             yield item
@@ -623,3 +1576,6 @@ def flatten(lst):
 
 """Dynamic configuration"""
 CONF = Conf(runtime=RUNTIME_CONF,default=DEFAULT_CONF)
+
+atexit.register(Browser.close)  # Open pending URLs before exiting
+os.register_at_fork(after_in_child=FileLock._reset)
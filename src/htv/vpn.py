@@ -0,0 +1,684 @@
+from pathlib import Path
+import sys
+
+ROOT_PKG = Path(__file__).parents[1] # Points to install-dir/src/
+sys.path.insert(0, str(ROOT_PKG))
+
+from collections.abc import Callable, Iterator
+from datetime import datetime
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import stat
+import subprocess
+import tempfile
+import time
+
+__all__ = [
+    'LatencyProbe',
+    'RotatingLog',
+    'VpnSupervisor',
+]
+
+#####   C L A S S E S   #####
+
+class LatencyProbe:
+    """
+    Latency of VPN servers, measured concurrently.
+
+    TCP servers are probed with a TCP handshake. UDP servers are sent an OpenVPN session reset
+    (`P_CONTROL_HARD_RESET_CLIENT_V2`), and the round trip is measured when any datagram comes back.
+    Servers not replying in time are unreachable (None).
+    Results are cached (`/tmp/.htv.vpn-probe.json`) for `ttl` seconds.
+
+    Targets are tuples (protocol, host, port).
+    """
+    __route__ = Path('/tmp/.htv.vpn-probe.json')
+
+    @staticmethod
+    async def tcp(host: str, port: int, timeout: float = 2.0) -> float | None:
+        """Time (seconds) to open a TCP connection. None if unreachable"""
+        _start = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        except (OSError, TimeoutError):
+            return None
+        _rtt = time.perf_counter() - _start
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return _rtt
+
+    @staticmethod
+    async def udp(host: str, port: int, timeout: float = 2.0) -> float | None:
+        """Round trip time (seconds) of an OpenVPN session reset. None if unreachable"""
+        loop = asyncio.get_running_loop()
+        _reply = loop.create_future()
+
+        class _Protocol(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                if not _reply.done():
+                    _reply.set_result(time.perf_counter())
+
+            def error_received(self, exc):  # E.g. ICMP port unreachable
+                if not _reply.done():
+                    _reply.set_exception(exc)
+
+        try:
+            transport, _ = await loop.create_datagram_endpoint(_Protocol, remote_addr=(host, port))
+        except OSError:
+            return None
+        try:
+            # Opcode 7 (hard reset client v2), key id 0 | session id | no acks | packet id 0
+            _start = time.perf_counter()
+            transport.sendto(bytes([7 << 3]) + os.urandom(8) + bytes(1) + bytes(4))
+            return await asyncio.wait_for(_reply, timeout) - _start
+        except (OSError, TimeoutError):
+            return None
+        finally:
+            transport.close()
+
+    @staticmethod
+    async def measure(targets: list[tuple[str, str, int]], timeout: float = 2.0) -> dict[tuple, float | None]:
+        """Probe all the targets at once
+
+        :param targets: Tuples (protocol, host, port)
+        :param timeout: Seconds to wait for each target
+        :return: Mapping {target: latency in seconds, None if unreachable}
+        """
+        targets = list(dict.fromkeys(targets))  # Probe duplicates once
+        _results = await asyncio.gather(*[
+            (LatencyProbe.udp if proto == 'udp' else LatencyProbe.tcp)(host, int(port), timeout)
+            for proto, host, port in targets
+        ])
+        return dict(zip(targets, _results))
+
+    @staticmethod
+    def latency(targets: list[tuple[str, str, int]], timeout: float = 2.0, ttl: float = 300.0) -> dict[tuple, float | None]:
+        """Latency of the targets, probing only those not cached in the last `ttl` seconds
+
+        :param targets: Tuples (protocol, host, port)
+        :param timeout: Seconds to wait for each target
+        :param ttl: Seconds a result is valid. Use 0 to probe everything again
+        :return: Mapping {target: latency in seconds, None if unreachable}
+        """
+        from htv.utils import FileLock  # Not at module level, the supervisor must not load the package (see spawn)
+        _now = time.time()
+        try:
+            with FileLock.of(LatencyProbe.__route__).shared(), open(LatencyProbe.__route__, 'r') as file:
+                _cache = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            _cache = dict()
+        _key = lambda t: f"{t[0]}:{t[1]}:{t[2]}"
+        _results = {
+            tuple(t): _cache[_key(t)][1] for t in targets if _now - _cache.get(_key(t), [0, None])[0] < ttl
+        }
+        _missing = [tuple(t) for t in targets if tuple(t) not in _results]
+        if len(_missing) > 0:
+            _probed = asyncio.run(LatencyProbe.measure(_missing, timeout))
+            _results.update(_probed)
+            _cache = {k: v for k, v in _cache.items() if _now - v[0] < ttl}  # Drop expired entries
+            _cache.update({_key(t): [_now, rtt] for t, rtt in _probed.items()})
+            _tmp = LatencyProbe.__route__.with_name(f".{LatencyProbe.__route__.name}.{os.getpid()}.tmp")
+            with FileLock.of(LatencyProbe.__route__).exclusive():
+                with open(_tmp, 'w') as file:
+                    json.dump(_cache, file)
+                os.replace(_tmp, LatencyProbe.__route__)
+        return _results
+
+    @staticmethod
+    def fastest(targets: list[tuple[str, str, int]], **kwargs) -> tuple | None:
+        """Reachable target with the lowest latency
+
+        :param kwargs: Arguments of :func:`LatencyProbe.latency`
+        :return: The fastest target, None if none is reachable
+        """
+        _results = {t: rtt for t, rtt in LatencyProbe.latency(targets, **kwargs).items() if rtt is not None}
+        return min(_results, key=_results.get) if len(_results) > 0 else None
+
+
+
+class RotatingLog:
+    """
+    Log file bounded in size.
+
+    When the file would exceed `max_bytes`, it is rotated (`log` -> `log.1` -> ... -> `log.N`) and the oldest
+    backup is dropped, so the disk used is never above `max_bytes * (backups + 1)`.
+    Logs are read without loading them entirely: :func:`RotatingLog.tail` reads backwards from the end,
+    and :func:`RotatingLog.follow` waits for new lines, even across rotations.
+
+    :ivar path: [`Path`] Log file
+    """
+    __max_bytes__ = 1 << 20  # 1 MiB
+    __backups__ = 1
+
+    def __init__(self, path: str | Path, max_bytes: int = None, backups: int = None):
+        """
+        :param path: Log file
+        :param max_bytes: Maximum size of the file. Defaults to 1 MiB
+        :param backups: Number of rotated files kept. Defaults to 1
+        """
+        self.path = Path(path)
+        self.max_bytes = RotatingLog.__max_bytes__ if max_bytes is None else int(max_bytes)
+        self.backups = RotatingLog.__backups__ if backups is None else int(backups)
+        self._file = None
+
+    def __enter__(self) -> 'RotatingLog':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, line: str) -> None:
+        """Append a line to the log, rotating it if needed"""
+        line = line.rstrip('\n')
+        _data = f"{line}\n".encode(errors='replace')
+        if self._file is None:
+            self._file = self._open(os.O_APPEND)
+            self._file.seek(0, os.SEEK_END)
+        if self._file.tell() > 0 and self._file.tell() + len(_data) > self.max_bytes:
+            self.rotate()
+        self._file.write(_data)
+        self._file.flush()
+
+    def rotate(self) -> None:
+        """Move the current file to the first backup, shifting the older ones"""
+        if self._file is not None:
+            self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if Path(f"{self.path}.{i}").exists():
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0 and self.path.exists():
+            os.replace(self.path, f"{self.path}.1")
+        self._file = self._open(os.O_TRUNC)
+
+    def _open(self, flags: int):
+        """Open the log for writing. Symbolic links are never followed, the log may be written as root"""
+        _fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | flags | getattr(os, 'O_NOFOLLOW', 0), 0o644)
+        return os.fdopen(_fd, 'wb')
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @staticmethod
+    def tail(path: str | Path, n: int = 20) -> list[str]:
+        """Last lines of a log, including its rotated files if needed
+
+        Files are read backwards by blocks, so the cost depends on `n`, not on the size of the log
+
+        :param path: Log file
+        :param n: Number of lines
+        :return: Up to `n` lines, oldest first
+        """
+        _lines = list()
+        for _path in [Path(path), *sorted(Path(path).parent.glob(f"{Path(path).name}.[0-9]*"),
+                                         key=lambda p: int(p.suffix[1:]) if p.suffix[1:].isdigit() else 0)]:
+            if len(_lines) >= n:
+                break
+            try:
+                with open(_path, 'rb') as file:
+                    _pos = file.seek(0, os.SEEK_END)
+                    _data = b''
+                    while _pos > 0 and _data.count(b'\n') <= n - len(_lines):
+                        _step = min(8192, _pos)
+                        _pos -= _step
+                        file.seek(_pos)
+                        _data = file.read(_step) + _data
+            except FileNotFoundError:
+                continue
+            _lines = _data.decode(errors='replace').splitlines()[-(n - len(_lines)):] + _lines
+        return _lines[-n:] if n > 0 else list()
+
+    @staticmethod
+    def follow(path: str | Path, stop: Callable[[], bool] = None, poll: float = 0.2) -> Iterator[str]:
+        """Yield the lines appended to a log, from now on
+
+        Rotations (the file is replaced or truncated) are detected and the new file is read from its beginning
+
+        :param path: Log file
+        :param stop: Called when there are no new lines. If it returns True, following ends
+        :param poll: Seconds between checks for new lines
+        """
+        path = Path(path)
+        file = open(path, 'rb') if path.exists() else None
+        if file is not None:
+            file.seek(0, os.SEEK_END)
+        _partial = b''
+        try:
+            while True:
+                _chunk = file.readline() if file is not None else b''
+                if _chunk:
+                    _partial += _chunk
+                    if _partial.endswith(b'\n'):
+                        yield _partial.decode(errors='replace').rstrip('\n')
+                        _partial = b''
+                    continue
+                try:  # No new lines. Rotated?
+                    _stat = os.stat(path)
+                    if file is None or _stat.st_ino != os.fstat(file.fileno()).st_ino or _stat.st_size < file.tell():
+                        if file is not None:
+                            file.close()
+                        file = open(path, 'rb')
+                        continue
+                except FileNotFoundError:
+                    pass
+                if stop is not None and stop():
+                    return
+                time.sleep(poll)
+        finally:
+            if file is not None:
+                file.close()
+
+
+class VpnSupervisor:
+    """
+    Supervisor owning an `openvpn` process.
+
+    The supervisor runs the client, reads its output asynchronously (copying it to a :class:`RotatingLog`) and tracks
+    the connection: it is established once 'Initialization Sequence Completed' is read, and lost when the client
+    exits or reports a restart. Lost connections are re-established with exponential backoff.
+    The current state is published to a status file (JSON), so any `htv` process can read it.
+    The status file and the log are kept in a directory private to the user (see :func:`VpnSupervisor.runtime_dir`),
+    since the supervisor runs as root.
+
+    States: `starting`, `connected`, `reconnecting`, `stopped`, `failed`
+
+    The supervisor usually runs detached from the CLI (see :func:`VpnSupervisor.spawn`),
+    and it is stopped with SIGTERM (see :func:`VpnSupervisor.terminate`).
+
+    :ivar config: [`Path`] OpenVPN configuration file
+    :ivar command: [list] Command running the client. The configuration file is appended to it
+    :ivar state: [str] Current state
+    :ivar retries: [int] Consecutive failed attempts to connect
+    :ivar connections: [int] Number of times the connection was established
+    """
+    __ready__ = 'Initialization Sequence Completed'
+    __disconnect__ = re.compile(r"SIGUSR1\[|SIGHUP\[|Inactivity timeout|Connection reset|TLS Error|AUTH_FAILED")
+    __command__ = ['openvpn', '--config']
+    __sudo__ = ['sudo']  # Runs the supervisor, since openvpn requires root privileges
+    __state_name__ = 'vpn.json'  # Within the runtime dir
+    __log_name__ = 'vpn.log'
+
+    def __init__(self, config: str | Path, command: list[str] = None, state_path: str | Path = None,
+                 log_path: str | Path = None, backoff: tuple[float, float] = (1.0, 60.0),
+                 connect_timeout: float = 30.0, max_retries: int = None):
+        """
+        :param config: OpenVPN configuration file
+        :param command: Command running the client. Defaults to `openvpn --config`
+        :param state_path: Status file. Defaults to `vpn.json` within the runtime dir
+        :param log_path: Log file. Defaults to `vpn.log` within the runtime dir
+        :param backoff: Initial and maximum delay (seconds) between reconnections
+        :param connect_timeout: Seconds to wait for the connection before restarting the client
+        :param max_retries: Consecutive failed attempts before giving up. If None, it never gives up
+        """
+        self.config = Path(config)
+        self.command = list(VpnSupervisor.__command__ if command is None else command)
+        self.state_path = VpnSupervisor.default_path(VpnSupervisor.__state_name__, state_path)
+        self.log_path = VpnSupervisor.default_path(VpnSupervisor.__log_name__, log_path)
+        self.backoff = backoff
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.state = 'stopped'
+        self.retries = 0
+        self.connections = 0
+        self.last_line = None
+        self._proc = None
+        self._stop = None
+        self._changed = None
+
+    @staticmethod
+    def runtime_dir() -> Path:
+        """Directory private to the current user, keeping the status file and the log
+
+        `$XDG_RUNTIME_DIR/htv`, or `htv-<uid>` within the temp dir. It is created with mode 0700, so other users
+        can neither read its files nor plant files (or links) in it
+
+        :return: The directory
+        :raise PermissionError: If it exists, but it is not a directory private to the user (e.g. created by other user)
+        """
+        _base = os.environ.get('XDG_RUNTIME_DIR')
+        _dir = Path(_base) / 'htv' if _base else Path(tempfile.gettempdir()) / f"htv-{os.getuid()}"
+        try:
+            os.mkdir(_dir, 0o700)
+        except FileExistsError:
+            pass
+        _stat = os.lstat(_dir)
+        if not stat.S_ISDIR(_stat.st_mode) or _stat.st_uid != os.getuid() or _stat.st_mode & 0o077:
+            raise PermissionError(f"Runtime directory '{_dir}' is not private to this user")
+        return _dir
+
+    @staticmethod
+    def default_path(name: str, path: str | Path = None) -> Path:
+        """Path of a file within the runtime dir, unless a path is provided"""
+        return VpnSupervisor.runtime_dir() / name if path in [None, ''] else Path(path)
+
+    async def run(self) -> int:
+        """Run the client until :func:`VpnSupervisor.stop` is called, reconnecting when needed
+
+        :return: 0 if stopped. 1 if it gave up (`max_retries`)
+        """
+        self._stop = asyncio.Event()
+        self._changed = asyncio.Condition()
+        delay = self.backoff[0]
+        while not self._stop.is_set():
+            await self._set_state('starting')
+            if await self._session():  # Connection was established, backoff starts again
+                delay = self.backoff[0]
+            if self._stop.is_set():
+                break
+            self.retries += 1
+            if self.max_retries is not None and self.retries > self.max_retries:
+                await self._set_state('failed')
+                return 1
+            await self._set_state('reconnecting')
+            try:
+                await asyncio.wait_for(self._stop.wait(), delay)
+            except TimeoutError:
+                pass
+            delay = min(delay * 2, self.backoff[1])
+        await self._set_state('stopped')
+        return 0
+
+    def stop(self) -> None:
+        """Stop the client and the supervisor. Safe to be called from signal handlers"""
+        if self._stop is not None:
+            self._stop.set()
+        if self._proc is not None and self._proc.returncode is None:
+            try:
+                self._proc.terminate()
+            except ProcessLookupError:
+                pass
+
+    async def wait_for(self, *states: str, timeout: float = None) -> str:
+        """Wait until the supervisor reaches any of the states
+
+        :raise TimeoutError: If none of the states is reached in time
+        :return: The state reached
+        """
+        while self._changed is None:  # Not running yet
+            await asyncio.sleep(0)
+        async with self._changed:
+            await asyncio.wait_for(self._changed.wait_for(lambda: self.state in states), timeout)
+        return self.state
+
+    async def _session(self) -> bool:
+        """Run the client once, until it exits or it is stopped
+
+        :return: True if the connection was established
+        """
+        loop = asyncio.get_running_loop()
+        self._proc = await asyncio.create_subprocess_exec(
+            *self.command, str(self.config),
+            stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+        )
+        await self._set_state('starting')
+        connected, established = False, False
+        deadline = loop.time() + self.connect_timeout
+        with RotatingLog(self.log_path) as log:
+            while True:
+                try:
+                    line = await asyncio.wait_for(
+                        self._proc.stdout.readline(), None if connected else max(0.0, deadline - loop.time())
+                    )
+                except TimeoutError:
+                    log.write(f"[htv] Connection not established after {self.connect_timeout}s. Restarting")
+                    break
+                if not line:  # Client exited
+                    break
+                self.last_line = line.decode(errors='replace').rstrip()
+                log.write(self.last_line)
+                if self.__ready__ in self.last_line:
+                    connected, established = True, True
+                    self.retries = 0
+                    self.connections += 1
+                    await self._set_state('connected')
+                elif connected and self.__disconnect__.search(self.last_line):  # Client restarts by itself
+                    connected = False
+                    deadline = loop.time() + self.connect_timeout
+                    await self._set_state('reconnecting')
+        await self._terminate()
+        return established
+
+    async def _terminate(self) -> None:
+        """Terminate the client, if it is still running. It is killed if it does not exit in time"""
+        if self._proc.returncode is None:
+            try:
+                self._proc.terminate()
+                await asyncio.wait_for(self._proc.wait(), 5)
+            except ProcessLookupError:
+                pass
+            except TimeoutError:
+                self._proc.kill()
+        await self._proc.wait()
+
+    async def _set_state(self, state: str) -> None:
+        self.state = state
+        self._save()
+        async with self._changed:
+            self._changed.notify_all()
+
+    def _save(self) -> None:
+        """Publish the current state to the status file"""
+        _data = dict(
+            state=self.state,
+            config=str(self.config),
+            pid=os.getpid(),
+            client_pid=None if self._proc is None or self._proc.returncode is not None else self._proc.pid,
+            since=datetime.now().astimezone().isoformat(timespec='seconds'),
+            retries=self.retries,
+            connections=self.connections,
+            last_line=self.last_line,
+            log=str(self.log_path),
+        )
+        _tmp = self.state_path.with_name(f".{self.state_path.name}.{os.getpid()}.tmp")
+        try:  # Left by a previous run. If it is a link, the link is removed
+            os.unlink(_tmp)
+        except FileNotFoundError:
+            pass
+        _flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_NOFOLLOW', 0)  # Runs as root: never follow links
+        with os.fdopen(os.open(_tmp, _flags, 0o644), 'w') as file:
+            json.dump(_data, file)
+        os.replace(_tmp, self.state_path)
+
+    @staticmethod
+    def read_state(state_path: str | Path = None) -> dict | None:
+        """Read the status file
+
+        If the supervisor is not running anymore, the state is `stopped`
+
+        :param state_path: Status file. Defaults to `vpn.json` within the runtime dir
+        :return: The published state. None if no supervisor was started
+        """
+        try:
+            _fd = os.open(VpnSupervisor.default_path(VpnSupervisor.__state_name__, state_path),
+                          os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+            with os.fdopen(_fd, 'r') as file:
+                _data = json.load(file)
+        except (OSError, json.JSONDecodeError):  # Missing, or not a regular file (e.g. a link)
+            return None
+        if _data['state'] != 'stopped' and not VpnSupervisor.is_alive(_data['pid']):
+            _data.update(state='stopped', client_pid=None)
+        return _data
+
+    @staticmethod
+    def is_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:  # Running, owned by other user
+            return True
+        try:  # Reap it, if it was started (and it exited) by this process
+            return os.waitpid(pid, os.WNOHANG) == (0, 0)
+        except ChildProcessError:
+            return True
+
+    @staticmethod
+    def is_supervisor(pid: int) -> bool:
+        """Whether a process is a supervisor: it runs this module, and it is owned by the user or by root (sudo)
+
+        :param pid: Process ID, e.g. read from the status file
+        """
+        try:
+            pid = int(pid)
+            if Path('/proc').is_dir():
+                _uid = os.stat(f"/proc/{pid}").st_uid
+                with open(f"/proc/{pid}/cmdline", 'rb') as file:
+                    _args = file.read().decode(errors='replace').split('\0')
+            else:
+                _proc = subprocess.run(['ps', '-o', 'uid=', '-o', 'args=', '-p', str(pid)], capture_output=True, text=True)
+                _uid, _cmd = _proc.stdout.strip().split(None, 1)
+                _uid, _args = int(_uid), _cmd.split()
+        except (OSError, ValueError, TypeError):  # Not running, or not readable
+            return False
+        return _uid in [0, os.getuid()] and str(Path(__file__).resolve()) in _args
+
+    @staticmethod
+    def wait(*states: str, timeout: float = 30.0, state_path: str | Path = None) -> dict | None:
+        """Wait (blocking) until the published state is any of the provided ones
+
+        :param states: Expected states. `stopped` is always expected
+        :param timeout: Seconds to wait
+        :param state_path: Status file
+        :return: The last state read, even if the timeout expired
+        """
+        _end = time.monotonic() + timeout
+        _state = VpnSupervisor.read_state(state_path)
+        while (_state is None or _state['state'] not in [*states, 'stopped']) and time.monotonic() < _end:
+            time.sleep(0.05)
+            _state = VpnSupervisor.read_state(state_path)
+        return _state
+
+    @staticmethod
+    def spawn(config: str | Path, command: list[str] = None, state_path: str | Path = None,
+              log_path: str | Path = None, sudo: bool = None, **kwargs) -> int:
+        """Run a supervisor in the background, detached from this process
+
+        The supervisor needs root privileges to run `openvpn`, so it is started through `sudo` from this process.
+        If needed, the password is prompted in this terminal. Then the supervisor detaches itself: it runs in
+        its own session, and it outlives the terminal.
+        The supervisor runs this module as a script, so the configuration of htv is never loaded (nor saved) as root.
+
+        :param config: OpenVPN configuration file
+        :param command: Command running the client
+        :param state_path: Status file
+        :param log_path: Log file
+        :param sudo: If True, the supervisor is started through `sudo`. Defaults to True, unless running as root
+        :param kwargs: Additional options (`connect_timeout`, `max_retries`)
+        :return: PID of the supervisor
+        :raise OSError: If the supervisor could not be started (e.g. wrong password)
+        """
+        if sudo is None:
+            sudo = hasattr(os, 'geteuid') and os.geteuid() != 0
+        _args = [  # Resolved by the user: as root, the runtime dir would be root's
+            '--detach',
+            '--state', str(VpnSupervisor.default_path(VpnSupervisor.__state_name__, state_path)),
+            '--log', str(VpnSupervisor.default_path(VpnSupervisor.__log_name__, log_path)),
+        ]
+        for k, v in kwargs.items():
+            if v is not None:
+                _args.extend([f"--{k.replace('_', '-')}", str(v)])
+        _args.extend([str(config), '--', *(VpnSupervisor.__command__ if command is None else command)])
+        _proc = subprocess.run(  # STDIN and STDERR are the terminal, sudo may prompt for the password
+            [*(VpnSupervisor.__sudo__ if sudo else []), sys.executable, str(Path(__file__).resolve()), *_args],
+            stdout=subprocess.PIPE, text=True
+        )
+        if _proc.returncode != 0 or not _proc.stdout.strip().isdigit():
+            raise OSError(f"VPN supervisor not started (exit code {_proc.returncode})")
+        return int(_proc.stdout.strip())
+
+    @staticmethod
+    def detach() -> int | None:
+        """Detach this process from the terminal (double fork)
+
+        The launcher waits until the supervisor is detached, and returns its PID. The supervisor gets None
+
+        :return: PID of the supervisor, in the launcher. None in the supervisor
+        """
+        _read, _write = os.pipe()
+        _child = os.fork()
+        if _child > 0:  # Launcher
+            os.close(_write)
+            with os.fdopen(_read) as pipe:
+                _pid = pipe.read()
+            os.waitpid(_child, 0)
+            return int(_pid)
+        os.close(_read)
+        os.setsid()  # New session, without controlling terminal
+        if os.fork() > 0:
+            os._exit(0)
+        os.write(_write, str(os.getpid()).encode())
+        os.close(_write)
+        _null = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(_null, fd)
+        os.close(_null)
+        return None
+
+    @staticmethod
+    def terminate(state_path: str | Path = None, timeout: float = 10.0) -> bool:
+        """Stop the supervisor running in the background (and its client)
+
+        The supervisor runs as root if it was started through `sudo`, so it may be signaled through `sudo` too.
+        The process is signaled only if it is a supervisor (:func:`VpnSupervisor.is_supervisor`)
+
+        :return: True if a supervisor was running
+        """
+        _state = VpnSupervisor.read_state(state_path)
+        if _state is None or _state['state'] == 'stopped':
+            return False
+        elif not VpnSupervisor.is_supervisor(_state['pid']):
+            print(f"[!] Process {_state['pid']} is not a VPN supervisor. Not stopped")
+            return False
+        try:
+            os.kill(_state['pid'], signal.SIGTERM)
+        except ProcessLookupError:
+            return False
+        except PermissionError:  # Owned by root
+            if subprocess.run([*VpnSupervisor.__sudo__, 'kill', '-TERM', str(_state['pid'])]).returncode != 0:
+                return False
+        VpnSupervisor.wait('stopped', timeout=timeout, state_path=state_path)
+        return True
+
+    @staticmethod
+    def main(argv: list[str] = None) -> int:
+        """Entry point of the supervisor process (see :func:`VpnSupervisor.spawn`)"""
+        parser = argparse.ArgumentParser(description='Run and supervise an OpenVPN client')
+        parser.add_argument('config', help='OpenVPN configuration file')
+        parser.add_argument('--state', default=None, help='Status file')
+        parser.add_argument('--log', default=None, help='Log file')
+        parser.add_argument('--connect-timeout', type=float, default=30.0)
+        parser.add_argument('--max-retries', type=int, default=None)
+        parser.add_argument('--detach', action='store_true', help='Run in the background, print its PID')
+        parser.add_argument('command', nargs=argparse.REMAINDER, help='Client command (after --)')
+        args = parser.parse_args(argv)
+        if args.detach:
+            _pid = VpnSupervisor.detach()
+            if _pid is not None:  # Launcher
+                print(_pid)
+                return 0
+        _command = [c for c in args.command if c != '--'] or None
+        supervisor = VpnSupervisor(
+            args.config, command=_command, state_path=args.state, log_path=args.log,
+            connect_timeout=args.connect_timeout, max_retries=args.max_retries
+        )
+
+        async def _run() -> int:
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+                loop.add_signal_handler(sig, supervisor.stop)
+            return await supervisor.run()
+
+        return asyncio.run(_run())
+
+
+if __name__ == '__main__':  # Supervisor process, see VpnSupervisor.spawn
+    sys.exit(VpnSupervisor.main())
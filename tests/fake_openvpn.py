@@ -0,0 +1,34 @@
+"""Stand-in for `openvpn`, used to test the VPN supervisor
+
+Usage: fake_openvpn.py --config FILE
+The behaviour is selected with the environment variable FAKE_OPENVPN:
+  ok      Connects, then runs until terminated (default)
+  drop    Connects, then exits shortly after (connection lost)
+  restart Connects, then reports a restart and connects again
+  fail    Exits without connecting
+  hang    Never connects
+"""
+import os
+import sys
+import time
+
+mode = os.environ.get('FAKE_OPENVPN', 'ok')
+print(f"OpenVPN 2.6.0 [fake] config={sys.argv[-1]}", flush=True)
+print("TCP/UDP: Preserving recently used remote address", flush=True)
+if mode == 'fail':
+    print("Exiting due to fatal error", flush=True)
+    sys.exit(1)
+if mode == 'hang':
+    time.sleep(60)
+    sys.exit(0)
+print("Initialization Sequence Completed", flush=True)
+if mode == 'drop':
+    time.sleep(0.2)
+    sys.exit(1)
+if mode == 'restart':
+    time.sleep(0.2)
+    print("SIGUSR1[soft,ping-restart] received, process restarting", flush=True)
+    time.sleep(0.2)
+    print("Initialization Sequence Completed", flush=True)
+while True:
+    time.sleep(1)
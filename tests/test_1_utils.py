@@ -1,10 +1,23 @@
-from htv.utils import FsTools, Templater, Cache
+from htv.utils import FsTools, Templater, Cache, Batch, Browser, ClipboardWatcher, FileLock, JsonStream, Queue, \
+    add_extensions, open_browser_tab
+from htv.constants import CONF_PATH
 from pathlib import Path
 from htv import CONF
 
 
+import htv
 import htv.constants
+import json
+import multiprocessing
+import errno
+import fcntl
+import io
+import os
+import pyperclip
 import pytest
+import threading
+import time
+import yaml
 
 class TestConf:
     test_values = dict(k1=1, k2=2, k3=3)
@@ -33,6 +46,72 @@ class TestConf:
             pass
         assert len(CONF) == self.default_len
 
+class TestConfSnapshot:
+
+    def test_snapshot(self):
+        snap = CONF.snapshot()
+        assert snap is CONF.snapshot() and snap['VAULT_DIR'] == CONF['VAULT_DIR']
+        with pytest.raises(TypeError):
+            snap['K1'] = 1
+        CONF.update_values(k1=1)
+        assert 'K1' not in snap and CONF.snapshot()['K1'] == 1  # Snapshots never change
+        CONF.remove_values('k1')
+
+    def test_snapshot_direct_changes(self, monkeypatch):
+        monkeypatch.setitem(CONF, 'K1', 1)
+        assert CONF.snapshot()['K1'] == 1
+        monkeypatch.undo()
+        assert 'K1' not in CONF.snapshot()
+
+    def test_subscribe(self):
+        changes = list()
+        listener = lambda c, snap: changes.append((c, snap.get('K1')))
+        CONF.subscribe(listener, 'k1')
+        CONF.update_values(k1=1, _k2=2)
+        CONF.update_values(k1=1, _k2=3)  # K1 did not change
+        CONF.remove_values('k1', '_k2')
+        CONF.unsubscribe(listener)
+        CONF.update_values(k1=1)
+        CONF.remove_values('k1')
+        assert changes == [({'K1': (None, 1)}, 1), ({'K1': (1, None)}, None)]
+
+    def test_add_extensions(self, monkeypatch):
+        monkeypatch.setattr(CONF, '_default', CONF._default)
+        changes = list()
+        listener = lambda c, snap: changes.append(c)
+        CONF.subscribe(listener, 'extensions')
+        _old = dict(CONF['EXTENSIONS'])
+        add_extensions(**{'.x': 'x.Foo'})
+        CONF.unsubscribe(listener)
+        with open(CONF_PATH) as file:
+            assert yaml.safe_load(file)['EXTENSIONS'] == {**_old, '.x': 'x.Foo'}
+        assert changes == [{'EXTENSIONS': (_old, {**_old, '.x': 'x.Foo'})}]
+        CONF.update_values(EXTENSIONS=_old)
+
+    def test_save_merge(self):
+        _saved = CONF_PATH.read_text()
+        with open(CONF_PATH, 'a') as file:  # Saved by another process
+            yaml.dump(dict(K_OTHER=1), file)
+        CONF.update_values(k1=1)
+        with open(CONF_PATH) as file:
+            _data = yaml.safe_load(file)
+        CONF.remove_values('k1')
+        CONF_PATH.write_text(_saved)
+        assert _data['K_OTHER'] == 1 and _data['K1'] == 1 and 'K_OTHER' not in CONF
+        assert not list(CONF_PATH.parent.glob(f".{CONF_PATH.name}.*.tmp"))
+
+    def test_threads(self):
+        keys = [f"k{i}" for i in range(20)]
+        threads = [threading.Thread(target=CONF.update_values, kwargs={k: i}) for i, k in enumerate(keys)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert all(CONF.snapshot()[k.upper()] == i for i, k in enumerate(keys))
+        CONF.remove_values(*keys)
+        assert not any(k.upper() in CONF.snapshot() for k in keys)
+
+
 class TestCache:
     test_values = ['item1', 'item2', 'item3']
 
@@ -55,6 +134,182 @@ class TestCache:
     def test_get_all(self):
         assert Cache.get() == [Path(i) for i in self.test_values]
 
+class TestFileLock:
+
+    @staticmethod
+    def hammer(target, n: int = 8) -> list[int]:
+        """Run target in n processes at once, return their exit codes"""
+        ctx = multiprocessing.get_context('fork')
+        procs = [ctx.Process(target=target, args=(i,)) for i in range(n)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join(timeout=60)
+        return [p.exitcode for p in procs]
+
+    def test_exclusive(self, tmp_path):
+        counter = tmp_path / 'counter'
+        counter.write_text('0')
+
+        def increment(_):
+            for _ in range(20):  # Read-modify-write, lost updates without the lock
+                with FileLock(tmp_path / 'counter.lock').exclusive():
+                    value = int(counter.read_text())
+                    time.sleep(0.001)
+                    counter.write_text(str(value + 1))
+
+        assert self.hammer(increment) == [0] * 8
+        assert counter.read_text() == '160'
+
+    def test_shared(self, tmp_path):
+        lock = FileLock(tmp_path / 'lock')
+        with lock.shared():  # Other readers are not blocked, writers are
+            assert self.hammer(lambda _: lock.shared().__enter__(), n=2) == [0, 0]
+            fd = os.open(tmp_path / 'lock', os.O_RDWR)
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.close(fd)
+
+    def test_reentrant(self, tmp_path):
+        lock = FileLock(tmp_path / 'lock')
+        with lock.shared(), lock.exclusive(), lock.shared():  # Nested and upgraded
+            assert FileLock.__held__[str(tmp_path / 'lock')][1:] == [True, 3]
+        assert str(tmp_path / 'lock') not in FileLock.__held__
+
+    def test_queue(self, tmp_path, monkeypatch):
+        monkeypatch.setitem(CONF, 'VAULT_DIR', tmp_path)
+        assert self.hammer(lambda i: [Queue.put(dict(key=f"{i}/{j}")) for j in range(10)]) == [0] * 8
+        assert len(Queue.get()) == 80
+
+
+class TestBatch:
+    fixtures = sorted((Path(__file__).parent / 'fixtures').glob('0[1-4]*.json'))
+
+    @pytest.fixture(name='items')
+    def load_items(self):
+        _items = [json.loads(_.read_text()) for _ in self.fixtures]
+        return [i for _ in _items for i in (_ if isinstance(_, list) else [_])]  # As batchAdd() in toolkit.js
+
+    def test_roundtrip(self, items):
+        payload = Batch.encode(items)
+        assert Batch.is_batch(payload) and all(len(_) <= Batch.__width__ for _ in payload.splitlines())
+        assert len(payload) < len(''.join(json.dumps(_) for _ in items))
+        assert list(Batch.decode(payload)) == items
+        assert list(Batch.decode(' '.join(payload.split()))) == items  # Lines joined when pasted
+
+    def test_invalid(self, items):
+        with pytest.raises(ValueError):  # Header and encoding are checked before iterating
+            Batch.decode('htv:gz:1 !!')
+        payload = Batch.encode(items)
+        for invalid in [payload[:len(payload) // 2], payload.replace(f"htv:gz:{len(items)}", 'htv:gz:99'), 'htv:gz:1 !!']:
+            with pytest.raises(ValueError):
+                list(Batch.decode(invalid))
+
+    def test_read(self, items, monkeypatch):
+        lines = iter([*Batch.encode(items).splitlines(), 'unread'])
+        monkeypatch.setattr('builtins.input', lambda *_: next(lines))
+        res = htv.DataSources.load(Batch.read())
+        assert not isinstance(res, list)  # Streamed, decoded while iterating
+        res = list(res)
+        assert len(res) == len(items) and all(isinstance(_, htv.HtvResource) for _ in res)
+        assert next(lines) == 'unread'
+
+
+class TestJsonStream:
+    items = [{'a': [1, {'b': ']'}]}, 'c,]', -1.5e3, 123456, None, True]
+
+    @pytest.mark.parametrize('chunk_size', [1, 3, 64])
+    def test_items(self, chunk_size):
+        data = json.dumps(self.items, indent=2)
+        assert JsonStream.is_array(data) and JsonStream.is_array(io.StringIO(data))
+        res = JsonStream.items(io.StringIO(data), chunk_size=chunk_size)
+        assert next(res) == self.items[0]  # Yielded before the array is read
+        assert [self.items[0], *res] == self.items
+        assert list(JsonStream.items('{"a": 1}', chunk_size=chunk_size)) == [{'a': 1}]
+        assert list(JsonStream.items(' [ ] ', chunk_size=chunk_size)) == []
+
+    def test_path(self):
+        path = Path(__file__).parent / 'fixtures/04_skill_path_info.json'
+        assert list(JsonStream.items(path, chunk_size=100)) == json.loads(path.read_text())
+
+    @pytest.mark.parametrize('data', ['[1,]', '[1 2]', '[{"a": 1}', '[1] 2', '[', '{'])
+    def test_invalid(self, data):
+        with pytest.raises(ValueError):
+            list(JsonStream.items(data, chunk_size=2))
+
+
+class TestClipboardWatcher:
+
+    @pytest.fixture(name='clipboard')
+    def fake_clipboard(self):
+        """Fake backend, its contents are replaced by the test"""
+        _clipboard = ['old']
+        ClipboardWatcher.backend = lambda: _clipboard[0]
+        yield _clipboard
+        ClipboardWatcher.backend = None
+
+    def test_poll(self, clipboard):
+        watcher = ClipboardWatcher(interval=(0.1, 0.8), accept=lambda text: text.startswith('{'))
+        assert watcher.poll() is None  # Not accepted
+        assert [watcher.poll() for _ in range(4)] == [None] * 4 and watcher.interval == 0.8  # Idle
+        clipboard[0] = '{}'
+        assert watcher.poll() == '{}' and watcher.interval == 0.1
+        clipboard[0] = 'old'
+        assert watcher.poll() is None  # Seen before
+
+    def test_watch(self, clipboard):
+        watcher = ClipboardWatcher(interval=(0.01, 0.04))
+        seen = list()
+
+        def copy():
+            for text in ['a', 'a', 'b', 'a', 'c']:
+                time.sleep(0.05)
+                clipboard[0] = text
+
+        threading.Thread(target=copy).start()
+        for text in watcher.watch(stop=lambda: 'c' in seen):
+            seen.append(text)
+        assert [_ for _ in seen if _ is not None] == ['a', 'b', 'c']  # Old contents and duplicates ignored
+        assert None in seen  # Idle between copies
+
+    def test_unavailable(self, clipboard, monkeypatch):
+        def headless():
+            raise pyperclip.PyperclipException('No clipboard')
+
+        monkeypatch.setattr(ClipboardWatcher, 'backend', headless)
+        watcher = ClipboardWatcher()
+        assert list(watcher.watch()) == [] and not watcher.available
+
+
+class TestBrowser:
+    urls = [f"https://example.com/{i}" for i in range(20)]
+
+    @pytest.fixture(name='opened')
+    def stub_opener(self):
+        _opened = list()
+        Browser.opener = _opened.append
+        yield _opened
+        Browser.opener = None
+
+    def test_open_non_blocking(self, opened):
+        start = time.perf_counter()
+        for url in self.urls:
+            open_browser_tab(url, delay=3)
+        assert time.perf_counter() - start < 0.5
+        Browser.flush()
+        assert opened == [self.urls]  # Single batch
+
+    def test_open_batched_in_background(self, opened):
+        Browser.open(*self.urls[:2])
+        Browser.open(self.urls[2])
+        time.sleep(Browser.__batch_delay__ * 10)
+        assert opened == [self.urls[:3]]
+
+    def test_flush_empty(self, opened):
+        Browser.flush()
+        assert opened == []
+
+
 class TestFsTools:
     test_files = [
             (Path('dummy1'), 'Lorem ipsum'),
@@ -80,6 +335,50 @@ class TestFsTools:
         assert path.exists()
         path.unlink()
 
+    def test_link(self, tmp_path, monkeypatch):
+        assert FsTools.link(tmp_path / 'target', tmp_path / 'links/target').is_symlink()
+        (tmp_path / 'links/dir').mkdir()
+        with pytest.raises(FileExistsError):  # Not a link, not replaced
+            FsTools.link(tmp_path / 'target', tmp_path / 'links/dir')
+
+        def unsupported(*args, **kwargs):
+            raise OSError(errno.EPERM, 'Operation not permitted')
+
+        monkeypatch.setattr(os, 'symlink', unsupported)
+        assert FsTools.link(tmp_path / 'target', tmp_path / 'links/other').read_text() == '[target](../target/README.md)\n'
+
+    def test_dump_files(self, tmp_path):
+        files = ['empty/dir', ('a/b/file1', 'Lorem ipsum'), ('a/file2', b'Lorem ipsum')]
+        written = FsTools.dump_files(files, root_dir=tmp_path, fsync=True)
+        assert sorted(written) == [tmp_path / 'a' / 'b' / 'file1', tmp_path / 'a' / 'file2']
+        assert (tmp_path / 'empty' / 'dir').is_dir()
+        assert (tmp_path / 'a' / 'b' / 'file1').read_text() == 'Lorem ipsum'
+        with pytest.raises(FileExistsError):  # Nothing is written if any file exists
+            FsTools.dump_files([('new', 'Lorem ipsum'), ('a/file2', '')], root_dir=tmp_path)
+        assert not (tmp_path / 'new').exists()
+
+    def test_dump_files_fsync(self, tmp_path, monkeypatch):
+        events = list()
+        monkeypatch.setattr(os, 'fsync', lambda fd: events.append(os.path.realpath(f"/proc/self/fd/{fd}")))
+        monkeypatch.setattr(os, 'replace', lambda src, dst, _replace=os.replace: events.append('replace') or _replace(src, dst))
+        monkeypatch.delattr(os, 'sync')  # Not a system-wide sync
+        FsTools.dump_files([('a/file1', 'Lorem'), ('a/file2', 'ipsum'), ('b/file3', '')], root_dir=tmp_path, fsync=True)
+        # Temp files are synced before any rename, then each directory once
+        assert sorted(events[:3]) == sorted(str(tmp_path / f"{_}.{os.getpid()}.tmp") for _ in ['a/.file1', 'a/.file2', 'b/.file3'])
+        assert events[3:6] == ['replace'] * 3 and sorted(events[6:]) == [str(tmp_path / 'a'), str(tmp_path / 'b')]
+
+    def test_dump_files_atomic(self, tmp_path):
+        with pytest.raises(TypeError):
+            FsTools.dump_files([('file1', 'Lorem ipsum'), ('file2', 1)], root_dir=tmp_path)
+        assert list(tmp_path.iterdir()) == []  # Neither files nor temp files
+
+    def test_stream_template(self, tmp_path):
+        rendered = FsTools.render_template('banner.txt')
+        assert FsTools.render_template('banner.txt', tmp_path / 'out' / 'banner.txt') is None
+        assert (tmp_path / 'out' / 'banner.txt').read_text() == rendered
+        FsTools.dump_files([('banner.txt', 't:banner.txt')], root_dir=tmp_path)
+        assert (tmp_path / 'banner.txt').read_text() == rendered
+
     # def test_js_to_clipboard(self):
     #     with pytest.raises(OSError):
     #         FsTools.js_to_clipboard()
@@ -145,6 +444,21 @@ class TestTemplater:
         """
         assert description.count('\n') > Templater.clean_description(description).count('\n')
 
+    def test_neighbors(self):
+        assert Templater.neighbors([1, 2, 3]) == [(None, 2), (1, 3), (2, None)]
+        assert Templater.neighbors([]) == []
+
+    def test_pagination(self):
+        from htv.resources import HtvModule
+        mod = HtvModule()
+        mod.sections = [dict(__type__='Document', title=f"Section {i}") for i in range(3)]
+        nav = Templater.neighbors(mod.sections)
+        _md = Templater.pagination(mod, mod.sections[1], nav[1])
+        assert 'Previous: Section 0' in _md and 'Next: Section 2' in _md
+        # Without a precomputed table the same links are generated
+        assert Templater.pagination(mod, mod.sections[1]) == _md
+        assert 'Previous' not in Templater.pagination(mod, mod.sections[0], nav[0])
+
     def test_generate_index(self):
         p = '/home/redwing/Documents/01-me/vaults/hack-vault'
         # print(Templater.generate_index(p))
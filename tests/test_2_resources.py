@@ -1,8 +1,13 @@
 from pathlib import Path
 
 import pytest
+import shutil
+import json
+import io
+import sys
 import htv
 import os
+import yaml
 
 
 TEST_VAULT_DIR = '$HOME/Documents/01-me/vaults/test-htv'
@@ -25,12 +30,101 @@ class TestDataSources:
     def test_load(self, path):
         with open(path, 'r') as file:
             res = htv.DataSources.load(file.read())
-        if isinstance(res, list):
+        if not isinstance(res, htv.HtvResource):  # Arrays are loaded lazily
             for _ in res:
                 assert isinstance(_, htv.HtvResource)
         else:
             assert isinstance(res, htv.HtvResource)
 
+class TestCustomResource:
+
+    def test_cached_path(self):
+        res = htv.CustomResource(category='personal', title='My Notes')
+        assert res.path is res.path  # Memoized
+        assert res.name == 'my-notes'
+
+    def test_cached_path_invalidation(self):
+        res = htv.CustomResource(category='personal', title='My Notes')
+        _path = res.path
+        res.metadata.title = 'Other Notes'
+        assert res.name == 'other-notes' and res.path == _path.parent / 'other-notes'
+        res.__resource_dir__ = 'personal/notes'
+        assert res.path == htv.CONF['VAULT_DIR'] / 'personal/notes/other-notes'
+        res.invalidate()
+        assert res.path == htv.CONF['VAULT_DIR'] / 'personal/notes/other-notes'
+
+    def test_cached_path_not_serialized(self):
+        res = htv.CustomResource(category='personal', title='My Notes')
+        _ = res.path
+        assert '__cache__' not in res.to_dict()
+
+    def test_lazy_sections(self):
+        res = htv.DataSources.load(dict(
+            __type__='htb.AcademySkillPath', metadata=dict(title='Lazy Path'),
+            sections=[dict(__type__='htb.AcademyModule', metadata=dict(title='Lazy Module'),
+                           sections=[dict(__type__='document', title='Intro')])]
+        ))
+        assert res.name == 'lazy-path' and res._sections == []  # Metadata only
+        assert [_.name for _ in res.sections] == ['lazy-module']
+        assert res.sections[0]._sections == [] and res.sections[0].sections[0].title == 'Intro'
+        assert res.to_dict()['sections'][0]['sections'] == [dict(__type__='document', title='Intro')]
+
+    def test_to_dict_plan(self):
+        with open(Path(__file__).parent / 'fixtures/09_track_info.json', 'r') as file:
+            data = json.load(file)
+        res, other = htv.DataSources.load([json.loads(json.dumps(data)), data])
+        _dict = res.to_dict()  # Sections are loaded (and their names cached) while serializing
+        assert _dict['metadata']['title'] == data['metadata']['title'] and len(_dict['sections']) == 9
+        assert other.to_dict() == _dict and type(res) in {_[0] for _ in htv.CustomResource.__plans__}
+
+    def test_dump_yaml(self):
+        """libyaml dumper (FsTools.dump_yaml) writes the same info.yml files as yaml.dump"""
+        with open(Path(__file__).parent / 'fixtures/04_skill_path_info.json', 'r') as file:
+            data = json.load(file)[0]
+        resources = htv.DataSources.load([json.loads(json.dumps(data)) for _ in range(20)])
+        assert [htv.FsTools.dump_yaml(_.to_dict()) for _ in resources] == [yaml.dump(_.to_dict()) for _ in resources]
+
+    def test_lazy_tasks(self):
+        res = htv.DataSources.load(dict(__type__='htb.LabMachine', tasks=[dict(text='Root')]))
+        res.add_task('User')  # Deferred tasks are loaded before being extended
+        assert [_.text for _ in res.tasks] == ['Root', 'User']
+
+
+class TestSchema:
+
+    def test_coerce(self):
+        res = htv.Schema.validate(dict(
+            __type__='htb.AcademyModule', _tier=None, tier=0, metadata=dict(title=101, tags=None),
+            sections=[dict(__type__='document', title='Intro')]
+        ))
+        assert res['tier'] == '0' and res['metadata'] == dict(title='101', tags=[])
+        assert htv.DataSources.load(res).tier == '0'
+        res = htv.Schema.validate(dict(__type__='htb.LabMachine', tasks=[dict(points='10'), dict(points='Show Answer')]))
+        assert [_['points'] for _ in res['tasks']] == [10, None]
+
+    def test_errors(self):
+        with open(Path(__file__).parent / 'fixtures/09_track_info.json', 'r') as file:
+            data = json.load(file)
+        data['metadata']['tags'] = 'STAFF PICK'
+        data['sections'][1]['metadata'].pop('title')
+        data['sections'][2]['tasks'] = [dict(text='Flag', number=1)]
+        data['sections'][3]['__type__'] = 'htb.Unknown'
+        with pytest.raises(htv.SchemaError) as e:
+            htv.DataSources.load(data)
+        assert e.value.errors == [
+            "metadata.tags: expected list, got str ('STAFF PICK')",
+            'sections[1].metadata.title: missing field',
+            'sections[2].tasks[0].number: unexpected field',
+            "sections[3].__type__: unknown resource type 'htb.Unknown'",
+        ]
+
+    def test_validate_all(self):
+        items = [dict(__type__='htb.AcademyModule', tier='V'), dict(__type__='htb.LabMachine', metadata=dict())]
+        with pytest.raises(htv.SchemaError) as e:  # Reported together, before loading any resource
+            htv.DataSources.load(items)
+        assert [_.split(':')[0] for _ in e.value.errors] == ['[0].tier', '[1].metadata.title']
+
+
 class TestVault:
     # vault = None
     @pytest.fixture(scope='class', name='vault')
@@ -71,6 +165,124 @@ class TestVault:
             for _ in res:
                 assert isinstance(_, htv.HtvResource) and _.path.exists() and _.categories[0] == 'htb'
 
+    def test_path_section_links(self, vault):
+        _links = sorted((vault.path / 'htb/academy/skill-path/cracking-into-hack-the-box/sections').iterdir())
+        assert [_.name for _ in _links] == ['01_web-requests', '02_javascript-deobfuscation', '03_getting-started']
+        assert all(_.is_symlink() and _.resolve().parent == vault.path / 'htb/academy/module' for _ in _links)
+
+    def test_dedupe(self, vault):
+        _copy = vault.path / 'htb/academy/skill-path/cracking-into-hack-the-box/web-requests'
+        shutil.copytree(vault.path / 'htb/academy/module/web-requests', _copy)
+        assert vault.dedupe() == 1 and _copy.is_symlink()
+        assert vault.dedupe() == 0
+
+    def test_defer_missing(self, vault):
+        htv.Queue.clear()
+        res = htv.DataSources.load(Path(__file__).parent / 'fixtures/09_track_info.json')
+        res.makedirs(defer_missing=True)
+        assert len(htv.Queue.get()) == len(res.sections)
+        assert htv.Queue.get()[0]['paths'] == ['htb/lab/track/ics-and-scada-exploitation']
+
+    def test_drain_queue_failed(self, vault, monkeypatch):
+        with open(Path(__file__).parent / 'fixtures/09_track_info.json', 'r') as file:
+            _section = json.load(file)['sections'][0]
+        responses = iter([json.dumps(_section), 'done'])
+        monkeypatch.setattr('builtins.input', lambda _: next(responses))
+
+        def fail(*args, **kwargs):
+            raise OSError('No space left on device')
+
+        monkeypatch.setattr(vault, 'add_resource', fail)
+        _queued = len(htv.Queue.get())
+        assert vault.drain_queue() == 0 and len(htv.Queue.get()) == _queued  # Kept in the queue
+
+    def test_drain_queue(self, vault, monkeypatch):
+        with open(Path(__file__).parent / 'fixtures/09_track_info.json', 'r') as file:
+            _sections = json.load(file)['sections']
+        responses = iter([json.dumps(_sections[0]), json.dumps(_sections[1]), 'done'])
+        monkeypatch.setattr('builtins.input', lambda _: next(responses))
+        assert vault.drain_queue() == 2
+        assert len(htv.Queue.get()) == len(_sections) - 2
+        assert (vault.path / 'htb/lab/track/ics-and-scada-exploitation/sections/01_watch-tower/README.md').exists()
+        htv.Queue.clear()
+        for _ in _sections[:2]:  # Keep the vault as it was
+            shutil.rmtree(vault.path / 'htb/lab/challenge' / htv.FsTools.secure_dirname(_['metadata']['title']))
+
+    def test_watch_clipboard(self, vault, monkeypatch):
+        with open(Path(__file__).parent / 'fixtures/09_track_info.json', 'r') as file:
+            _sections = json.load(file)['sections'][:2]
+        copied = iter(['old', json.dumps(_sections[0]), 'not a resource', json.dumps(_sections[0]),
+                       json.dumps(_sections[1])])
+        _clipboard = ['old']
+        monkeypatch.setattr(htv.ClipboardWatcher, 'backend', lambda: _clipboard.append(next(copied, _clipboard[-1]))
+                            or _clipboard[-1])
+        assert vault.watch_clipboard(limit=2, interval=(0.01, 0.01)) == 2
+        for _ in _sections:  # Keep the vault as it was
+            _path = vault.path / 'htb/lab/challenge' / htv.FsTools.secure_dirname(_['metadata']['title'])
+            assert (_path / 'README.md').exists()
+            shutil.rmtree(_path)
+
+    def test_add_batch(self, vault):
+        with open(Path(__file__).parent / 'fixtures/09_track_info.json', 'r') as file:
+            _sections = json.load(file)['sections'][:2]
+        assert vault.add_resources(htv.DataSources.load(htv.Batch.encode(_sections))) == 2
+        for _ in _sections:  # Keep the vault as it was
+            _path = vault.path / 'htb/lab/challenge' / htv.FsTools.secure_dirname(_['metadata']['title'])
+            assert (_path / 'README.md').exists()
+            shutil.rmtree(_path)
+
+    def test_add_stream(self, vault, monkeypatch):
+        with open(Path(__file__).parent / 'fixtures/09_track_info.json', 'r') as file:
+            _sections = json.load(file)['sections'][:2]
+        monkeypatch.setattr('sys.stdin', io.StringIO(json.dumps(_sections)))
+        assert vault.add_resource(sys.stdin) == 0
+        for _ in _sections:  # Keep the vault as it was
+            _path = vault.path / 'htb/lab/challenge' / htv.FsTools.secure_dirname(_['metadata']['title'])
+            assert (_path / 'README.md').exists()
+            shutil.rmtree(_path)
+
+    def test_add_invalid(self, vault):
+        with open(Path(__file__).parent / 'fixtures/09_track_info.json', 'r') as file:
+            data = json.load(file)
+        data['metadata']['title'] = 'Invalid Track'
+        data['sections'][-1]['tasks'] = 'none'
+        assert vault.add_resource(json.dumps(data)) == 1
+        assert not (vault.path / 'htb/lab/track/invalid-track').exists()  # Nothing is created
+
+    def test_snapshot(self, vault, tmp_path):
+        assert vault.export_snapshot(tmp_path / 'a.jsonl.gz', compress=True) > 0
+        assert vault.export_snapshot(tmp_path / 'b.jsonl.gz', compress=True) > 0
+        assert (tmp_path / 'a.jsonl.gz').read_bytes() == (tmp_path / 'b.jsonl.gz').read_bytes()  # Reproducible
+        _paths = [_['path'] for _ in htv.Snapshot.read(tmp_path / 'a.jsonl.gz')]
+        assert _paths == sorted(_paths) and 'htb/lab/track/ics-and-scada-exploitation' in _paths
+        _removed = [vault.path / 'htb/academy/module/web-requests', vault.path / 'htb/lab/track/ics-and-scada-exploitation']
+        _info = [(r / 'info.yml').read_bytes() for r in _removed]
+        _restored = list()
+        for _ in range(2):
+            for r in _removed:
+                shutil.rmtree(r)
+            assert vault.restore_snapshot(tmp_path / 'a.jsonl.gz', commit=False) == len(_removed)
+            _restored.append({
+                f: os.readlink(f) if f.is_symlink() else f.read_bytes() for r in _removed for f in sorted(r.rglob('*'))
+                if f.is_file() or f.is_symlink()
+            })
+        assert _restored[0] == _restored[1] and len(_restored[0]) > 0  # Rendered byte by byte
+        assert [(r / 'info.yml').read_bytes() for r in _removed] == _info  # As exported
+        assert vault.export_snapshot(tmp_path / 'c.jsonl.gz', compress=True) > 0
+        assert (tmp_path / 'c.jsonl.gz').read_bytes() == (tmp_path / 'a.jsonl.gz').read_bytes()
+
+    def test_snapshot_diff(self, vault, tmp_path):
+        assert vault.export_snapshot(tmp_path / 'a.jsonl') > 0
+        assert vault.diff(tmp_path / 'a.jsonl', quiet=True) == []  # Same state, however it was serialized
+        assert vault.diff(tmp_path / 'a.jsonl', vault.path / '.htv/index.json', quiet=True) == []
+
+    def test_snapshot_invalid(self, vault, tmp_path):
+        with htv.Snapshot.writer(tmp_path / 'a.jsonl') as write:
+            write(dict(path='htb/lab/machine/x', resource=dict(__type__='htb.LabMachine', metadata=dict(), tasks=1)))
+        assert vault.restore_snapshot(tmp_path / 'a.jsonl', commit=False) == -1
+        (tmp_path / 'b.jsonl').write_text('{"path": "htb"}\n')  # Missing header
+        assert vault.restore_snapshot(tmp_path / 'b.jsonl', commit=False) == -1
+
     def test_list_all(self, vault):
         # Number of resources created equals number of fixture files
         assert len(vault.list_resources('all')) == len(list((Path(__file__).parent / 'fixtures').glob('*')))
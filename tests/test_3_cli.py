@@ -45,6 +45,24 @@ def test_add_mode(res):
 def test_list_mode(res, ret):
     __run__(f'list {res}', ret)  # existing resources are listed
 
+@pytest.mark.parametrize('query,ret', [('type=custom', 3), ('title=res1', 1), ('type=htb.LabMachine', 0)])
+def test_list_where_mode(query, ret):
+    assert main(['list', '--where', query, '--sort', 'title']) == ret
+
+@pytest.mark.parametrize('cmd', ['stats', 'stats --json', 'stats personal --where type=custom'])
+def test_stats_mode(cmd):
+    assert main(cmd.split(' ')) == 0
+
+def test_export_mode(tmp_path):
+    assert main(['export', str(tmp_path / 'vault.jsonl.gz')]) == 0
+    assert main(['init', '--from-snapshot', str(tmp_path / 'vault.jsonl.gz')]) == 0  # Existing resources are kept
+    assert main(['init', '--from-snapshot', str(tmp_path / 'missing.jsonl')]) == 1
+
+@pytest.mark.parametrize('cmd,ret', [('diff {0}', 0), ('diff {0} {0} --json', 0), ('diff unknown-rev', 1)])
+def test_diff_mode(tmp_path, cmd, ret):
+    main(['export', str(tmp_path / 'vault.jsonl')])
+    assert main(cmd.format(tmp_path / 'vault.jsonl').split(' ')) == ret
+
 @pytest.mark.parametrize('res,ret', [('random', 1), ('1', 0), ('res-2', 0)])
 def test_use_mode(res, ret):
     __run__(f'use {res}', ret)  # returned resource is not none
@@ -0,0 +1,242 @@
+from htv.index import Index, InfoCache, Query, aggregate, diff, iso_week
+from pathlib import Path
+
+import multiprocessing
+import shutil
+import subprocess
+
+import pytest
+import yaml
+
+
+RECORDS = [
+    dict(__type__='htb.LabMachine', __path__='htb/lab/machine/resolute', name='resolute', categories='htb/lab/machine',
+         difficulty='Hard', status=None, points=30, tags=['Retired Machine'], os='windows'),
+    dict(__type__='htb.LabMachine', __path__='htb/lab/machine/lame', name='lame', categories='htb/lab/machine',
+         difficulty='easy', status='completed', points=20, tags=[], os='linux'),
+    dict(__type__='htb.AcademyModule', __path__='htb/academy/module/getting-started', name='getting-started',
+         categories='htb/academy/module', difficulty='Fundamental', status=None, points=100.0, tags=['Offensive'],
+         tier='I', completion_date='2025-05-19 18:04:39 +0200'),
+]
+
+class TestQuery:
+
+    @pytest.mark.parametrize('expr,expected', [
+        ('type=htb.LabMachine and difficulty=hard and status!=completed', ['resolute']),
+        ('points>=100 and tags=offensive', ['getting-started']),
+        ('type~htb.Lab* or tier=I', ['resolute', 'lame', 'getting-started']),
+        ('not (os=linux or os=none)', ['resolute']),
+        ('tags=none', ['lame']),
+        ('completion_date>2025-01-01', ['getting-started']),
+        ('points<25', ['lame']),
+        ("difficulty='very easy'", []),
+    ])
+    def test_filter(self, expr, expected):
+        assert [r['name'] for r in RECORDS if Query(expr)(r)] == expected
+
+    @pytest.mark.parametrize('expr', ['difficulty', 'points >=', '(os=linux', 'os=linux and', 'os==linux'])
+    def test_invalid(self, expr):
+        with pytest.raises(ValueError):
+            Query(expr)
+
+    def test_sort_key(self):
+        assert [r['name'] for r in sorted(RECORDS, key=Query.sort_key('points'))] == ['lame', 'resolute', 'getting-started']
+        assert sorted(RECORDS, key=Query.sort_key('completion_date'))[0]['name'] == 'getting-started'
+
+
+class TestIndex:
+
+    @pytest.fixture(name='vault')
+    def init_vault(self, tmp_path):
+        for _ in RECORDS:
+            data = dict(__type__=_['__type__'], metadata=dict(title=_['name'], tags=_['tags'], points=_['points']), tasks=[1, 2])
+            (tmp_path / _['__path__']).mkdir(parents=True)
+            with open(tmp_path / _['__path__'] / 'info.yml', 'w') as file:
+                yaml.dump(data, file)
+        (tmp_path / '.git/objects').mkdir(parents=True)
+        return tmp_path
+
+    def test_refresh(self, vault):
+        index = Index(vault).refresh()
+        assert len(index) == len(RECORDS) and index.path.exists()
+        assert index['htb/lab/machine/lame']['tasks'] == 2  # Lists are counted
+
+    def test_load_saved(self, vault):
+        Index(vault).refresh()
+        assert len(Index(vault)) == len(RECORDS)
+
+    def test_parallel_save(self, vault):
+        def save(_):
+            for _ in range(20):
+                index = Index(vault).refresh()
+                index._changed = True
+                index.save()
+
+        ctx = multiprocessing.get_context('fork')
+        procs = [ctx.Process(target=save, args=(i,)) for i in range(6)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join(timeout=60)
+        assert [p.exitcode for p in procs] == [0] * 6
+        assert len(Index(vault)) == len(RECORDS)  # Never a partial file
+        assert not list((vault / '.htv').glob('*.tmp'))
+
+    def test_refresh_changes(self, vault):
+        index = Index(vault).refresh()
+        with open(vault / 'htb/lab/machine/lame/info.yml', 'w') as file:
+            yaml.dump(dict(__type__='htb.LabMachine', metadata=dict(title='lame', points=50)), file)
+        (vault / 'htb/lab/machine/resolute/info.yml').unlink()
+        index.refresh()
+        assert 'htb/lab/machine/resolute' not in index and index['htb/lab/machine/lame']['points'] == 50
+
+    def test_query(self, vault):
+        index = Index(vault).refresh()
+        assert [r['name'] for r in index.query(sort='points', categories=['htb/lab'])] == ['lame', 'resolute']
+        assert [r['name'] for r in index.query('points>=30', sort='-points')] == ['getting-started', 'resolute']
+        assert [r['name'] for r in index.query(name='lam')] == ['lame']
+
+
+class TestInfoCache:
+
+    @pytest.fixture(name='info')
+    def init_info(self, tmp_path):
+        with open(tmp_path / 'info.yml', 'w') as file:
+            yaml.dump(dict(__type__='htb.LabMachine', metadata=dict(title='lame'), tasks=[dict(text='User')]), file)
+        return tmp_path / 'info.yml'
+
+    def test_get(self, info, monkeypatch):
+        cache = InfoCache(info.parent)
+        data = cache.get(info)
+        data.pop('__type__')  # Callers may modify the result
+        monkeypatch.setattr(yaml, 'load', None)  # Unchanged files are not parsed again
+        assert cache.get(info)['__type__'] == 'htb.LabMachine' and (cache.hits, cache.misses) == (1, 1)
+
+    def test_invalidation(self, info):
+        cache = InfoCache(info.parent)
+        cache.get(info)
+        with open(info, 'w') as file:
+            yaml.dump(dict(__type__='htb.LabMachine', metadata=dict(title='resolute')), file)
+        assert cache.get(info)['metadata']['title'] == 'resolute' and cache.misses == 2
+        assert cache.get(info.parent / 'missing.yml') is None
+
+    def test_load_saved(self, info):
+        cache = InfoCache(info.parent)
+        cache.get(info)
+        cache.save()
+        cache = InfoCache(info.parent)
+        assert len(cache) == 1 and cache.get(info)['metadata']['title'] == 'lame' and cache.hits == 1
+
+    def test_warm_load(self, tmp_path, monkeypatch):
+        """Cold loads parse the YAML files, warm loads (saved cache) do not"""
+        data = dict(__type__='htb.AcademyModule', metadata=dict(title='module', tags=['Offensive'] * 10),
+                    sections=[dict(__type__='document', title=f"Section {i}") for i in range(30)])
+        files = [tmp_path / f"{i}.yml" for i in range(100)]
+        for f in files:
+            with open(f, 'w') as file:
+                yaml.dump(data, file)
+        cache = InfoCache(tmp_path)
+        cold = [cache.get(f) for f in files]
+        assert (cache.hits, cache.misses) == (0, len(files))
+        cache.save()
+        cache = InfoCache(tmp_path)
+        monkeypatch.setattr(yaml, 'load', None)  # Not parsed again
+        warm = [cache.get(f) for f in files]
+        assert warm == cold and (cache.hits, cache.misses) == (len(files), 0)
+
+
+class TestAggregate:
+
+    def test_aggregate(self):
+        _stats = aggregate(RECORDS)
+        assert _stats['total'] == 3 and _stats['completed'] == 2
+        assert _stats['by_type'] == {'htb.AcademyModule': 1, 'htb.LabMachine': 2}
+        assert _stats['points'] == dict(total=150.0, completed=120.0)
+        assert _stats['by_difficulty']['easy'] == dict(total=1, completed=1, rate=1.0)
+        assert _stats['completed_per_week'] == {'2025-W21': 1}
+
+    def test_aggregate_empty(self):
+        assert aggregate([])['total'] == 0
+
+    @pytest.mark.parametrize('date,expected', [
+        ('2025-05-19 18:04:39 +0200', '2025-W21'), ('2025-01-01', '2025-W01'), (None, None), ('not-a-date', None)
+    ])
+    def test_iso_week(self, date, expected):
+        assert iso_week(date) == expected
+
+
+class TestProgress:
+
+    @staticmethod
+    def dump(root: Path, path: str, data: dict) -> None:
+        (root / path).mkdir(parents=True, exist_ok=True)
+        with open(root / path / 'info.yml', 'w') as file:
+            yaml.dump(data, file)
+
+    @pytest.fixture(name='vault')
+    def init_vault(self, tmp_path):
+        _mods = [dict(__type__='htb.AcademyModule', metadata=dict(title=t)) for t in ['Web Requests', 'Getting Started']]
+        self.dump(tmp_path, 'htb/academy/skill-path/basics', dict(__type__='htb.AcademySkillPath', metadata=dict(title='Basics'), sections=_mods))
+        self.dump(tmp_path, 'htb/academy/module/web-requests', dict(__type__='htb.AcademyModule', metadata=dict(title='Web Requests', status='completed')))
+        self.dump(tmp_path, 'htb/academy/module/getting-started', dict(__type__='htb.AcademyModule', metadata=dict(title='Getting Started')))
+        return tmp_path
+
+    def test_progress(self, vault):
+        index = Index(vault).refresh()
+        assert index['htb/academy/skill-path/basics']['__sections__'] == [
+            'htb/academy/module/web-requests', 'htb/academy/module/getting-started'
+        ]
+        assert index.progress('htb/academy/skill-path/basics') == 0.5
+        assert index.progress(vault / 'htb/academy/skill-path/basics') == 0.5
+        assert index.progress('htb/academy/module/web-requests') == 0.0  # Not a path
+
+    def test_progress_incremental(self, vault):
+        index = Index(vault).refresh()
+        self.dump(vault, 'htb/academy/module/getting-started', dict(__type__='htb.AcademyModule', metadata=dict(title='Getting Started', completion_date='2025-05-19')))
+        index.refresh()
+        assert index.progress('htb/academy/skill-path/basics') == 1.0
+        index.remove('htb/academy/module/web-requests')
+        assert index.progress('htb/academy/skill-path/basics') == 0.5
+        index.save()
+        assert Index(vault).progress('htb/academy/skill-path/basics') == 0.5  # Reverse map rebuilt on load
+
+
+class TestDiff:
+
+    @staticmethod
+    def git(root: Path, *args) -> None:
+        subprocess.run(['git', '-c', 'user.name=htv', '-c', 'user.email=htv@htv.local', *args], cwd=root, check=True, capture_output=True)
+
+    def test_diff(self):
+        _old = sorted(RECORDS, key=lambda r: r['__path__'])
+        _new = [dict(r, __mtime__=1) for r in _old if r['name'] != 'resolute']  # Internal fields are ignored
+        _new[1].update(status='completed', completion_date='2025-06-01')
+        _new.append(dict(__type__='htb.LabMachine', __path__='htb/lab/machine/sau', name='sau'))
+        assert list(diff(_old, _new)) == [
+            ('*', 'htb/lab/machine/lame', {'completion_date': (None, '2025-06-01')}),
+            ('-', 'htb/lab/machine/resolute', {}),
+            ('+', 'htb/lab/machine/sau', {}),
+        ]
+        assert list(diff(_old, _old)) == [] and len(list(diff([], _old))) == len(_old)
+
+    def test_unsorted(self):
+        with pytest.raises(ValueError):
+            list(diff(RECORDS, []))
+
+    def test_snapshot(self, tmp_path):
+        TestProgress.dump(tmp_path, 'htb/academy/module/web-requests', dict(__type__='htb.AcademyModule', metadata=dict(title='Web Requests', points=10)))
+        TestProgress.dump(tmp_path, 'htb/academy/module/getting-started', dict(__type__='htb.AcademyModule', metadata=dict(title='Getting Started')))
+        self.git(tmp_path, 'init')
+        self.git(tmp_path, 'add', '.')
+        self.git(tmp_path, 'commit', '-m', 'init')
+        shutil.copy(Index(tmp_path).refresh().path, tmp_path / 'old.json')
+        TestProgress.dump(tmp_path, 'htb/academy/module/web-requests', dict(__type__='htb.AcademyModule', metadata=dict(title='Web Requests', points=10, status='completed')))
+        shutil.rmtree(tmp_path / 'htb/academy/module/getting-started')
+        _expected = [
+            ('-', 'htb/academy/module/getting-started', {}),
+            ('*', 'htb/academy/module/web-requests', {'status': (None, 'completed')}),
+        ]
+        assert list(diff(Index.snapshot('HEAD', root=tmp_path), Index.snapshot(root=tmp_path))) == _expected
+        assert list(diff(Index.snapshot(tmp_path / 'old.json', root=tmp_path), Index.snapshot(root=tmp_path))) == _expected
+        with pytest.raises(ValueError):
+            Index.snapshot('unknown-rev', root=tmp_path)
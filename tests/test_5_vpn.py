@@ -0,0 +1,283 @@
+from htv.vpn import LatencyProbe, RotatingLog, VpnSupervisor
+from htv import CONF, Cache, DataSources, FsTools
+from pathlib import Path
+
+import argparse
+import asyncio
+import json
+import os
+import pytest
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+
+FAKE_OPENVPN = [sys.executable, str(Path(__file__).parent / 'fake_openvpn.py'), '--config']
+
+
+class TestVpnSupervisor:
+
+    @pytest.fixture(name='supervisor')
+    def init_supervisor(self, tmp_path):
+        return VpnSupervisor(
+            tmp_path / 'lab.ovpn', command=FAKE_OPENVPN, state_path=tmp_path / 'vpn.json',
+            log_path=tmp_path / 'vpn.log', backoff=(0.05, 0.2), connect_timeout=5
+        )
+
+    @staticmethod
+    def run(supervisor: VpnSupervisor, scenario) -> int:
+        async def _main():
+            task = asyncio.create_task(supervisor.run())
+            try:
+                await asyncio.wait_for(scenario(), 10)
+            finally:
+                supervisor.stop()
+            return await task
+        return asyncio.run(_main())
+
+    def test_connect(self, supervisor):
+        async def scenario():
+            await supervisor.wait_for('connected')
+            state = VpnSupervisor.read_state(supervisor.state_path)
+            assert state['state'] == 'connected' and state['client_pid'] is not None
+
+        assert self.run(supervisor, scenario) == 0
+        assert VpnSupervisor.read_state(supervisor.state_path)['state'] == 'stopped'
+        assert VpnSupervisor.__ready__ in supervisor.log_path.read_text()
+
+    def test_reconnect(self, supervisor, monkeypatch):
+        monkeypatch.setenv('FAKE_OPENVPN', 'drop')
+
+        async def scenario():
+            await supervisor.wait_for('connected')
+            await supervisor.wait_for('reconnecting')
+            await supervisor.wait_for('connected')
+
+        self.run(supervisor, scenario)
+        assert supervisor.connections >= 2
+
+    def test_client_restart(self, supervisor, monkeypatch):
+        monkeypatch.setenv('FAKE_OPENVPN', 'restart')
+
+        async def scenario():
+            await supervisor.wait_for('connected')
+            await supervisor.wait_for('reconnecting')
+            await supervisor.wait_for('connected')
+
+        self.run(supervisor, scenario)
+        assert supervisor.connections == 2 and supervisor.retries == 0
+
+    @pytest.mark.parametrize('mode', ['fail', 'hang'])
+    def test_give_up(self, supervisor, monkeypatch, mode):
+        monkeypatch.setenv('FAKE_OPENVPN', mode)
+        supervisor.max_retries = 1
+        supervisor.connect_timeout = 0.2
+
+        async def scenario():
+            await supervisor.wait_for('failed')
+
+        assert self.run(supervisor, scenario) == 1 and supervisor.retries == 2
+        assert VpnSupervisor.read_state(supervisor.state_path)['state'] == 'failed'
+
+    @pytest.mark.parametrize('sudo', [False, True])
+    def test_spawn(self, tmp_path, monkeypatch, sudo):
+        monkeypatch.setattr(VpnSupervisor, '__sudo__', ['env', 'FAKE_SUDO=1'])  # Runs the supervisor as sudo would
+        state_path = tmp_path / 'vpn.json'
+        pid = VpnSupervisor.spawn(tmp_path / 'lab.ovpn', command=FAKE_OPENVPN, state_path=state_path,
+                                  log_path=tmp_path / 'vpn.log', sudo=sudo)
+        state = VpnSupervisor.wait('connected', timeout=10, state_path=state_path)
+        assert state['state'] == 'connected' and state['pid'] == pid
+        assert os.getsid(pid) != os.getsid(0)  # Detached, in its own session
+        assert VpnSupervisor.terminate(state_path=state_path)
+        assert VpnSupervisor.read_state(state_path)['state'] == 'stopped'
+        assert not VpnSupervisor.terminate(state_path=state_path)  # Not running anymore
+
+
+    def test_runtime_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path))
+        assert VpnSupervisor.runtime_dir() == tmp_path / 'htv' and (tmp_path / 'htv').stat().st_mode & 0o777 == 0o700
+        (tmp_path / 'htv').chmod(0o755)  # Readable by other users
+        with pytest.raises(PermissionError):
+            VpnSupervisor.runtime_dir()
+        (tmp_path / 'htv').rmdir()
+        (tmp_path / 'htv').symlink_to(tmp_path)
+        with pytest.raises(PermissionError):
+            VpnSupervisor.runtime_dir()
+
+    def test_no_follow(self, supervisor, tmp_path):
+        (tmp_path / 'target').write_text('keep')
+        supervisor.state_path.symlink_to(tmp_path / 'target')
+        assert VpnSupervisor.read_state(supervisor.state_path) is None  # Links are not read
+        supervisor._save()  # The link is replaced, not followed
+        assert (tmp_path / 'target').read_text() == 'keep' and not supervisor.state_path.is_symlink()
+        supervisor.log_path.symlink_to(tmp_path / 'target')
+        with pytest.raises(OSError), RotatingLog(supervisor.log_path) as log:
+            log.write('line')
+        assert (tmp_path / 'target').read_text() == 'keep'
+
+    def test_terminate_other(self, supervisor):
+        proc = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+        try:
+            supervisor._save()
+            state = VpnSupervisor.read_state(supervisor.state_path)
+            supervisor.state_path.write_text(json.dumps(dict(state, state='connected', pid=proc.pid)))
+            assert not VpnSupervisor.is_supervisor(proc.pid)
+            assert not VpnSupervisor.terminate(state_path=supervisor.state_path) and proc.poll() is None
+        finally:
+            proc.kill()
+            proc.wait()
+
+
+class TestRotatingLog:
+
+    def test_bounded(self, tmp_path):
+        with RotatingLog(tmp_path / 'vpn.log', max_bytes=1000, backups=2) as log:
+            for i in range(1000):
+                log.write(f"line {i:04d}")
+        assert sorted(_.name for _ in tmp_path.iterdir()) == ['vpn.log', 'vpn.log.1', 'vpn.log.2']
+        assert all(_.stat().st_size <= 1000 for _ in tmp_path.iterdir())
+        assert RotatingLog.tail(tmp_path / 'vpn.log', 5) == [f"line {i:04d}" for i in range(995, 1000)]
+
+    def test_tail(self, tmp_path):
+        with RotatingLog(tmp_path / 'vpn.log', max_bytes=100) as log:
+            for i in range(20):
+                log.write(f"line {i:02d}")
+        assert RotatingLog.tail(tmp_path / 'vpn.log', 12) == [f"line {i:02d}" for i in range(8, 20)]  # Across files
+        assert RotatingLog.tail(tmp_path / 'vpn.log', 0) == []
+        assert RotatingLog.tail(tmp_path / 'missing.log') == []
+
+    def test_follow(self, tmp_path):
+        log = RotatingLog(tmp_path / 'vpn.log', max_bytes=30)
+        log.write('old line')
+        done = threading.Event()
+
+        def writer():
+            time.sleep(0.1)
+            for i in range(10):  # Rotated several times
+                log.write(f"new line {i}")
+                time.sleep(0.02)
+            log.close()
+            done.set()
+
+        threading.Thread(target=writer).start()
+        lines = list(RotatingLog.follow(tmp_path / 'vpn.log', stop=done.is_set, poll=0.01))
+        assert lines == [f"new line {i}" for i in range(10)]
+
+
+class TestLatencyProbe:
+
+    @pytest.fixture(autouse=True)
+    def cache(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(LatencyProbe, '__route__', tmp_path / 'probe.json')
+
+    @pytest.fixture(name='servers')
+    def local_servers(self):
+        """Local stand-ins: a TCP listener, a UDP echo server and a closed port"""
+        tcp = socket.create_server(('127.0.0.1', 0))
+        udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        udp.bind(('127.0.0.1', 0))
+
+        def echo():
+            data, addr = udp.recvfrom(1024)
+            udp.sendto(data, addr)
+
+        threading.Thread(target=echo, daemon=True).start()
+        closed = socket.create_server(('127.0.0.1', 0))
+        closed_port = closed.getsockname()[1]
+        closed.close()
+        yield dict(
+            tcp=('tcp', '127.0.0.1', tcp.getsockname()[1]),
+            udp=('udp', '127.0.0.1', udp.getsockname()[1]),
+            closed=('tcp', '127.0.0.1', closed_port),
+        )
+        tcp.close()
+        udp.close()
+
+    def test_measure(self, servers):
+        results = asyncio.run(LatencyProbe.measure(list(servers.values()), timeout=1))
+        assert results[servers['tcp']] > 0 and results[servers['udp']] > 0
+        assert results[servers['closed']] is None
+
+    def test_fastest(self, servers):
+        assert LatencyProbe.fastest([servers['closed'], servers['tcp']], timeout=1) == servers['tcp']
+        assert LatencyProbe.fastest([servers['closed']], timeout=1) is None
+
+    def test_cache(self, servers, monkeypatch):
+        first = LatencyProbe.latency([servers['tcp']], timeout=1)
+
+        async def no_probe(targets, timeout):
+            raise AssertionError('Cached targets must not be probed')
+
+        monkeypatch.setattr(LatencyProbe, 'measure', no_probe)
+        assert LatencyProbe.latency([servers['tcp']], timeout=1) == first
+        with pytest.raises(AssertionError):  # Expired
+            LatencyProbe.latency([servers['tcp']], timeout=1, ttl=0)
+
+    def test_fastest_vpn(self, servers, tmp_path, monkeypatch):
+        from datasources.htb.ds import Vpn
+        monkeypatch.setitem(CONF, 'VAULT_DIR', tmp_path)
+        (tmp_path / 'htb/vpn').mkdir(parents=True)
+        for name, (proto, host, port) in [('eu-vip-1', servers['closed']), ('us-free-2', servers['tcp'])]:
+            (tmp_path / f"htb/vpn/{name}.ovpn").write_text(f"client\ndev tun\nproto {proto}\nremote {host} {port}\n")
+        assert Vpn.fastest().path.name == 'us-free-2.ovpn'
+
+
+class TestVpnCatalog:
+    conf = (
+        "# HTB lab\nclient\ndev tun\nproto {proto}\n; remote commented.example.com 1\n"
+        "remote {remote} {port}\nremote fallback.example.com 443\n<ca>\nremote inline.example.com 1\n</ca>\n"
+    )
+    servers = [
+        ('eu-free-1', 'udp', 'edge-eu-free-1.hackthebox.eu', 1337),
+        ('eu-vip-12', 'tcp', 'edge-eu-vip-12.hackthebox.eu', 443),
+        ('us-dedivip-3', 'udp', 'edge-us-dedivip-3.hackthebox.eu', 1337),
+    ]
+
+    @pytest.fixture(name='vpn_dir')
+    def init_vpn_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setitem(CONF, 'VAULT_DIR', tmp_path)
+        (tmp_path / 'htb/vpn').mkdir(parents=True)
+        for name, proto, remote, port in self.servers:
+            (tmp_path / f"htb/vpn/{name}.ovpn").write_text(self.conf.format(proto=proto, remote=remote, port=port))
+        return tmp_path / 'htb/vpn'
+
+    def test_parse(self):
+        from datasources.htb.ds import Vpn
+        conf = Vpn.parse(self.conf.format(proto='tcp-client', remote='edge-eu-vip-12.hackthebox.eu', port=443))
+        assert conf == dict(protocol='tcp', port=443, remote='edge-eu-vip-12.hackthebox.eu', country='EU',
+                            tier='VIP', server_id=12)
+        assert Vpn.parse("port 8443\nremote vpn.example.com\n")['port'] == 8443  # Defaults and `port`
+        assert Vpn.parse("remote vpn.example.com 443 tcp\n")['protocol'] == 'tcp'
+        for invalid in ["client\n", "proto sctp\nremote vpn.example.com\n", "remote vpn.example.com http\n"]:
+            with pytest.raises(ValueError):
+                Vpn.parse(invalid)
+
+    def test_query(self, vpn_dir):
+        from datasources.htb.ds import VpnCatalog
+        catalog = VpnCatalog().refresh()
+        assert len(catalog) == 3 and catalog.path.exists()
+        assert [r['path'] for r in catalog.query(country='eu', tier='VIP')] == ['eu-vip-12.ovpn']
+        assert [r['path'] for r in catalog.query(protocol='udp')] == ['eu-free-1.ovpn', 'us-dedivip-3.ovpn']
+        assert len(VpnCatalog()) == 3  # Loaded from disk
+
+    def test_refresh(self, vpn_dir, monkeypatch):
+        from datasources.htb.ds import Vpn, VpnCatalog
+        VpnCatalog().refresh()
+        (vpn_dir / 'eu-free-1.ovpn').unlink()
+        (vpn_dir / 'eu-vip-12.ovpn').write_text("proto udp\nremote edge-sg-vip-5.hackthebox.sg 1337\n")
+        parsed = list()
+        monkeypatch.setattr(Vpn, 'parse', lambda text, _parse=Vpn.parse: parsed.append(text) or _parse(text))
+        catalog = VpnCatalog().refresh()
+        assert len(parsed) == 1  # Only the modified file
+        assert [r['country'] for r in catalog.query()] == ['SG', 'US']
+
+    def test_list_cache(self, vpn_dir, monkeypatch):
+        from datasources.htb.ds import Vpn, handle_args
+        monkeypatch.setattr(Cache, '__route__', vpn_dir / 'cache')
+        args = argparse.Namespace(action='list', target=[], country='EU', tier=None, protocol=None)
+        assert handle_args(args) == 0
+        assert Cache.get() == [vpn_dir / 'eu-free-1.ovpn', vpn_dir / 'eu-vip-12.ovpn']  # Absolute, as `htv list`
+        vpn = DataSources.load(FsTools.get_resource_by_name_id('2'))
+        assert isinstance(vpn, Vpn) and vpn.path == vpn_dir / 'eu-vip-12.ovpn'